@@ -13,6 +13,7 @@ default_app_config = 'ls.joyous.apps.JoyousAppConfig'
 # Note: Default settings
 # ------------------------------------------------------------------------------
 # settings.JOYOUS_HOLIDAYS = ""
+# settings.JOYOUS_HOLIDAYS_CACHE = ""
 # settings.JOYOUS_GROUP_SELECTABLE = False
 # settings.JOYOUS_GROUP_MODEL = "joyous.GroupPage"
 # settings.JOYOUS_TIME_INPUT = "24"
@@ -21,3 +22,13 @@ default_app_config = 'ls.joyous.apps.JoyousAppConfig'
 # settings.JOYOUS_RSS_FEED_IMAGE = "joyous/img/logo.png"
 # settings.JOYOUS_UPCOMING_INCLUDES_STARTED = False
 # settings.JOYOUS_DEFEND_FORMS = False
+# settings.JOYOUS_OCCURRENCE_HORIZON = 0
+# settings.JOYOUS_RECURRENCE_CACHE = ""
+# settings.JOYOUS_RECURRENCE_CACHE_SIZE = 1000
+# settings.JOYOUS_CALENDAR_CACHE = ""
+# settings.JOYOUS_ICAL_CACHE = ""
+# settings.JOYOUS_ICAL_BULK_IMPORT = False
+# settings.JOYOUS_ICAL_PARSE_PROCESSES = 0
+# settings.JOYOUS_IMPORT_IN_BACKGROUND = False
+# settings.JOYOUS_JOB_RUNNER = "ls.joyous.utils.jobs.ThreadPoolRunner"
+# settings.JOYOUS_IMPORT_JOB_TIMEOUT = 3600
@@ -1,10 +1,12 @@
 # ------------------------------------------------------------------------------
 # Wagtail 2.x style EditHandlers
 # ------------------------------------------------------------------------------
+from django.apps import apps
 from django.conf import settings
 from django.utils import timezone
 from django.utils.formats import get_format_modules
-from wagtail.admin.edit_handlers import (FieldPanel, MultiFieldPanel)
+from wagtail.admin.edit_handlers import (FieldPanel, MultiFieldPanel,
+        HelpPanel)
 from wagtail.admin.widgets import AdminDateInput, AdminTimeInput
 try:
     from wagtail.admin.localization import get_available_admin_languages
@@ -131,6 +133,29 @@ class ConcealedPanel(MultiFieldPanel):
     def _show(self):
         return False
 
+# ------------------------------------------------------------------------------
+class ImportJobsPanel(HelpPanel):
+    """
+    Shows the progress of the recent background imports into a calendar
+    """
+    MaxJobs = 5
+
+    def __init__(self, template="joyous/edit_handlers/import_jobs_panel.html",
+                 **kwargs):
+        super().__init__(template=template, **kwargs)
+
+    def render(self):
+        page = getattr(self, 'instance', None)
+        if page is None or page.id is None:
+            return ""
+        ImportJob = apps.get_model("joyous", "ImportJob")
+        self.jobs = ImportJob.objects.filter(calendar_id=page.id)            \
+                                     .order_by('-created_at', '-id')        \
+                                     [:self.MaxJobs]
+        if not self.jobs:
+            return ""
+        return super().render()
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
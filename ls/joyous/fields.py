@@ -7,7 +7,7 @@ from django.core.exceptions import ValidationError
 from django.forms.fields import Field as FormField
 from django.forms import TypedMultipleChoiceField, CheckboxSelectMultiple
 from django.utils.encoding import force_str
-from .utils.recurrence import Recurrence
+from .utils.recurrence import Recurrence, internRecurrence
 from .widgets import RecurrenceWidget
 
 # ------------------------------------------------------------------------------
@@ -35,7 +35,7 @@ class RecurrenceField(Field):
         if isinstance(value, Recurrence):
             return value
         try:
-            return Recurrence(value)
+            return internRecurrence(value)
         except (TypeError, ValueError, UnboundLocalError) as err:
             raise ValidationError("Invalid input for recurrence {}".format(err))
 
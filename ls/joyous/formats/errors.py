@@ -9,6 +9,9 @@ class CalendarTypeError(TypeError):
 class CalendarNotInitializedError(RuntimeError):
     pass
 
+class CalendarParseError(ValueError):
+    pass
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -1,33 +1,74 @@
 # ------------------------------------------------------------------------------
 # ical import/export format
 # ------------------------------------------------------------------------------
+import os
 import datetime as dt
 import pytz
 import base64
 import quopri
+import pickle
+import shutil
+import multiprocessing
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+from uuid import uuid4
 from contextlib import suppress
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from zipfile import is_zipfile, ZipFile
+import django
 from icalendar import Calendar, Event
 from icalendar import vDatetime, vRecur, vDDDTypes, vText
+from django.conf import settings
 from django.contrib import messages
-from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
-from django.http import HttpResponse
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Min, Max
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.http import StreamingHttpResponse
 from django.utils import html
 from django.utils import timezone
 from ls.joyous import __version__
 from ..models import (SimpleEventPage, MultidayEventPage, RecurringEventPage,
         MultidayRecurringEventPage, EventExceptionBase, ExtraInfoPage,
         CancellationPage, PostponementPage, RescheduleMultidayEventPage,
-        ClosedForHolidaysPage, ExtCancellationPage, EventBase, CalendarPage)
+        ClosedForHolidaysPage, ExtCancellationPage, EventBase, CalendarPage,
+        EventOccurrence, ImportJob)
+from ..models.calendar import _changeCalendarVersions
+from ..models.event_base import _getAuthorizedAnnotation
+from ..models.occurrences import getOccurrenceHorizon
+from ..models.recurring_events import _forgetOccurrenceMemos
 from ..utils.recurrence import Recurrence
+from ..utils.intervals import DateIntervalIndex
 from ..utils.telltime import getAwareDatetime
+from ..utils.cache import LRUCache, makeCacheKey
+from ..utils.jobs import getJobRunner
 from .vtimezone import create_timezone
-from .errors import CalendarTypeError, CalendarNotInitializedError
+from .vstream import readCalendars
+from .errors import (CalendarTypeError, CalendarNotInitializedError,
+        CalendarParseError)
 
 # ------------------------------------------------------------------------------
 MAX_YEAR = 2038
 
+# How many events to serialize at a time when streaming
+STREAM_CHUNK_SIZE = 100
+
+# How many events, with their exceptions, to load at a time when importing
+LOAD_BATCH_SIZE = 200
+
+# Serialized VTIMEZONEs, by time zone and span
+_vtimezoneCache = LRUCache(maxsize=100)
+
+# The kinds of records in the spool of a zip member parsed by a worker
+_SPOOL_CALENDAR = "calendar"
+_SPOOL_VEVENT   = "vevent"
+_SPOOL_END      = "end"
+_SPOOL_ERROR    = "error"
+
 # ------------------------------------------------------------------------------
 class VComponentMixin:
     """Utilities for working with icalendar components"""
@@ -65,44 +106,294 @@ class VResults:
 class ICalHandler:
     """Serve and load iCalendar files"""
     def serve(self, page, request, *args, **kwargs):
+        if isinstance(page, CalendarPage):
+            # calendar clients poll, so let them know if nothing has changed
+            return page._serveConditionally(request,
+                                            lambda: self._serve(page, request))
+        return self._serve(page, request)
+
+    def _serve(self, page, request):
         try:
-            vcal = VCalendar.fromPage(page, request)
+            if isinstance(page, CalendarPage):
+                # a calendar could be big, so send it as it is serialized
+                response = StreamingHttpResponse(
+                                VCalendar.streamPage(page, request),
+                                content_type='text/calendar')
+            else:
+                response = HttpResponse(VCalendar.exportPage(page, request),
+                                        content_type='text/calendar')
         except CalendarTypeError:
             return None
-        response = HttpResponse(vcal.to_ical(), content_type='text/calendar')
         response['Content-Disposition'] = \
             'attachment; filename={}.ics'.format(page.slug)
         return response
 
-    def load(self, page, request, upload, **kwargs):
+    def load(self, page, request, upload, progress=None, **kwargs):
+        """
+        Load the events in upload into the calendar page.  progress, if
+        given, is called with the name and VResults of each calendar file
+        as it is loaded.
+        """
         isZip = is_zipfile(upload)
         upload.seek(0)
         if isZip:
-            results = self._loadZip(page, request, upload, **kwargs)
+            results = self._loadZip(page, request, upload, progress, **kwargs)
         else:
-            results = self._loadICal(page, request, upload, **kwargs)
+            results = self._loadICal(page, request, upload, progress, **kwargs)
         if results.success:
             messages.success(request, "{} iCal events loaded".format(results.success))
         if results.fail:
             messages.error(request, "Could not load {} iCal events".format(results.fail))
 
-    def _loadZip(self, page, request, upload, **kwargs):
+    def loadLater(self, page, request, upload, utc2local=True):
+        """
+        Load the events in upload into the calendar page out of band, using
+        the runner of :setting:`JOYOUS_JOB_RUNNER`.  Returns the ImportJob
+        which records the progress of the load.
+        """
+        name = getattr(upload, 'name', "") or "upload.ics"
+        user = request.user if request.user.is_authenticated else None
+        job = ImportJob(calendar=page,
+                        user=user,
+                        name=name,
+                        utc2local=bool(utc2local),
+                        submit=bool(request.POST.get('action-submit')),
+                        publish=bool(request.POST.get('action-publish')))
+        job.upload.save(name, upload, save=False)
+        job.save()
+        transaction.on_commit(lambda: getJobRunner().submit(runImportJob,
+                                                            job.id))
+        messages.info(request, "Importing {} in the background".format(name))
+        return job
+
+    def _loadZip(self, page, request, upload, progress=None, **kwargs):
         results = VResults()
         with ZipFile(upload) as package:
-            for info in package.infolist():
-                if info.filename.endswith(".ics"):
-                    with package.open(info) as calFile:
-                        results += self._loadICal(page, request, calFile, **kwargs)
+            members = [info for info in package.infolist()
+                       if info.filename.endswith(".ics")]
+            for name, calStream in _parseZipMembers(upload, package, members):
+                results += self._loadCalStream(page, request, name, calStream,
+                                               progress, **kwargs)
         return results
 
-    def _loadICal(self, page, request, upload, **kwargs):
+    def _loadICal(self, page, request, upload, progress=None, **kwargs):
+        name = getattr(upload, 'name', "")
+        return self._loadCalStream(page, request, name, readCalendars(upload),
+                                   progress, **kwargs)
+
+    def _loadCalStream(self, page, request, name, calStream, progress=None,
+                       **kwargs):
         vcal = VCalendar(page, **kwargs)
-        results = vcal.load(request, upload.read())
+        results = vcal._loadCalStream(request, calStream)
         if results.error:
-            name = getattr(upload, 'name', "")
             messages.error(request, "Could not parse iCalendar file "+name)
+        if progress is not None:
+            progress(name, results)
         return results
 
+# ------------------------------------------------------------------------------
+def runImportJob(jobId):
+    """
+    Run the queued ImportJob with jobId, recording its progress as it goes.
+    This is what a job runner calls, e.g. from a Celery or RQ task.
+    Returns False if the job was not queued.
+    """
+    if not ImportJob.objects.claim(jobId):
+        return False
+    job = ImportJob.objects.select_related('user').get(id=jobId)
+    if job.user is None:
+        # the pages would have no owner
+        job.addMessage(messages.ERROR,
+                       "Could not import {}: the user who uploaded it no "
+                       "longer exists".format(job.name))
+        job.finish(ImportJob.FAILED)
+        return True
+    page = job.calendar.specific
+    request = _JobRequest(job, page)
+    def progress(name, results):
+        job.addFileResults(name, results.success, results.fail, results.error)
+    try:
+        with job.upload.open('rb') as stored:
+            # known by the name it was uploaded with, not where it is stored
+            upload = File(stored.file, name=job.name)
+            ICalHandler().load(page, request, upload, progress,
+                               utc2local=job.utc2local)
+    except Exception as e:
+        job.addMessage(messages.ERROR,
+                       "Could not import {}: {}".format(job.name, e))
+        job.finish(ImportJob.FAILED)
+    else:
+        job.finish(ImportJob.DONE)
+    return True
+
+def runQueuedImportJobs():
+    """
+    Run the import jobs that are queued in the database, for when
+    :setting:`JOYOUS_JOB_RUNNER` is the DatabaseRunner.
+
+    :rtype: the number of jobs run
+    """
+    count = 0
+    for jobId in ImportJob.objects.queued().values_list('id', flat=True):
+        if runImportJob(jobId):
+            count += 1
+    return count
+
+class _JobRequest(HttpRequest):
+    """A stand-in for the request that queued an import job"""
+    def __init__(self, job, page):
+        super().__init__()
+        self.method = "POST"
+        self.user = job.user
+        self.POST = QueryDict(mutable=True)
+        if job.submit:
+            self.POST['action-submit'] = "action-submit"
+        if job.publish:
+            self.POST['action-publish'] = "action-publish"
+        self.session = {}
+        self._messages = _JobMessages(job)
+        # Site.find_for_request would look at the host of the request
+        self._wagtail_site = page.get_site()
+
+class _JobMessages:
+    """Records the messages for an import job with the job"""
+    def __init__(self, job):
+        self.job = job
+
+    def add(self, level, message, extra_tags=''):
+        self.job.addMessage(level, message)
+
+# ------------------------------------------------------------------------------
+def _parseZipMembers(upload, package, members):
+    """
+    The name and parsed iCalendar objects of each member of the zip
+    package, in order.  The members are parsed in worker processes if
+    :setting:`JOYOUS_ICAL_PARSE_PROCESSES` is more than 1, with a few
+    parsed ahead of the one being loaded.  Each worker writes what it
+    parses to a spool file, which is read back here a VEVENT at a time.
+    """
+    numProcesses = min(getattr(settings, "JOYOUS_ICAL_PARSE_PROCESSES", 0),
+                       len(members))
+    if numProcesses <= 1:
+        for info in members:
+            with package.open(info) as member:
+                yield info.filename, readCalendars(member)
+        return
+    # the workers open the zip file for themselves, so it must have a path
+    copy = NamedTemporaryFile(suffix=".zip", delete=False)
+    try:
+        with copy:
+            upload.seek(0)
+            shutil.copyfileobj(upload, copy)
+        # spawn rather than fork, so the workers don't share the parent's
+        # database connections
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(numProcesses, mp_context=context,
+                                 initializer=django.setup) as pool:
+            toParse = iter(members)
+            pending = deque()
+            def parseNext(count):
+                for info in islice(toParse, count):
+                    pending.append((info, pool.submit(_parseZipMember,
+                                                      copy.name,
+                                                      info.filename)))
+            parseNext(numProcesses * 2)
+            try:
+                while pending:
+                    info, parsed = pending.popleft()
+                    parseNext(1)
+                    spoolPath = parsed.result()
+                    if spoolPath is None:
+                        # only this process can register its time zones
+                        with package.open(info) as member:
+                            yield info.filename, readCalendars(member)
+                        continue
+                    calStream = _readSpool(spoolPath)
+                    try:
+                        yield info.filename, calStream
+                    finally:
+                        calStream.close()
+                        os.remove(spoolPath)
+            finally:
+                # if the load stopped early, clean up after the rest
+                for info, parsed in pending:
+                    if not parsed.cancel():
+                        with suppress(Exception):
+                            os.remove(parsed.result())
+    finally:
+        os.remove(copy.name)
+
+def _parseZipMember(path, name):
+    """
+    Parse the member with name of the zip file at path, as it is read, into
+    a spool file of the iCalendar objects and VEVENTs in it, and return the
+    path of the spool.  A parse error is recorded in the spool where it
+    happened.  Returns None if the member has a VTIMEZONE which pytz does
+    not know, as the time zone would only be registered in this process.
+    """
+    spool = NamedTemporaryFile(suffix=".pickle", delete=False)
+    try:
+        with spool, ZipFile(path) as package, package.open(name) as member:
+            pickler = pickle.Pickler(spool, pickle.HIGHEST_PROTOCOL)
+            spooled = _spoolCalendars(pickler,
+                                      readCalendars(member, timezones=True))
+    except BaseException:
+        os.remove(spool.name)
+        raise
+    if not spooled:
+        os.remove(spool.name)
+        return None
+    return spool.name
+
+def _spoolCalendars(pickler, calStream):
+    # Returns False if calStream has a time zone pytz does not know
+    try:
+        for calendar, vevents in calStream:
+            pickler.dump((_SPOOL_CALENDAR, calendar))
+            for vevent in vevents:
+                if vevent.name == "VTIMEZONE":
+                    if str(vevent['TZID']) not in pytz.all_timezones_set:
+                        return False
+                    continue
+                pickler.dump((_SPOOL_VEVENT, vevent))
+                pickler.clear_memo()
+            pickler.dump((_SPOOL_END, None))
+    except CalendarParseError as e:
+        pickler.dump((_SPOOL_ERROR, str(e)))
+    return True
+
+def _readSpool(path):
+    """
+    The (calendar, vevents) pairs of a spool written by _parseZipMember,
+    read back as they are wanted, just like readCalendars would give them.
+    """
+    with open(path, "rb") as spool:
+        records = _iterSpool(spool)
+        for kind, value in records:
+            if kind == _SPOOL_ERROR:
+                raise CalendarParseError(value)
+            vevents = _iterSpoolVEvents(records)
+            yield value, vevents
+            # skip over any VEVENTs that were not wanted
+            for vevent in vevents:
+                pass
+
+def _iterSpool(spool):
+    unpickler = pickle.Unpickler(spool)
+    while True:
+        try:
+            yield unpickler.load()
+        except EOFError:
+            return
+
+def _iterSpoolVEvents(records):
+    for kind, value in records:
+        if kind == _SPOOL_END:
+            return
+        if kind == _SPOOL_ERROR:
+            raise CalendarParseError(value)
+        yield value
+
 # ------------------------------------------------------------------------------
 class VCalendar(Calendar, VComponentMixin):
     prodVersion = ".".join(__version__.split(".", 2)[:2])
@@ -124,6 +415,97 @@ class VCalendar(Calendar, VComponentMixin):
         else:
             raise CalendarTypeError("Unsupported input page")
 
+    @classmethod
+    def exportPage(cls, page, request):
+        """
+        The iCalendar data for the page.
+        """
+        if isinstance(page, CalendarPage):
+            return cls._exportCalendarPage(page, request)
+        return cls.fromPage(page, request).to_ical()
+
+    @classmethod
+    def streamPage(cls, page, request):
+        """
+        An iterator of the iCalendar data for the calendar page, which
+        serializes its events a chunk at a time, so they are never all in
+        memory together.
+        """
+        if not isinstance(page, CalendarPage):
+            raise CalendarTypeError("Unsupported input page")
+        return cls._streamCalendarPage(page, request)
+
+    @classmethod
+    def _streamCalendarPage(cls, page, request):
+        qrys = page._getAllEventsQrys(request)
+        end = b"END:VCALENDAR\r\n"
+        yield cls(page).to_ical()[:-len(end)]
+        for tz, vspan in _getTimeZoneSpans(qrys).items():
+            yield vspan.getVTimeZoneData(tz)
+        for qry in qrys:
+            events = qry.iterator(chunk_size=STREAM_CHUNK_SIZE)
+            while True:
+                chunk = list(islice(events, STREAM_CHUNK_SIZE))
+                if not chunk:
+                    break
+                for firstDt, lastDt, data in cls._getVEventBlocks(chunk, page):
+                    yield data
+        yield end
+
+    @classmethod
+    def _exportCalendarPage(cls, page, request):
+        # Put together from the serialized events (which may be cached)
+        # rather than by building up and serializing one big VCalendar
+        events = page._getAllEvents(request)
+        blocks = cls._getVEventBlocks(events, page)
+        tzs = defaultdict(TimeZoneSpan)
+        for event, (firstDt, lastDt, data) in zip(events, blocks):
+            if event.tz and event.tz is not pytz.utc:
+                tzs[event.tz].addSpan(firstDt, lastDt)
+        end = b"END:VCALENDAR\r\n"
+        head = cls(page).to_ical()[:-len(end)]
+        parts = [head]
+        # Put timezones up top, as in _fromCalendarPage
+        parts += [vspan.getVTimeZoneData(tz) for tz, vspan in tzs.items()]
+        parts += [data for firstDt, lastDt, data in blocks]
+        parts.append(end)
+        return b"".join(parts)
+
+    @classmethod
+    def _getVEventBlocks(cls, events, calendar):
+        """
+        The (firstDt, lastDt, data) of each event, from the JOYOUS_ICAL_CACHE
+        if that is set.  A cached event is forgotten when it, or one of its
+        exceptions, is published, unpublished or deleted.
+        """
+        cache = _getICalCache()
+        if cache is None:
+            return [cls._makeVEventBlock(event, calendar) for event in events]
+        tokens = _getVEventTokens(cache, [event.id for event in events])
+        holidays = getattr(calendar.holidays, "_getSignature", lambda: None)()
+        keys = [makeCacheKey("ical.vevent", event.id, tokens[event.id],
+                             event.url_path, holidays)
+                for event in events]
+        found = cache.get_many(keys)
+        blocks = []
+        missing = {}
+        for event, key in zip(events, keys):
+            block = found.get(key)
+            if block is None:
+                block = missing[key] = cls._makeVEventBlock(event, calendar)
+            blocks.append(block)
+        if missing:
+            cache.set_many(missing)
+        return blocks
+
+    @classmethod
+    def _makeVEventBlock(cls, event, calendar):
+        vevent = cls.factory.makeFromPage(event, calendar)
+        data = vevent.to_ical()
+        data += b"".join(vchild.to_ical() for vchild in vevent.vchildren)
+        vspan = TimeZoneSpan(vevent)
+        return (vspan.firstDt, vspan.lastDt, data)
+
     @classmethod
     def _fromCalendarPage(cls, page, request):
         vcal = cls(page)
@@ -173,72 +555,177 @@ class VCalendar(Calendar, VComponentMixin):
         self.subcomponents.clear()
 
     def load(self, request, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return self.loadStream(request, BytesIO(data))
+
+    def loadStream(self, request, stream):
+        """
+        Load the events from a file-like stream of iCalendar data, reading
+        and loading them as it goes, so the whole stream is never in memory.
+        """
+        return self._loadCalStream(request, readCalendars(stream))
+
+    def _loadCalStream(self, request, calStream):
         if self.page is None:
             raise CalendarNotInitializedError("No page set")
+        if calStream is None:
+            return VResults(error=1)
 
+        self.clear()
+        results = VResults()
         # Typically, this information will consist of an iCalendar stream
         # with a single iCalendar object.  However, multiple iCalendar
         # objects can be sequentially grouped together in an iCalendar
         # stream.
         try:
-            calStream = Calendar.from_ical(data, multiple=True)
-        except Exception as e:
-            #messages.debug(request, str(e))
-            return VResults(error=1)
+            for cal, vevents in calStream:
+                tz = timezone.get_current_timezone()
+                zone = cal.get('X-WR-TIMEZONE', None)
+                if zone:
+                    try:
+                        tz = pytz.timezone(zone)
+                    except pytz.exceptions.UnknownTimeZoneError:
+                        messages.warning(request, "Unknown time zone {}".format(zone))
+                with timezone.override(tz):
+                    results += self._loadEvents(request, vevents)
+                if results.error:
+                    # the rest of the stream can't be trusted
+                    break
+        except CalendarParseError:
+            results.error += 1
+        return results
 
-        self.clear()
+    def _loadEvents(self, request, vevents):
+        # Load the events a batch at a time, so that only one batch of
+        # events and their exceptions is held in memory
         results = VResults()
-        for cal in calStream:
-            tz = timezone.get_current_timezone()
-            zone = cal.get('X-WR-TIMEZONE', None)
-            if zone:
+        vmap = {}
+        # exceptions whose recurring event has not been read yet, by UID
+        strays = {}
+        try:
+            for props in vevents:
+                uid = str(props.get('UID'))
+                if uid not in vmap and len(vmap) >= LOAD_BATCH_SIZE:
+                    results += self._loadBatch(request, vmap, strays)
+                    vmap = {}
                 try:
-                    tz = pytz.timezone(zone)
-                except pytz.exceptions.UnknownTimeZoneError:
-                    messages.warning(request, "Unknown time zone {}".format(zone))
-            with timezone.override(tz):
-                results += self._loadEvents(request, cal.walk(name="VEVENT"))
+                    match = vmap.get(uid)
+                    if match is None:
+                        match = vmap[uid] = VMatch()
+                        match.orphans.extend(strays.pop(uid, []))
+                    vevent = self.factory.makeFromProps(props, match.parent)
+                    if self.utc2local:
+                        vevent._convertTZ()
+                except CalendarTypeError:
+                    results.fail += 1
+                else:
+                    match.add(vevent)
+        except CalendarParseError:
+            # still load the events that were read before the error
+            results.error += 1
+        if vmap:
+            results += self._loadBatch(request, vmap, strays)
+        # exceptions whose recurring event never turned up
+        results.fail += sum(len(vorphans) for vorphans in strays.values())
         return results
 
-    def _loadEvents(self, request, vevents):
+    def _loadBatch(self, request, vmap, strays):
         results = VResults()
-        vmap = defaultdict(VMatch)
-        for props in vevents:
-            try:
-                match = vmap[str(props.get('UID'))]
-                vevent = self.factory.makeFromProps(props, match.parent)
-                if self.utc2local:
-                    vevent._convertTZ()
-            except CalendarTypeError as e:
+        vparents = [vmatch.parent for vmatch in vmap.values()
+                    if vmatch.parent is not None]
+        # exceptions whose recurring event was in an earlier batch
+        orphans = {uid: vmatch.orphans for uid, vmatch in vmap.items()
+                   if vmatch.parent is None and vmatch.orphans}
+        # look them all up at once
+        uids = [vevent['UID'] for vevent in vparents] + list(orphans)
+        events = self.page._getEventsFromUids(request, uids)
+        for uid, vorphans in orphans.items():
+            if uid in events:
+                results += self._adoptOrphans(request, vorphans, events[uid])
+            else:
+                # their recurring event may be in a later batch
+                strays[uid] = vorphans
+        if getattr(settings, "JOYOUS_ICAL_BULK_IMPORT", False):
+            return results + self._bulkLoadEvents(request, vparents, events)
+        for vevent in vparents:
+            uid = str(vevent['UID'])
+            if uid not in events:
+                results += self._createEventPage(request, vevent)
+            elif events[uid] is None:
+                # No authority, or it belongs to another calendar
                 results.fail += 1
-                #messages.debug(request, str(e))
             else:
-                self.add_component(vevent)
-                match.add(vevent)
+                results += self._updateEventPage(request, vevent, events[uid])
+        return results
 
-        for vmatch in vmap.values():
-            vevent = vmatch.parent
-            if vevent is not None:
-                try:
-                    event = self.page._getEventFromUid(request, vevent['UID'])
-                except PermissionDenied:
-                    # No authority
-                    results.fail += 1
-                except ObjectDoesNotExist:
-                    results += self._createEventPage(request, vevent)
-                else:
-                    results += self._updateEventPage(request, vevent, event)
+    def _bulkLoadEvents(self, request, vparents, events):
+        # Build all the new pages in memory, then create them together, and
+        # save each changed page once, all in one transaction
+        from ..utils.pagebatch import PageBatch  # only needed for bulk imports
+        results = VResults()
+        batch = PageBatch(request.user,
+                          submit=bool(request.POST.get('action-submit')),
+                          publish=bool(request.POST.get('action-publish')))
+        changed = []
+        family = {str(vevent['UID']): _getVChildren(vevent)
+                  for vevent in vparents}
+        exceptions = _getExceptionsOf(request,
+                                      [events[uid]
+                                       for uid, vchildren in family.items()
+                                       if vchildren and events.get(uid)],
+                                      {vchild.Page
+                                       for vchildren in family.values()
+                                       for vchild in vchildren})
+        for vevent in vparents:
+            uid = str(vevent['UID'])
+            vchildren = family[uid]
+            if uid not in events:
+                event = vevent.makePage(uid=vevent['UID'])
+                batch.add(self.page, event)
+                for vchild in vchildren:
+                    batch.add(event, vchild.makePage(overrides=event))
+                results.success += 1
+                continue
+            event = events[uid]
+            if event is None:
+                # No authority, or it belongs to another calendar
+                results.fail += 1
+                continue
+            allOk = True
+            if vevent.modifiedDt > event.latest_revision_created_at:
+                vevent.toPage(event)
+                changed.append(event)
+            for vchild in vchildren:
+                exceptDate = vchild['RECURRENCE-ID'].date()
+                exception = exceptions.get((vchild.Page, event.id, exceptDate))
+                if exception is None:
+                    batch.add(event, vchild.makePage(overrides=event))
+                elif not exception.authorized:
+                    allOk = False
+                elif vchild.modifiedDt > exception.latest_revision_created_at:
+                    exception.overrides = event
+                    vchild.toPage(exception)
+                    changed.append(exception)
+            results += VResults(allOk)
+
+        with transaction.atomic():
+            created = batch.save()
+            _settleCreatedPages(created, filter(None, events.values()),
+                                batch.publish)
+            for page in changed:
+                _saveRevision(request, page)
         return results
 
     def _updateEventPage(self, request, vevent, event):
-        allOk = True
         if vevent.modifiedDt > event.latest_revision_created_at:
             vevent.toPage(event)
             _saveRevision(request, event)
+        allOk = self._updateExceptions(request, event, _getVChildren(vevent))
+        return VResults(allOk)
 
-        vchildren  = vevent.vchildren[:]
-        vchildren += [CancellationVEvent.fromExDate(vevent, exDate)
-                      for exDate in vevent.exDates]
+    def _updateExceptions(self, request, event, vchildren):
+        allOk = True
         for vchild in vchildren:
             try:
                 exception = vchild.Page.objects.child_of(event)            \
@@ -250,7 +737,27 @@ class VCalendar(Calendar, VComponentMixin):
                     self._updateExceptionPage(request, vchild, exception)
                 else:
                     allOk = False
-        return VResults(allOk)
+        return allOk
+
+    def _adoptOrphans(self, request, vorphans, event):
+        # Load exceptions which turned up after their recurring event was
+        # loaded.  As before, exceptions of other events are ignored.
+        if event is None:
+            # No authority, or it belongs to another calendar
+            return VResults(fail=1)
+        if not isinstance(event, RecurringEventPage):
+            return VResults()
+        # the event as it would have been read from the file
+        vevent = self.factory.makeFromPage(event, self.page)
+        vparent = self.factory.makeFromProps(Event.from_ical(vevent.to_ical()),
+                                             None)
+        try:
+            vchildren = [self.factory.makeFromProps(vorphan, vparent)
+                         for vorphan in vorphans]
+        except CalendarTypeError:
+            return VResults(fail=1)
+        allOk = self._updateExceptions(request, event, vchildren)
+        return VResults(fail=int(not allOk))
 
     def _updateExceptionPage(self, request, vchild, exception):
         if vchild.modifiedDt > exception.latest_revision_created_at:
@@ -262,10 +769,7 @@ class VCalendar(Calendar, VComponentMixin):
         _addPage(request, self.page, event)
         _saveRevision(request, event)
 
-        vchildren  = vevent.vchildren[:]
-        vchildren += [CancellationVEvent.fromExDate(vevent, exDate)
-                      for exDate in vevent.exDates]
-        for vchild in vchildren:
+        for vchild in _getVChildren(vevent):
             self._createExceptionPage(request, event, vchild)
         return VResults(success=1)
 
@@ -286,6 +790,127 @@ def _saveRevision(request, page):
     if bool(request.POST.get('action-publish')):
         revision.publish()
 
+def _getVChildren(vevent):
+    """
+    The exceptions of vevent, including a cancellation for each EXDATE.
+    """
+    vchildren  = vevent.vchildren[:]
+    vchildren += [CancellationVEvent.fromExDate(vevent, exDate)
+                  for exDate in vevent.exDates]
+    return vchildren
+
+def _getExceptionsOf(request, events, models):
+    """
+    The exception pages of these models which override events, by model,
+    event id and date, annotated with whether request is authorized for them.
+    """
+    exceptions = {}
+    if not events:
+        return exceptions
+    eventIds = [event.id for event in events]
+    authorized = _getAuthorizedAnnotation(request)
+    for model in models:
+        for exception in model.objects.filter(overrides_id__in=eventIds)     \
+                                      .annotate(authorized=authorized):
+            key = (model, exception.overrides_id, exception.except_date)
+            exceptions[key] = exception
+    return exceptions
+
+def _settleCreatedPages(pages, events, published):
+    """
+    Do what the signals sent when saving and publishing pages one by one
+    would have done, for pages which were created in bulk as new events, or
+    as new exceptions to them or to the existing events.
+    """
+    if not pages:
+        return
+    _forgetOccurrenceMemos()
+    created = {page.id for page in pages}
+    events = {event.id: event for event in events}
+    events.update((page.id, page) for page in pages
+                  if isinstance(page, EventBase))
+    touched = [events[getattr(page, 'overrides_id', None) or page.id]
+               for page in pages]
+    touched = list({event.id: event for event in touched}.values())
+    if published:
+        _changeCalendarVersions()
+        for event in touched:
+            if event.id not in created:
+                # not until it is committed, or the old event could be cached again
+                transaction.on_commit(lambda event=event: _forgetVEvent(event))
+    if getOccurrenceHorizon():
+        for event in touched:
+            if isinstance(event, RecurringEventPage):
+                EventOccurrence.objects.refresh(event)
+
+# ------------------------------------------------------------------------------
+def _getICalCache():
+    alias = getattr(settings, "JOYOUS_ICAL_CACHE", "")
+    if alias:
+        return caches[alias]
+    return None
+
+def _getTimeZoneSpans(qrys):
+    # The time zones of the events and the dates they cover, worked out
+    # from the database without fetching the events themselves
+    tzs = defaultdict(TimeZoneSpan)
+    def addSpan(tz, fromDate, toDate):
+        if tz and tz is not pytz.utc and fromDate and toDate:
+            tzs[tz].addSpan(getAwareDatetime(fromDate, dt.time.min, tz),
+                            getAwareDatetime(toDate, dt.time.max, tz))
+
+    for qry in qrys:
+        if issubclass(qry.model, RecurringEventPage):
+            rows = qry.values_list('tz', 'repeat', 'num_days').iterator()
+            for tz, repeat, numDays in rows:
+                until = repeat.until
+                if until:
+                    toDate = until + dt.timedelta(days=numDays - 1)
+                else:
+                    toDate = dt.date(MAX_YEAR, 12, 31)
+                addSpan(tz, repeat.dtstart, toDate)
+        else:
+            if issubclass(qry.model, MultidayEventPage):
+                fromField, toField = "date_from", "date_to"
+            else:
+                fromField, toField = "date", "date"
+            rows = qry.order_by().values('tz')                               \
+                      .annotate(fromDate=Min(fromField), toDate=Max(toField)) \
+                      .values_list('tz', 'fromDate', 'toDate')
+            for tz, fromDate, toDate in rows:
+                addSpan(tz, fromDate, toDate)
+    return tzs
+
+def _getVEventTokens(cache, eventIds):
+    # The current token of each event, which is part of its cache key
+    keys = {eventId: makeCacheKey("ical.token", eventId)
+            for eventId in eventIds}
+    found = cache.get_many(keys.values())
+    tokens = {}
+    newTokens = {}
+    for eventId, key in keys.items():
+        token = found.get(key)
+        if token is None:
+            token = newTokens[key] = uuid4().hex
+        tokens[eventId] = token
+    if newTokens:
+        cache.set_many(newTokens, None)
+    return tokens
+
+def _forgetVEvent(page):
+    """
+    Forget the cached VEVENT of page, or of the event that page is an
+    exception to.
+    """
+    cache = _getICalCache()
+    if cache is None:
+        return
+    if isinstance(page, EventExceptionBase):
+        eventId = page.overrides_id
+    else:
+        eventId = page.id
+    cache.delete(makeCacheKey("ical.token", eventId))
+
 # ------------------------------------------------------------------------------
 class vDt(vDDDTypes):
     """Smooths over some date-vs-datetime and aware-vs-naive differences"""
@@ -394,7 +1019,9 @@ class TimeZoneSpan:
                 # either -- icalendar/src/icalendar/cal.py:526
                 # using replace to keep the tzinfo
                 lastDt = lastDt.replace(year=MAX_YEAR, month=12, day=31)
+        self.addSpan(firstDt, lastDt)
 
+    def addSpan(self, firstDt, lastDt):
         if self.firstDt is None or firstDt < self.firstDt:
             self.firstDt = firstDt
         if self.lastDt is None or lastDt > self.lastDt:
@@ -405,6 +1032,17 @@ class TimeZoneSpan:
             raise self.NotInitializedError()
         return create_timezone(tz, self.firstDt, self.lastDt)
 
+    def getVTimeZoneData(self, tz):
+        """The serialized VTIMEZONE, which is cached by time zone and span"""
+        if self.firstDt is None or self.lastDt is None:
+            raise self.NotInitializedError()
+        key = (str(tz), self.firstDt.isoformat(), self.lastDt.isoformat())
+        data = _vtimezoneCache.get(key)
+        if data is None:
+            data = self.createVTimeZone(tz).to_ical()
+            _vtimezoneCache.set(key, data)
+        return data
+
 # ------------------------------------------------------------------------------
 class VMatch:
     """Matches recurring events with their exceptions"""
@@ -708,12 +1346,15 @@ class RecurringVEvent(VEvent):
             excludes.add(excludeDt)
             # NB any cancellation title or details are going to be lost
 
-        for shutdown in ExtCancellationPage.events.child_of(page):
+        shutdowns = DateIntervalIndex.fromShutdowns(
+                                ExtCancellationPage.events.child_of(page))
+        # overlapping shutdowns are merged so each date is only visited once
+        for fromDate, toDate in shutdowns.spans(toDate=dt.date(MAX_YEAR,1,1)):
             # TODO Consider using RANGE:THISANDFUTURE
-            for shutDate in shutdown._getMyDates(toDate=dt.date(MAX_YEAR,1,1)):
+            for shutDate in page.repeat.between(fromDate, toDate, inc=True):
                 excludeDt = getAwareDatetime(shutDate,
-                                             shutdown.time_from,
-                                             shutdown.tz, dt.time.min)
+                                             page.time_from,
+                                             page.tz, dt.time.min)
                 excludes.add(excludeDt)
                 # NB any cancellation title or details are going to be lost
                 # ExtCancellationPage does not round-trip.  All imported
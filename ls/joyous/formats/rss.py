@@ -16,6 +16,8 @@ from .errors import CalendarTypeError
 class RssHandler:
     """Serve a RSS Feed"""
     def serve(self, page, request, *args, **kwargs):
+        # The feed is of upcoming events, which change as events start, so
+        # it is not served conditionally like the other calendar views
         try:
             feed = CalendarFeed.fromPage(page, request)
         except CalendarTypeError:
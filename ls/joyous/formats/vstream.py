@@ -0,0 +1,130 @@
+# ------------------------------------------------------------------------------
+# Reading an iCalendar stream a component at a time
+# ------------------------------------------------------------------------------
+import re
+from icalendar import Calendar
+from icalendar.cal import Component
+from .errors import CalendarParseError
+
+# ------------------------------------------------------------------------------
+# How many bytes to read from the stream at a time
+READ_SIZE = 64 * 1024
+
+# The name of a content line, e.g. BEGIN, END, or DTSTART
+_NAME = re.compile(rb"[A-Za-z0-9-]*")
+
+# ------------------------------------------------------------------------------
+def readCalendars(stream, readSize=READ_SIZE, timezones=False):
+    """
+    Read the iCalendar objects in stream as it goes, rather than all at
+    once.  Yields a (calendar, vevents) pair for each one, where calendar
+    has the properties of the iCalendar object, and vevents is an iterator
+    of its VEVENTs.  Each VEVENT is parsed when it is reached, so only one
+    is held at a time.  A VTIMEZONE is parsed too, so that the VEVENTs
+    after it can use its time zone, and is included amongst the VEVENTs if
+    timezones is True.  Raises CalendarParseError if the stream can't be
+    parsed, which may be after some VEVENTs are read.
+    """
+    lines = _iterLines(stream, readSize)
+    for line in lines:
+        name = _getName(line)
+        if name != b"BEGIN":
+            raise CalendarParseError("Content line outside of a component")
+        if _getValue(line) != b"VCALENDAR":
+            # not a calendar, but it might be a VEVENT all by itself
+            component = _parse(_readBlock(line, lines))
+            yield component, iter(component.walk(name="VEVENT"))
+            continue
+        header = [line]
+        for line in lines:
+            if _getName(line) in (b"BEGIN", b"END"):
+                break
+            header.append(line)
+        else:
+            raise CalendarParseError("Missing END:VCALENDAR")
+        header.append(b"END:VCALENDAR")
+        calendar = _parse(header, Calendar)
+        vevents = _iterVEvents(line, lines, timezones)
+        yield calendar, vevents
+        # skip over any VEVENTs that were not wanted
+        for vevent in vevents:
+            pass
+
+def _iterVEvents(line, lines, timezones=False):
+    # The VEVENTs of the calendar, starting with the component of line
+    while _getName(line) != b"END":
+        if _getName(line) == b"BEGIN":
+            block = _readBlock(line, lines)
+            kind = _getValue(line)
+            if kind == b"VEVENT":
+                yield _parse(block)
+            elif kind == b"VTIMEZONE":
+                # parsing registers the time zone if pytz doesn't know it
+                vtimezone = _parse(block)
+                if timezones:
+                    yield vtimezone
+        line = next(lines, None)
+        if line is None:
+            raise CalendarParseError("Missing END:VCALENDAR")
+
+def _readBlock(line, lines):
+    # The lines of a component, from its BEGIN line to its END line
+    block = [line]
+    depth = 1
+    for line in lines:
+        block.append(line)
+        name = _getName(line)
+        if name == b"BEGIN":
+            depth += 1
+        elif name == b"END":
+            depth -= 1
+            if depth == 0:
+                return block
+    raise CalendarParseError("Missing END:{}".format(
+                             _getValue(block[0]).decode(errors="replace")))
+
+def _parse(block, componentClass=Component):
+    try:
+        return componentClass.from_ical(b"\r\n".join(block))
+    except Exception as e:
+        raise CalendarParseError(str(e)) from e
+
+def _iterLines(stream, readSize):
+    # The content lines of stream, unfolded, without their line endings
+    line = b""
+    rest = b""
+    while True:
+        chunk = stream.read(readSize)
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if chunk:
+            rest += chunk
+            rawLines = rest.split(b"\n")
+            rest = rawLines.pop()
+        else:
+            rawLines = [rest]
+        for raw in rawLines:
+            raw = raw.rstrip(b"\r")
+            if not raw:
+                continue
+            if raw[:1] in (b" ", b"\t"):
+                # a folded line
+                line += raw[1:]
+            else:
+                if line:
+                    yield line
+                line = raw
+        if not chunk:
+            break
+    if line:
+        yield line
+
+def _getName(line):
+    return _NAME.match(line).group().upper()
+
+def _getValue(line):
+    return line.partition(b":")[2].strip().upper()
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -2,9 +2,12 @@
 # Joyous Holidays
 # ------------------------------------------------------------------------------
 import datetime as dt
+import sys
 from itertools import chain
 from collections import defaultdict, OrderedDict
 from django.conf import settings
+from django.core.cache import caches
+from ..utils.cache import makeCacheKey
 from .parser import parseHolidays
 
 class Holidays:
@@ -12,8 +15,23 @@ class Holidays:
     def __init__(self, holidaySetting="JOYOUS_HOLIDAYS"):
         self.setting = holidaySetting
         self.simple = {}
-        self.srcs = [ self.simple ]
-        self._parseSettings()
+        self._srcs = [ self.simple ]
+        # holiday names by date ordinal, for each year looked at
+        self._index = {}
+        # (year, names) and (year, {name: date}) for each source
+        self._names = None
+        self._srcNames = {}
+        # the setting is read now, but not parsed until it is needed
+        self._holidaySettings = None
+        if self.setting:
+            self._holidaySettings = getattr(settings, self.setting, "")
+
+    @property
+    def srcs(self):
+        """The sources of holiday data."""
+        if self._holidaySettings is not None:
+            self._parseSettings()
+        return self._srcs
 
     def __add__(self, other):
         retval = Holidays(None)
@@ -24,16 +42,18 @@ class Holidays:
         return retval
 
     def _parseSettings(self):
-        if self.setting:
-            holidaySettings = getattr(settings, self.setting, "")
-            if holidaySettings:
-                hols = parseHolidays(holidaySettings)
-                if hols is not None:
-                    self.register(hols)
+        holidaySettings = self._holidaySettings
+        self._holidaySettings = None
+        if holidaySettings:
+            hols = parseHolidays(holidaySettings)
+            if hols is not None:
+                self.register(hols)
 
     def register(self, src):
         """Register a new source of holiday data."""
         self.srcs.append(src)
+        self._index.clear()
+        self._forgetNames()
 
     def add(self, date, value):
         """Add a holiday to an individual date."""
@@ -43,9 +63,74 @@ class Holidays:
                 self.simple[date] = "{}, {}".format(oldValue, value)
         else:
             self.simple[date] = value
+        self._index.pop(date.year, None)
+        self._srcNames.pop(0, None)
+        self._forgetNames()
 
     def get(self, date):
         """Get all the holidays that are celebrated on this date."""
+        yearIndex = self._getYearIndex(date.year)
+        if yearIndex is None:
+            return self._lookup(date)
+        return yearIndex.get(date.toordinal(), "")
+
+    def between(self, fromDate, toDate):
+        """
+        Get all the holidays that are celebrated from fromDate to toDate
+        (inclusive), as a dict of date to holidays.
+        """
+        retval = {}
+        for year in range(fromDate.year, toDate.year + 1):
+            yearIndex = self._getYearIndex(year)
+            if yearIndex is None:
+                yearFrom = max(fromDate, dt.date(year, 1, 1))
+                yearTo   = min(toDate, dt.date(year, 12, 31))
+                for ordinal in range(yearFrom.toordinal(),
+                                     yearTo.toordinal() + 1):
+                    date = dt.date.fromordinal(ordinal)
+                    holiday = self._lookup(date)
+                    if holiday:
+                        retval[date] = holiday
+            else:
+                for ordinal in sorted(yearIndex):
+                    date = dt.date.fromordinal(ordinal)
+                    if fromDate <= date <= toDate:
+                        retval[date] = yearIndex[ordinal]
+        return retval
+
+    def _getYearIndex(self, year):
+        # The holidays of the year by date ordinal, or None if some source
+        # can only be asked about one date at a time
+        yearIndex = self._index.get(year)
+        if yearIndex is None and year not in self._index:
+            yearIndex = self._index[year] = self._buildYearIndex(year)
+        return yearIndex
+
+    def _buildYearIndex(self, year):
+        holidays = defaultdict(list)
+        for src in self.srcs:
+            items = getattr(src, "items", None)
+            if items:
+                # get from python-holidays and other dict type srcs
+                # n.b. getting a date populates its year in python-holidays
+                src.get(dt.date(year, 1, 1))
+                dateHolidays = ((date, holiday) for date, holiday in items()
+                                if date.year == year)
+            elif callable(getattr(src, "holidays", None)):
+                # get from workalendar srcs
+                dateHolidays = src.holidays(year)
+            else:
+                return None
+            for date, holiday in dateHolidays:
+                if holiday:
+                    holidays[date.toordinal()].extend(holiday.split(", "))
+        yearIndex = {}
+        for ordinal, names in holidays.items():
+            names = OrderedDict.fromkeys(names)   # remove duplicates
+            yearIndex[ordinal] = sys.intern(", ".join(names))
+        return yearIndex
+
+    def _lookup(self, date):
         holidays = []
         for src in self.srcs:
             # get from python-holidays and other dict type srcs
@@ -62,45 +147,97 @@ class Holidays:
     def names(self):
         """Get a list of all the holiday names, sorted by month-day."""
         thisYear = dt.date.today().year
-        popYears = list(range(thisYear - 1, thisYear + 10))
-        holidays = defaultdict(list)
-        for src in self.srcs:
-            # populate python-holidays calendar
-            populate = getattr(src, "_populate", None)
-            if populate:
-                for year in popYears:
-                    populate(year)
-
-            # get from python-holidays and other dict type srcs
-            items = getattr(src, "items", None)
-            if items:
-                for date, names in items():
-                    # holidays may have been concatenated together
-                    for name in names.split(", "):
-                        holidays[name].append(date)
-            else:
-                # get from workalendar srcs
-                getHolidays = getattr(src, "get_calendar_holidays", None)
-                if getHolidays:
-                    for year in popYears:
-                        for date, name in getHolidays(year):
-                            holidays[name].append(date)
+        if self._names is not None and self._names[0] == thisYear:
+            return list(self._names[1])
+        sharedCache = _getSharedCache()
+        if sharedCache is not None:
+            key = makeCacheKey("holidays.names", thisYear, self._getSignature())
+            names = sharedCache.get(key)
+            if names is None:
+                names = self._calcNames(thisYear)
+                sharedCache.set(key, names)
+        else:
+            names = self._calcNames(thisYear)
+        self._names = (thisYear, names)
+        return list(names)
 
+    def _calcNames(self, thisYear):
         # sort holidays by month-day with a preference for a more recent year
-        mmddHolidays = []
         def moreRecent(date):
             delta2 = (date.year - thisYear) * 2
             if delta2 < 0:
                 # slight preference for future years over past years
                 delta2 = -delta2 + 1
             return delta2
-        for name, dates in holidays.items():
-            mostRecent = min(dates, key=moreRecent)
-            mmddHolidays.append(((mostRecent.month, mostRecent.day), name))
+        holidays = {}
+        for num, src in enumerate(self.srcs):
+            srcNames = self._srcNames.get(num)
+            if srcNames is None or srcNames[0] != thisYear:
+                srcNames = (thisYear, self._calcSrcNames(src, thisYear,
+                                                         moreRecent))
+                self._srcNames[num] = srcNames
+            for name, date in srcNames[1].items():
+                if name in holidays:
+                    date = min(holidays[name], date, key=moreRecent)
+                holidays[name] = date
+        mmddHolidays = [((date.month, date.day), name)
+                        for name, date in holidays.items()]
         mmddHolidays.sort()
         retval = [name for mmdd, name in mmddHolidays]
         return retval
 
+    def _calcSrcNames(self, src, thisYear, moreRecent):
+        # The most recent date of each holiday of the source
+        popYears = list(range(thisYear - 1, thisYear + 10))
+        holidays = defaultdict(list)
+        # populate python-holidays calendar
+        populate = getattr(src, "_populate", None)
+        if populate:
+            for year in popYears:
+                populate(year)
+
+        # get from python-holidays and other dict type srcs
+        items = getattr(src, "items", None)
+        if items:
+            for date, names in items():
+                # holidays may have been concatenated together
+                for name in names.split(", "):
+                    holidays[name].append(date)
+        else:
+            # get from workalendar srcs
+            getHolidays = getattr(src, "get_calendar_holidays", None)
+            if getHolidays:
+                for year in popYears:
+                    for date, name in getHolidays(year):
+                        holidays[name].append(date)
+        return {name: min(dates, key=moreRecent)
+                for name, dates in holidays.items()}
+
+    def _forgetNames(self):
+        self._names = None
+
+    def _getSignature(self):
+        # Describes the holidays, the same way in every process
+        return (sorted(self.simple.items()),
+                [_getSrcSignature(src) for src in self.srcs[1:]])
+
+# ------------------------------------------------------------------------------
+def _getSrcSignature(src):
+    parts = getattr(src, "holidays", None)
+    if isinstance(parts, list):
+        # a python-holidays HolidaySum
+        return [_getSrcSignature(part) for part in parts]
+    cls = type(src)
+    attrs = [getattr(src, attr, None)
+             for attr in ("prov", "state", "subdiv", "observed")]
+    return ["{}.{}".format(cls.__module__, cls.__qualname__)] + attrs
+
+def _getSharedCache():
+    alias = getattr(settings, "JOYOUS_HOLIDAYS_CACHE", "")
+    if alias:
+        return caches[alias]
+    return None
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
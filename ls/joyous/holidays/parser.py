@@ -19,9 +19,11 @@ def _createMap(symbols):
             issubclass(cls, HolidayBase) and
             cls is not HolidayBase):
             holidayMap[name] = cls
-            obj = cls()
-            if hasattr(obj, "country"):
-                holidayMap.setdefault(obj.country, cls)
+            # country is a class attribute, so there is no need to create
+            # an instance of every country's holidays just to read it
+            country = getattr(cls, "country", None)
+            if country is not None:
+                holidayMap.setdefault(country, cls)
 
     return holidayMap
 
@@ -0,0 +1,20 @@
+# ------------------------------------------------------------------------------
+# Roll the materialized occurrences forward
+# ------------------------------------------------------------------------------
+from django.core.management.base import BaseCommand
+from ...models import refreshOccurrences
+from ...models.occurrences import getOccurrenceHorizon
+
+class Command(BaseCommand):
+    help = "Roll the materialized event occurrences forward to today."
+
+    def handle(self, *args, **options):
+        if not getOccurrenceHorizon():
+            self.stderr.write("JOYOUS_OCCURRENCE_HORIZON is not set")
+            return
+        count = refreshOccurrences()
+        self.stdout.write("Refreshed the occurrences of {} events".format(count))
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -0,0 +1,16 @@
+# ------------------------------------------------------------------------------
+# Run the background imports which are waiting in the database
+# ------------------------------------------------------------------------------
+from django.core.management.base import BaseCommand
+from ...formats.ical import runQueuedImportJobs
+
+class Command(BaseCommand):
+    help = "Run the queued iCal import jobs."
+
+    def handle(self, *args, **options):
+        count = runQueuedImportJobs()
+        self.stdout.write("Ran {} import jobs".format(count))
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('joyous', '0017_extcancellationpage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventOccurrenceHorizon',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='joyous.recurringeventpage')),
+                ('from_date', models.DateField(verbose_name='from date')),
+                ('to_date', models.DateField(verbose_name='to date')),
+            ],
+            options={
+                'verbose_name': 'event occurrence horizon',
+                'verbose_name_plural': 'event occurrence horizons',
+            },
+        ),
+        migrations.CreateModel(
+            name='EventOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text="The date of the occurrence in the event's time zone", verbose_name='date')),
+                ('start', models.DateTimeField(verbose_name='start')),
+                ('finish', models.DateTimeField(verbose_name='finish')),
+                ('kind', models.CharField(blank=True, choices=[('', 'occurrence'), ('extrainfo', 'extra information'), ('cancellation', 'cancellation'), ('postponement', 'postponement'), ('extcancellation', 'extended cancellation')], default='', max_length=20, verbose_name='kind')),
+                ('title', models.CharField(blank=True, max_length=255, verbose_name='title')),
+                ('url_path', models.TextField(blank=True, verbose_name='URL path')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='joyous.recurringeventpage')),
+            ],
+            options={
+                'verbose_name': 'event occurrence',
+                'verbose_name_plural': 'event occurrences',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=models.Index(fields=['event', 'date'], name='joyous_even_event_i_97d6f0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=models.Index(fields=['date'], name='joyous_even_date_132d9b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=models.Index(fields=['start'], name='joyous_even_start_bb55f6_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('joyous', '0018_eventoccurrence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarVersion',
+            fields=[
+                ('calendar', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='joyous.calendarpage')),
+                ('version', models.CharField(max_length=32, verbose_name='version')),
+                ('modified_at', models.DateTimeField(verbose_name='modified at')),
+            ],
+            options={
+                'verbose_name': 'calendar version',
+                'verbose_name_plural': 'calendar versions',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('joyous', '0019_calendarversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload', models.FileField(blank=True, upload_to='joyous/imports/', verbose_name='upload')),
+                ('name', models.CharField(blank=True, max_length=255, verbose_name='name')),
+                ('utc2local', models.BooleanField(default=True, verbose_name='convert UTC to localtime')),
+                ('submit', models.BooleanField(default=False, verbose_name='submit for moderation')),
+                ('publish', models.BooleanField(default=False, verbose_name='publish')),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='queued', max_length=10, verbose_name='status')),
+                ('files', models.JSONField(blank=True, default=list, help_text='The results of each calendar file imported so far', verbose_name='files')),
+                ('messages', models.JSONField(blank=True, default=list, verbose_name='messages')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished at')),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='joyous.calendarpage')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'import job',
+                'verbose_name_plural': 'import jobs',
+            },
+        ),
+    ]
@@ -23,6 +23,11 @@ from .recurring_events import ExtCancellationPage
 from .recurring_events import ClosedForHolidaysPage
 from .recurring_events import ClosedFor
 
+# Materialized Occurrences
+from .occurrences import EventOccurrence
+from .occurrences import EventOccurrenceHorizon
+from .occurrences import refreshOccurrences
+
 # Events API
 from .events_api import getAllEventsByDay
 from .events_api import getAllEventsByWeek
@@ -30,7 +35,9 @@ from .events_api import getAllUpcomingEvents
 from .events_api import getAllPastEvents
 from .events_api import getGroupUpcomingEvents
 from .events_api import getEventFromUid
+from .events_api import getEventsFromUids
 from .events_api import getAllEvents
+from .events_api import getAuthorizedFingerprint
 from .events_api import removeContentPanels
 
 # Calendars
@@ -38,6 +45,10 @@ from .calendar import CalendarPage
 from .calendar import CalendarPageForm
 from .calendar import SpecificCalendarPage
 from .calendar import GeneralCalendarPage
+from .calendar import CalendarVersion
+
+# Imports
+from .imports import ImportJob
 
 # Groups
 from .groups import GroupPage
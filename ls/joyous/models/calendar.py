@@ -3,15 +3,22 @@
 # ------------------------------------------------------------------------------
 import datetime as dt
 import calendar
+import hashlib
+from uuid import uuid4
 from django.conf import settings
+from django.core.cache import caches
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models import Q
 from django.http import Http404
 from django import forms
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.utils import timezone
+from django.utils import translation
 from django.utils.translation import gettext_lazy as _
 from wagtail.core.models import Page, Site
 from wagtail.core.fields import RichTextField
@@ -19,15 +26,20 @@ from wagtail.admin.edit_handlers import HelpPanel, FieldPanel, MultiFieldPanel
 from wagtail.contrib.routable_page.models import RoutablePageMixin, route
 from wagtail.search import index
 from .. import __version__
-from ..edit_handlers import ConcealedPanel
+from ..edit_handlers import ConcealedPanel, ImportJobsPanel
 from ..holidays import Holidays
 from ..utils.names import WEEKDAY_NAMES, MONTH_NAMES, MONTH_ABBRS
 from ..utils.weeks import week_info, gregorian_to_week_date, num_weeks_in_year
 from ..utils.weeks import weekday_abbr, weekday_name
 from ..utils.mixins import ProxyPageMixin
+from ..utils.cache import makeCacheKey
 from ..fields import MultipleSelectField
-from . import (getAllEventsByDay, getAllEventsByWeek, getAllUpcomingEvents,
-               getAllPastEvents, getEventFromUid, getAllEvents)
+from . import (getAllEventsByDay, getAllEventsByWeek,
+               getEventFromUid, getEventsFromUids,
+               getAllEvents,
+               getAuthorizedFingerprint)
+from .events_api import (_getAllEventsQrys, _getUpcomingTimeline,
+        _getPastTimeline)
 from ..forms import FormDefender, BorgPageForm
 
 # ------------------------------------------------------------------------------
@@ -68,6 +80,7 @@ class CalendarPageForm(BorgPageForm):
         CalendarPage.settings_panels.append(Panel([
               FieldPanel('upload'),
               FieldPanel('utc2local'),
+              ImportJobsPanel(),
             ], heading=_("Import")))
 
     @classmethod
@@ -91,7 +104,12 @@ class CalendarPageForm(BorgPageForm):
             utc2local = self.cleaned_data.get('utc2local')
             upload = self.cleaned_data.get('upload')
             if upload is not None:
-                self.importHandler.load(page, request, upload, utc2local=utc2local)
+                if getattr(settings, "JOYOUS_IMPORT_IN_BACKGROUND", False):
+                    self.importHandler.loadLater(page, request, upload,
+                                                 utc2local=utc2local)
+                else:
+                    self.importHandler.load(page, request, upload,
+                                            utc2local=utc2local)
 
         if commit:
             page.save()
@@ -144,6 +162,15 @@ class CalendarPage(RoutablePageMixin, Page, metaclass=FormDefender):
             heading=_("View Options")),
         ]
 
+    def serve(self, request, *args, **kwargs):
+        """Serve a calendar view, unless the request has it already."""
+        parent = super()
+        serve = lambda: parent.serve(request, *args, **kwargs)
+        view = args[0] if args else kwargs.get('view')
+        if self._isTimeDependent(request, view):
+            return serve()
+        return self._serveConditionally(request, serve)
+
     @route(r"^$")
     @route(r"^{YYYY}/$".format(**DatePictures))
     def routeDefault(self, request, year=None):
@@ -213,7 +240,9 @@ class CalendarPage(RoutablePageMixin, Page, metaclass=FormDefender):
                     'thisMonthUrl': myUrl(today.year, today.month),
                     'monthName':    MONTH_NAMES[month],
                     'weekdayAbbr':  weekday_abbr,
-                    'events':       self._getEventsByWeek(request, year, month)})
+                    'events':       self._getCachedEvents(request,
+                                                          self._getEventsByWeek,
+                                                          year, month)})
         cxt.update(self._getExtraContext("month"))
         return TemplateResponse(request,
                                 "joyous/calendar_month.html",
@@ -244,7 +273,8 @@ class CalendarPage(RoutablePageMixin, Page, metaclass=FormDefender):
         if week == 53 and yearNumWeeks == 52:
             raise Http404("Only 52 weeks in {}".format(year))
 
-        eventsInWeek = self._getEventsByDay(request, firstDay, lastDay)
+        eventsInWeek = self._getCachedEvents(request, self._getEventsByDay,
+                                             firstDay, lastDay)
         if firstDay.year >= 1900:
             monthlyUrl = myurl + self.reverse_subpage('serveMonth',
                                                       args=[firstDay.year, firstDay.month])
@@ -399,7 +429,9 @@ class CalendarPage(RoutablePageMixin, Page, metaclass=FormDefender):
                     'calendarUrl':  self.get_url(request),
                     'monthName':    MONTH_NAMES[month],
                     'weekdayInfo':  zip(weekday_abbr, weekday_name),
-                    'events':       self._getEventsByWeek(request, year, month)})
+                    'events':       self._getCachedEvents(request,
+                                                          self._getEventsByWeek,
+                                                          year, month)})
         cxt.update(self._getExtraContext("mini"))
         return TemplateResponse(request,
                                 "joyous/includes/minicalendar.html",
@@ -439,6 +471,93 @@ class CalendarPage(RoutablePageMixin, Page, metaclass=FormDefender):
     def _getExtraContext(self, route):
         return {}
 
+    def _getCachedEvents(self, request, getEvents, *args):
+        """
+        Return getEvents(request, *args), from the JOYOUS_CALENDAR_CACHE if
+        that is set.  The cached events are for this calendar, site, time
+        zone, language, day and authorized fingerprint (so are shared by
+        viewers who pass the same view restrictions), and are forgotten when
+        the version of the calendar changes.
+        """
+        cache = _getCalendarCache()
+        if cache is None:
+            return getEvents(request, *args)
+        site = Site.find_for_request(request)
+        version, modifiedAt = self._getVersion(request)
+        key = makeCacheKey("calendar.events", self.id, version,
+                           getEvents.__name__, *args,
+                           getattr(site, 'id', None),
+                           timezone.get_current_timezone_name(),
+                           translation.get_language(),
+                           timezone.localdate(),
+                           getAuthorizedFingerprint(request))
+        events = cache.get(key)
+        if events is None:
+            events = getEvents(request, *args)
+            cache.set(key, events)
+        else:
+            # the holidays of the pages are not cached
+            _setHolidays(events, self.holidays)
+        return events
+
+    def _getVersion(self, request):
+        """
+        The (version, modified_at) of this calendar, which is only looked up
+        once per request.
+        """
+        cached = getattr(request, "_joyousCalendarVersion", None)
+        if cached is None or cached[0] != self.id:
+            cached = (self.id, CalendarVersion.objects.getVersion(self.id))
+            request._joyousCalendarVersion = cached
+        return cached[1]
+
+    def _getValidators(self, request):
+        """
+        The ETag and Last-Modified time of this calendar for request.
+        """
+        version, modifiedAt = self._getVersion(request)
+        today = timezone.localdate()
+        etag = hashlib.md5("|".join(str(part) for part in
+                                    (version, request.user.pk,
+                                     getAuthorizedFingerprint(request),
+                                     timezone.get_current_timezone_name(),
+                                     translation.get_language(), today))
+                              .encode("utf-8")).hexdigest()
+        # what is shown can depend upon what day it is, e.g. today's events
+        midnight = timezone.localtime().replace(hour=0, minute=0, second=0,
+                                                microsecond=0)
+        lastModified = max(modifiedAt, midnight)
+        return '"{}"'.format(etag), int(lastModified.timestamp())
+
+    def _isTimeDependent(self, request, view):
+        """
+        Does what view shows change during the day, as events start and
+        finish?  Such views are not given validators, as they would have to
+        change then too.
+        """
+        name = getattr(view, '__name__', None)
+        if name == "routeDefault":
+            return request.GET.get('view', self.default_view) in ("L", "list")
+        return name in ("serveUpcoming", "servePast")
+
+    def _serveConditionally(self, request, serve):
+        """
+        Return the response of serve() with an ETag and Last-Modified, or a
+        304 Not Modified, without calling serve(), if the request already
+        has this version.
+        """
+        if request.method not in ("GET", "HEAD") or self.id is None:
+            return serve()
+        etag, lastModified = self._getValidators(request)
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=lastModified)
+        if response is None:
+            response = serve()
+        if response is not None and response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(lastModified)
+        return response
+
     def _getEventsOnDay(self, request, day):
         """Return all the events in this site for a given day."""
         return self._getEventsByDay(request, day, day)[0]
@@ -462,12 +581,12 @@ class CalendarPage(RoutablePageMixin, Page, metaclass=FormDefender):
     def _getUpcomingEvents(self, request):
         """Return the upcoming events in this site."""
         home = Site.find_for_request(request).root_page
-        return getAllUpcomingEvents(request, home=home, holidays=self.holidays)
+        return _getUpcomingTimeline(request, home=home, holidays=self.holidays)
 
     def _getPastEvents(self, request):
         """Return the past events in this site."""
         home = Site.find_for_request(request).root_page
-        return getAllPastEvents(request, home=home, holidays=self.holidays)
+        return _getPastTimeline(request, home=home, holidays=self.holidays)
 
     def _getEventFromUid(self, request, uid):
         """Try and find an event with the given UID in this site."""
@@ -477,11 +596,24 @@ class CalendarPage(RoutablePageMixin, Page, metaclass=FormDefender):
             # only return event if it is in the same site
             return event
 
+    def _getEventsFromUids(self, request, uids):
+        """
+        Find the events with any of the given UIDs, mapping those which are
+        not in this site to None.
+        """
+        home = Site.find_for_request(request).root_page
+        return getEventsFromUids(request, uids, home=home)
+
     def _getAllEvents(self, request):
         """Return all the events in this site."""
         home = Site.find_for_request(request).root_page
         return getAllEvents(request, home=home, holidays=self.holidays)
 
+    def _getAllEventsQrys(self, request):
+        """Return querysets of all the events in this site, unsorted."""
+        home = Site.find_for_request(request).root_page
+        return _getAllEventsQrys(request, home=home, holidays=self.holidays)
+
     def _paginate(self, request, events):
         paginator = Paginator(events, self.EventsPerPage)
         try:
@@ -492,6 +624,92 @@ class CalendarPage(RoutablePageMixin, Page, metaclass=FormDefender):
             eventsPage = paginator.page(paginator.num_pages)
         return eventsPage
 
+# ------------------------------------------------------------------------------
+def _getCalendarCache():
+    alias = getattr(settings, "JOYOUS_CALENDAR_CACHE", "")
+    if alias:
+        return caches[alias]
+    return None
+
+def _changeCalendarVersions(page=None):
+    """
+    Give new versions to the calendars which could show page, or to all
+    calendars if page is None.
+    """
+    calendars = CalendarPage.objects.all()
+    if isinstance(page, CalendarPage):
+        calendars = calendars.filter(id=page.id)
+    elif page is not None:
+        # a SpecificCalendarPage only shows its own descendants
+        specific = SpecificCalendarPage._getContentType()
+        ancestorPaths = [page.path[:pos]
+                         for pos in range(page.steplen, len(page.path),
+                                          page.steplen)]
+        calendars = calendars.exclude(~Q(path__in=ancestorPaths),
+                                      content_type=specific)
+    CalendarVersion.objects.change(calendars.values('id'))
+
+def _setHolidays(events, holidays):
+    """
+    Give the pages of events read back from the cache the holidays which
+    were dropped when they were pickled.  events may be nested in weeks.
+    """
+    for item in events:
+        if isinstance(item, list):
+            _setHolidays(item, holidays)
+            continue
+        for event in getattr(item, 'all_events', [item]):
+            page = getattr(event, 'page', event)
+            if hasattr(page, 'holidays'):
+                page.holidays = holidays
+
+# ------------------------------------------------------------------------------
+class CalendarVersionQuerySet(models.QuerySet):
+    def getVersion(self, calendarId):
+        """
+        The (version, modified_at) of the calendar with calendarId.
+        """
+        version = self.filter(calendar_id=calendarId)                        \
+                      .values_list('version', 'modified_at').first()
+        if version is None:
+            calVersion, created = self.get_or_create(calendar_id=calendarId,
+                    defaults={'version':     uuid4().hex,
+                              'modified_at': timezone.now()})
+            version = (calVersion.version, calVersion.modified_at)
+        return version
+
+    def change(self, calendarIds):
+        """
+        Give new versions to the calendars with calendarIds.  Calendars
+        which do not have a version yet will get one when it is asked for.
+        """
+        self.filter(calendar_id__in=calendarIds)                             \
+            .update(version=uuid4().hex, modified_at=timezone.now())
+
+class CalendarVersion(models.Model):
+    """
+    The version of the content of a calendar.  It changes whenever an event
+    or exception that the calendar could show is published, unpublished,
+    moved or deleted, and is used to validate cached copies of the calendar.
+    """
+    class Meta:
+        verbose_name = _("calendar version")
+        verbose_name_plural = _("calendar versions")
+
+    objects = CalendarVersionQuerySet.as_manager()
+
+    # A random version, rather than a count, so that a version is never
+    # repeated even if this is deleted and created again
+    calendar = models.OneToOneField("joyous.CalendarPage",
+                                    on_delete=models.CASCADE,
+                                    primary_key=True,
+                                    related_name="+")
+    version = models.CharField(_("version"), max_length=32)
+    modified_at = models.DateTimeField(_("modified at"))
+
+    def __str__(self):
+        return "{} {}".format(self.calendar_id, self.version)
+
 # ------------------------------------------------------------------------------
 class SpecificCalendarPage(ProxyPageMixin, CalendarPage):
     """
@@ -522,11 +740,11 @@ class SpecificCalendarPage(ProxyPageMixin, CalendarPage):
 
     def _getUpcomingEvents(self, request):
         """Return my upcoming child events."""
-        return getAllUpcomingEvents(request, home=self, holidays=self.holidays)
+        return _getUpcomingTimeline(request, home=self, holidays=self.holidays)
 
     def _getPastEvents(self, request):
         """Return my past child events."""
-        return getAllPastEvents(request, home=self, holidays=self.holidays)
+        return _getPastTimeline(request, home=self, holidays=self.holidays)
 
     def _getEventFromUid(self, request, uid):
         """Try and find a child event with the given UID."""
@@ -535,10 +753,21 @@ class SpecificCalendarPage(ProxyPageMixin, CalendarPage):
             # only return event if it is a descendant
             return event
 
+    def _getEventsFromUids(self, request, uids):
+        """
+        Find the events with any of the given UIDs, mapping those which are
+        not my children to None.
+        """
+        return getEventsFromUids(request, uids, home=self)
+
     def _getAllEvents(self, request):
         """Return all my child events."""
         return getAllEvents(request, home=self, holidays=self.holidays)
 
+    def _getAllEventsQrys(self, request):
+        """Return querysets of all my child events, unsorted."""
+        return _getAllEventsQrys(request, home=self, holidays=self.holidays)
+
 # ------------------------------------------------------------------------------
 class GeneralCalendarPage(ProxyPageMixin, CalendarPage):
     """
@@ -568,20 +797,28 @@ class GeneralCalendarPage(ProxyPageMixin, CalendarPage):
 
     def _getUpcomingEvents(self, request):
         """Return all the upcoming events."""
-        return getAllUpcomingEvents(request, holidays=self.holidays)
+        return _getUpcomingTimeline(request, holidays=self.holidays)
 
     def _getPastEvents(self, request):
         """Return all the past events."""
-        return getAllPastEvents(request, holidays=self.holidays)
+        return _getPastTimeline(request, holidays=self.holidays)
 
     def _getEventFromUid(self, request, uid):
         """Try and find an event with the given UID."""
         return getEventFromUid(request, uid) # might raise exception
 
+    def _getEventsFromUids(self, request, uids):
+        """Find the events with any of the given UIDs."""
+        return getEventsFromUids(request, uids)
+
     def _getAllEvents(self, request):
         """Return all the events."""
         return getAllEvents(request, holidays=self.holidays)
 
+    def _getAllEventsQrys(self, request):
+        """Return querysets of all the events, unsorted."""
+        return _getAllEventsQrys(request, holidays=self.holidays)
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
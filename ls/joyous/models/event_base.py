@@ -3,11 +3,13 @@
 # ------------------------------------------------------------------------------
 import datetime as dt
 import calendar
+import hashlib
+from bisect import bisect_right
 from collections import OrderedDict
 from uuid import uuid4
 from django.conf import settings
 from django.db import models
-from django.db.models import Q
+from django.db.models import Q, BooleanField, Case, Value, When
 from django.db.models.query import ModelIterable
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -45,6 +47,71 @@ def _filterContentPanels(panels, remove):
         retval.append(panel)
     return retval
 
+_restrictionGeneration = 0
+
+def _forgetAuthorizedFilters():
+    """
+    Invalidate the authorized filters that have been compiled and kept on
+    requests.  Called whenever a view restriction, or a user's groups, or the
+    location of a page change.
+    """
+    global _restrictionGeneration
+    _restrictionGeneration += 1
+
+def _getAuthorization(request):
+    # The authorized filter and fingerprint of request, kept on the request
+    KEY  = PageViewRestriction.passed_view_restrictions_session_key
+    user = request.user
+    signature = (_restrictionGeneration,
+                 tuple(request.session.get(KEY, [])),
+                 user.pk, user.is_authenticated, user.is_superuser)
+    cached = getattr(request, "_joyousAuthorization", None)
+    if cached is None or cached[0] != signature:
+        cached = (signature,) + _compileAuthorization(request)
+        request._joyousAuthorization = cached
+    return cached[1:]
+
+def _compileAuthorization(request):
+    PASSWORD = PageViewRestriction.PASSWORD
+    LOGIN    = PageViewRestriction.LOGIN
+    GROUPS   = PageViewRestriction.GROUPS
+    KEY      = PageViewRestriction.passed_view_restrictions_session_key
+
+    restrictions = PageViewRestriction.objects.all()
+    passed = request.session.get(KEY, [])
+    if passed:
+        restrictions = restrictions.exclude(id__in=passed,
+                                            restriction_type=PASSWORD)
+    if request.user.is_authenticated:
+        restrictions = restrictions.exclude(restriction_type=LOGIN)
+    if request.user.is_superuser:
+        restrictions = restrictions.exclude(restriction_type=GROUPS)
+    else:
+        membership = request.user.groups.all()
+        if membership:
+            restrictions = restrictions.exclude(groups__in=membership,
+                                                restriction_type=GROUPS)
+    # Everything under a restricted page is excluded, so only the
+    # outermost restricted pages need a condition
+    restricted = Q()
+    outermost = []
+    for path in sorted(restrictions.values_list("page__path", flat=True)
+                                   .distinct()):
+        if not outermost or not path.startswith(outermost[-1]):
+            restricted |= Q(path__startswith=path)
+            outermost.append(path)
+    fingerprint = hashlib.md5(",".join(outermost).encode("ascii")).hexdigest()
+    return (~restricted if restricted else Q(), fingerprint)
+
+def _getAuthorizedAnnotation(request):
+    # Whether request may view each page, as an annotation for a query
+    authorizedQ = _getAuthorization(request)[0] if request is not None else Q()
+    if not authorizedQ:
+        return Value(True, output_field=BooleanField())
+    return Case(When(authorizedQ, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField())
+
 # ------------------------------------------------------------------------------
 # Helper types and constants
 # ------------------------------------------------------------------------------
@@ -66,6 +133,10 @@ class ThisEvent:
             setattr(self, kw, arg)
 
     def __getattr__(self, attr):
+        # don't go looking for page (or dunders) on the page, e.g. when
+        # unpickling before page is set
+        if attr == 'page' or attr.startswith('__'):
+            raise AttributeError(attr)
         return getattr(self.page, attr)
 
     def _asdict(self):
@@ -124,6 +195,10 @@ class EventsOnDay:
         return calendar.day_abbr[self.date.weekday()].lower()
 
 class EventsByDayList(list):
+    """
+    A list of EventsOnDay for the dates from fromDate to toDate, with the
+    days_events of each day kept in order of when they start.
+    """
     def __init__(self, fromDate, toDate, holidays=None):
         if holidays is None:
             holidays = {}
@@ -132,19 +207,49 @@ class EventsByDayList(list):
         days = [dt.date.fromordinal(ord)
                 for ord in range(self.fromOrd, self.toOrd+1)]
         super().__init__(EventsOnDay(day, holidays.get(day)) for day in days)
+        self._fromTimes = [[] for day in days]
 
-    def add(self, thisEvent, pageFromDate, pageToDate):
+    def add(self, thisEvent, pageFromDate, pageToDate, pageFromTime=None):
+        """
+        Add thisEvent to the days it is on.  pageFromTime is the time it
+        starts in the local time zone (or dt.time.max if it has no time), if
+        that is already known.
+        """
         pageFromOrd = pageFromDate.toordinal()
         pageToOrd   = pageToDate.toordinal()
         dayNum = pageFromOrd - self.fromOrd
         if 0 <= dayNum <= self.toOrd - self.fromOrd:
-            self[dayNum].days_events.append(thisEvent)
+            if pageFromTime is None:
+                pageFromTime = _getFromTimeKey(thisEvent, pageFromDate)
+            if thisEvent.__dict__.get('_fromTime',
+                                      pageFromTime) != pageFromTime:
+                # the same exception can be on different days
+                thisEvent = _copyThisEvent(thisEvent)
+            thisEvent._fromTime = pageFromTime
+            fromTimes = self._fromTimes[dayNum]
+            index = bisect_right(fromTimes, pageFromTime)
+            fromTimes.insert(index, pageFromTime)
+            self[dayNum].days_events.insert(index, thisEvent)
 
         for pageOrd in range(pageFromOrd + 1, pageToOrd + 1):
             dayNum = pageOrd - self.fromOrd
             if 0 <= dayNum <= self.toOrd - self.fromOrd:
                 self[dayNum].continuing_events.append(thisEvent)
 
+def _getFromTimeKey(thisEvent, atDate):
+    # When thisEvent starts on atDate in the local time zone, for sorting
+    fromTime = thisEvent.__dict__.get('_fromTime')
+    if fromTime is None:
+        fromTime = thisEvent.page._getFromTime(atDate=atDate)
+        if fromTime is None:
+            fromTime = dt.time.max
+    return fromTime
+
+def _copyThisEvent(thisEvent):
+    copy = ThisEvent(thisEvent.page)
+    copy.__dict__.update(thisEvent.__dict__)
+    return copy
+
 # ------------------------------------------------------------------------------
 # Event models
 # ------------------------------------------------------------------------------
@@ -176,15 +281,22 @@ class EventManager(PageManager):
         return self.get_queryset().auth(request)
 
 class EventQuerySet(PageQuerySet):
+    # The date field which orders these events by when they start, to within
+    # a couple of days (allowing for their time zones), or None if there is
+    # no such field
+    startDateField = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.request    = None
         self.postFilter = None
+        self.parents    = None
 
     def _clone(self):
         qs = super()._clone()
         qs.request    = self.request
         qs.postFilter = self.postFilter
+        qs.parents    = self.parents
         return qs
 
     def _fetch_all(self):
@@ -192,7 +304,19 @@ class EventQuerySet(PageQuerySet):
         self._filterResults()
 
     def _fetchResults(self):
+        fetched = self._result_cache is None
         super()._fetch_all()
+        if fetched and self.parents:
+            self._linkParents()
+
+    def _linkParents(self):
+        # Exceptions which are the children of pages we already have don't
+        # need to look up what they override
+        for item in self._result_cache:
+            page = getattr(item, 'page', item)
+            parent = self.parents.get(getattr(page, 'overrides_id', None))
+            if parent is not None:
+                page.overrides = parent
 
     def _filterResults(self):
         if self.postFilter:
@@ -235,6 +359,8 @@ class EventQuerySet(PageQuerySet):
                 if not getattr(page, attribute, False):
                     return False
             return True
+        # so the results can be prepared for it
+        predicate.attribute = attribute
         return predicate
 
     def this(self):
@@ -247,30 +373,32 @@ class EventQuerySet(PageQuerySet):
         qs._iterable_class = ThisIterable
         return qs
 
+    def childOfAny(self, pages):
+        """
+        Filter to the exceptions of any of the given pages, which are their
+        children.  The results can be grouped by their overrides_id, and are
+        given the pages they override.
+        """
+        parents = {page.id: page for page in pages}
+        qs = self.filter(overrides_id__in=list(parents))
+        qs.parents = parents
+        return qs
+
     def authorized_q(self, request):
-        PASSWORD = PageViewRestriction.PASSWORD
-        LOGIN    = PageViewRestriction.LOGIN
-        GROUPS   = PageViewRestriction.GROUPS
-        KEY      = PageViewRestriction.passed_view_restrictions_session_key
-
-        restrictions = PageViewRestriction.objects.all()
-        passed = request.session.get(KEY, [])
-        if passed:
-            restrictions = restrictions.exclude(id__in=passed,
-                                                restriction_type=PASSWORD)
-        if request.user.is_authenticated:
-            restrictions = restrictions.exclude(restriction_type=LOGIN)
-        if request.user.is_superuser:
-            restrictions = restrictions.exclude(restriction_type=GROUPS)
-        else:
-            membership = request.user.groups.all()
-            if membership:
-                restrictions = restrictions.exclude(groups__in=membership,
-                                                    restriction_type=GROUPS)
-        q = Q()
-        for restriction in restrictions:
-            q &= ~self.descendant_of_q(restriction.page, inclusive=True)
-        return q
+        """
+        A filter which excludes the pages the request is not authorized to
+        view.  This is compiled once per request, and kept on the request until
+        the view restrictions, or the user's groups, change.
+        """
+        return _getAuthorization(request)[0]
+
+    def authorized_fingerprint(self, request):
+        """
+        A fingerprint of the view restrictions which the request does not
+        pass.  Requests with the same fingerprint are authorized to view the
+        same pages, whoever they are for.
+        """
+        return _getAuthorization(request)[1]
 
     def auth(self, request):
         self.request = request
@@ -3,7 +3,7 @@
 # ------------------------------------------------------------------------------
 import datetime as dt
 import calendar
-from contextlib import suppress
+import heapq
 from functools import partial
 from itertools import chain, groupby
 from operator import attrgetter
@@ -12,12 +12,20 @@ from django.core.exceptions import (MultipleObjectsReturned, ObjectDoesNotExist,
         PermissionDenied)
 from django.utils.translation import gettext_lazy as _
 from ..utils.weeks import week_of_month
-from .event_base import EventsOnDay
+from .event_base import (EventsOnDay, _getFromTimeKey, _getAuthorization,
+        _getAuthorizedAnnotation)
+from .timeline import EventTimeline
 from .one_off_events import SimpleEventPage, MultidayEventPage
 from .recurring_events import (RecurringEventPage, MultidayRecurringEventPage,
         PostponementPage, RescheduleMultidayEventPage, ExtraInfoPage,
         CancellationPage, ClosedForHolidaysPage, ExtCancellationPage)
 
+# ------------------------------------------------------------------------------
+# Helper types and constants
+# ------------------------------------------------------------------------------
+# How many UIDs to look up in each query
+_UID_BATCH_SIZE = 500
+
 # ------------------------------------------------------------------------------
 # API get functions
 # ------------------------------------------------------------------------------
@@ -71,6 +79,14 @@ def getAllUpcomingEvents(request, *, home=None, holidays=None):
     :param holidays: holidays that may affect these events
     :rtype: list of ThisEvents
     """
+    return list(_getUpcomingTimeline(request, home=home, holidays=holidays))
+
+def _getUpcomingTimeline(request, *, home=None, holidays=None):
+    """
+    Return all the upcoming events (under home if given), as an
+    EventTimeline, which only fetches the pages of the events that are
+    looked at, e.g. by a Paginator.
+    """
     qrys = [SimpleEventPage.events(request).upcoming().this(),
             MultidayEventPage.events(request).upcoming().this(),
             RecurringEventPage.events(request, holidays).upcoming().this(),
@@ -85,8 +101,7 @@ def getAllUpcomingEvents(request, *, home=None, holidays=None):
                             .exclude(cancellation_title="").upcoming().this()]
     if home is not None:
         qrys = [qry.descendant_of(home) for qry in qrys]
-    events = sorted(chain.from_iterable(qrys), key=_getUpcomingSort())
-    return events
+    return EventTimeline(qrys, key=attrgetter(_getUpcomingAttr()))
 
 def getGroupUpcomingEvents(request, group, holidays=None):
     """
@@ -101,8 +116,7 @@ def getGroupUpcomingEvents(request, group, holidays=None):
         # This is not a group page
         return []
 
-    # Get events that are a child of a group page, or a postponement or extra
-    # info a child of the recurring event child of the group
+    # Get events that are a child of a group page
     rrEvents = RecurringEventPage.events(request, holidays)                  \
                                         .exclude(group_page=group)           \
                                         .upcoming().child_of(group).this()
@@ -111,21 +125,9 @@ def getGroupUpcomingEvents(request, group, holidays=None):
             MultidayEventPage.events(request).exclude(group_page=group)
                                         .upcoming().child_of(group).this(),
             rrEvents]
-    for rrEvent in rrEvents:
-        qrys += [PostponementPage.events(request).child_of(rrEvent.page)
-                                         .upcoming().this(),
-                 ExtraInfoPage.events(request).exclude(extra_title="")
-                                 .child_of(rrEvent.page).upcoming().this(),
-                 CancellationPage.events(request).exclude(cancellation_title="")
-                                 .child_of(rrEvent.page).upcoming().this(),
-                 ExtCancellationPage.events(request).exclude(cancellation_title="")
-                                 .child_of(rrEvent.page).upcoming().this(),
-                 ClosedForHolidaysPage.events(request, holidays)
-                                 .exclude(cancellation_title="")
-                                 .child_of(rrEvent.page).upcoming().this()]
+    rrPages = [rrEvent.page for rrEvent in rrEvents]
 
-    # Get events that are linked to a group page, or a postponement or extra
-    # info child of the recurring event linked to a group
+    # Get events that are linked to a group page
     rrEvents = group.recurringeventpage_set(manager='events').auth(request)  \
                                  .hols(holidays).upcoming().this()
     qrys += [group.simpleeventpage_set(manager='events').auth(request)
@@ -133,19 +135,24 @@ def getGroupUpcomingEvents(request, group, holidays=None):
              group.multidayeventpage_set(manager='events').auth(request)
                                  .upcoming().this(),
              rrEvents]
-    for rrEvent in rrEvents:
-        qrys += [PostponementPage.events(request).child_of(rrEvent.page)
+    rrPages += [rrEvent.page for rrEvent in rrEvents]
+
+    # Get the postponements and extra info, etc. of all those recurring
+    # events at once
+    if rrPages:
+        qrys += [PostponementPage.events(request).childOfAny(rrPages)
                                  .upcoming().this(),
                  ExtraInfoPage.events(request).exclude(extra_title="")
-                                 .child_of(rrEvent.page).upcoming().this(),
+                                 .childOfAny(rrPages).upcoming().this(),
                  CancellationPage.events(request).exclude(cancellation_title="")
-                                 .child_of(rrEvent.page).upcoming().this(),
+                                 .childOfAny(rrPages).upcoming().this(),
                  ExtCancellationPage.events(request).exclude(cancellation_title="")
-                                 .child_of(rrEvent.page).upcoming().this(),
+                                 .childOfAny(rrPages).upcoming().this(),
                  ClosedForHolidaysPage.events(request, holidays)
                                  .exclude(cancellation_title="")
-                                 .child_of(rrEvent.page).upcoming().this()]
-    events = sorted(chain.from_iterable(qrys), key=_getUpcomingSort())
+                                 .childOfAny(rrPages).upcoming().this()]
+    events = sorted(chain.from_iterable(qrys),
+                    key=attrgetter("page." + _getUpcomingAttr()))
     return events
 
 def getAllPastEvents(request, *, home=None, holidays=None):
@@ -155,7 +162,15 @@ def getAllPastEvents(request, *, home=None, holidays=None):
     :param request: Django request object
     :param home: only include events that are under this page (if given)
     :param holidays: holidays that may affect these events
-    :rtype: list of the ThisEvents
+    :rtype: list of ThisEvents
+    """
+    return list(_getPastTimeline(request, home=home, holidays=holidays))
+
+def _getPastTimeline(request, *, home=None, holidays=None):
+    """
+    Return all the past events (under home if given), as an EventTimeline,
+    which only fetches the pages of the events that are looked at, e.g. by a
+    Paginator.
     """
     qrys = [SimpleEventPage.events(request).past().this(),
             MultidayEventPage.events(request).past().this(),
@@ -171,9 +186,8 @@ def getAllPastEvents(request, *, home=None, holidays=None):
                             .past().this()]
     if home is not None:
         qrys = [qry.descendant_of(home) for qry in qrys]
-    events = sorted(chain.from_iterable(qrys),
-                    key=attrgetter('page._past_datetime_from'), reverse=True)
-    return events
+    return EventTimeline(qrys, key=attrgetter('_past_datetime_from'),
+                         reverse=True)
 
 def getEventFromUid(request, uid):
     """
@@ -185,24 +199,61 @@ def getEventFromUid(request, uid):
     :param uid: iCal unique identifier
     :rtype: event page
     """
-    events = []
-    with suppress(ObjectDoesNotExist):
-        events.append(SimpleEventPage.objects.get(uid=uid))
-    with suppress(ObjectDoesNotExist):
-        events.append(MultidayEventPage.objects.get(uid=uid))
-    with suppress(ObjectDoesNotExist):
-        events.append(RecurringEventPage.objects.get(uid=uid))
+    uid = str(uid)
+    events = getEventsFromUids(request, [uid])
+    if uid not in events:
+        raise ObjectDoesNotExist("No event with uid={}".format(uid))
+    if events[uid] is None:
+        raise PermissionDenied("No authority for uid={}".format(uid))
+    return events[uid]
+
+def getEventsFromUids(request, uids, *, home=None):
+    """
+    Get the events (under home if given) with any of the given UIDs, all at
+    once, with one query per type of event for each batch of UIDs.  UIDs
+    which are not found are left out, and those of events we have no
+    authority for, or which are not under home, are mapped to None
+    (raises MultipleObjectsReturned if more than one event has the same UID).
+
+    :param request: Django request object
+    :param uids: iCal unique identifiers
+    :param home: only include events that are under this page (if given)
+    :rtype: dict of uid to event page or None
+    """
+    uids = list(set(str(uid) for uid in uids))
+    authorized = _getAuthorizedAnnotation(request)
+    retval = {}
+    for model in (SimpleEventPage, MultidayEventPage, RecurringEventPage):
+        # UIDs are unique across all sites, so look for them everywhere
+        qry = model.objects.annotate(authorized=authorized)
+        for start in range(0, len(uids), _UID_BATCH_SIZE):
+            batch = uids[start:start + _UID_BATCH_SIZE]
+            for event in qry.filter(uid__in=batch):
+                if event.uid in retval:
+                    raise MultipleObjectsReturned("Multiple events with "
+                                                  "uid={}".format(event.uid))
+                if request is None:
+                    event.authorized = event.isAuthorized(None)
+                if home is not None and not _isUnder(event, home):
+                    event.authorized = False
+                retval[event.uid] = event if event.authorized else None
     # Exceptions do not have uids and are not returned by this function
+    return retval
 
-    if len(events) == 1:
-        if events[0].isAuthorized(request):
-            return events[0]
-        else:
-            raise PermissionDenied("No authority for uid={}".format(uid))
-    elif len(events) == 0:
-        raise ObjectDoesNotExist("No event with uid={}".format(uid))
-    else:
-        raise MultipleObjectsReturned("Multiple events with uid={}".format(uid))
+def getAuthorizedFingerprint(request):
+    """
+    Get a fingerprint of the view restrictions that the request does not
+    pass.  The events returned by the functions of this API depend upon who
+    is asking only through this, so their results can be cached by it and
+    shared by everyone with the same fingerprint, e.g. all anonymous users,
+    or all the members of a group.
+
+    :param request: Django request object
+    :rtype: str
+    """
+    if request is None:
+        return None
+    return _getAuthorization(request)[1]
 
 def getAllEvents(request, *, home=None, holidays=None):
     """
@@ -213,15 +264,23 @@ def getAllEvents(request, *, home=None, holidays=None):
     :param holidays: holidays that may affect these events
     :rtype: list of event pages
     """
+    qrys = _getAllEventsQrys(request, home=home, holidays=holidays)
+    events = sorted(chain.from_iterable(qrys),
+                    key=attrgetter('_first_datetime_from'))
+    return events
+
+def _getAllEventsQrys(request, *, home=None, holidays=None):
+    """
+    Return the querysets of all the events (under home if given), one for
+    each type of event, for going through without sorting them.
+    """
     qrys = [SimpleEventPage.events(request).all(),
             MultidayEventPage.events(request).all(),
             RecurringEventPage.events(request, holidays).all()]
     # Does not return exceptions
     if home is not None:
         qrys = [qry.descendant_of(home) for qry in qrys]
-    events = sorted(chain.from_iterable(qrys),
-                    key=attrgetter('_first_datetime_from'))
-    return events
+    return qrys
 
 # ------------------------------------------------------------------------------
 # API UI functions
@@ -248,24 +307,20 @@ def removeContentPanels(*args):
 # Private
 # ------------------------------------------------------------------------------
 def _getEventsByDay(date_from, eventsByDaySrcs, holidays):
+    # The days_events of each source are already in order of their start
+    # times, so they just need to be merged together
     if holidays is None:
         holidays = {}
     evods = []
     day = date_from
-    # TODO sortByTime could go up here
-    # TODO would izip be better?
+    def sortByTime(thisEvent):
+        return _getFromTimeKey(thisEvent, day)
     for srcs in zip(*eventsByDaySrcs):
-        days_events       = []
+        days_events = list(heapq.merge(*[src.days_events for src in srcs],
+                                       key=sortByTime))
         continuing_events = []
         for src in srcs:
-            days_events += src.days_events
             continuing_events += src.continuing_events
-        def sortByTime(thisEvent):
-            fromTime = thisEvent.page._getFromTime(atDate=day)
-            if fromTime is None:
-                fromTime = dt.time.max
-            return fromTime
-        days_events.sort(key=sortByTime)
         holiday = holidays.get(day)
         evods.append(EventsOnDay(day, holiday, days_events, continuing_events))
         day += dt.timedelta(days=1)
@@ -289,11 +344,15 @@ def _getEventsByWeek(year, month, eventsByDaySrc):
         weeks.append(week)
     return weeks
 
-def _getUpcomingSort():
+def _isUnder(page, home):
+    # Is page a descendant of home?  (without a query)
+    return page.path.startswith(home.path) and page.depth > home.depth
+
+def _getUpcomingAttr():
     if getattr(settings, "JOYOUS_UPCOMING_INCLUDES_STARTED", False):
-        return attrgetter('page._current_datetime_from')
+        return '_current_datetime_from'
     else:
-        return attrgetter('page._future_datetime_from')
+        return '_future_datetime_from'
 
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
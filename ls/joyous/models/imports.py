@@ -0,0 +1,135 @@
+# ------------------------------------------------------------------------------
+# Joyous background import jobs
+# ------------------------------------------------------------------------------
+import datetime as dt
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+# ------------------------------------------------------------------------------
+# How long a job can run before it is taken to have died with its worker
+DEFAULT_IMPORT_JOB_TIMEOUT = 60 * 60
+
+# ------------------------------------------------------------------------------
+class ImportJobQuerySet(models.QuerySet):
+    def claim(self, jobId):
+        """
+        Mark the queued job with jobId as running, starting its results
+        afresh.  Returns False if it was not queued, e.g. because another
+        worker has already claimed it.  A job which has been running for
+        longer than :setting:`JOYOUS_IMPORT_JOB_TIMEOUT` is taken to have
+        died with its worker, and is queued again.
+        """
+        return bool(self.filter(self._getWaiting(), id=jobId)
+                        .update(status=ImportJob.RUNNING,
+                                started_at=timezone.now(),
+                                files=[],
+                                messages=[]))
+
+    def queued(self):
+        """
+        The jobs waiting to be run, including those whose worker has died,
+        oldest first.
+        """
+        return self.filter(self._getWaiting()).order_by('created_at', 'id')
+
+    def _getWaiting(self):
+        timeout = getattr(settings, "JOYOUS_IMPORT_JOB_TIMEOUT",
+                          DEFAULT_IMPORT_JOB_TIMEOUT)
+        stale = timezone.now() - dt.timedelta(seconds=timeout)
+        return (Q(status=ImportJob.QUEUED) |
+                Q(status=ImportJob.RUNNING, started_at__lt=stale))
+
+class ImportJob(models.Model):
+    """
+    An uploaded file which is being imported into a calendar out of band,
+    and the results of importing each of the calendar files within it.
+    """
+    class Meta:
+        verbose_name = _("import job")
+        verbose_name_plural = _("import jobs")
+
+    objects = ImportJobQuerySet.as_manager()
+
+    QUEUED  = "queued"
+    RUNNING = "running"
+    DONE    = "done"
+    FAILED  = "failed"
+    STATUS_CHOICES = [(QUEUED,  _("queued")),
+                      (RUNNING, _("running")),
+                      (DONE,    _("done")),
+                      (FAILED,  _("failed"))]
+
+    calendar = models.ForeignKey("joyous.CalendarPage",
+                                 on_delete=models.CASCADE,
+                                 related_name="+")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             null=True,
+                             blank=True,
+                             on_delete=models.SET_NULL,
+                             related_name="+")
+    upload = models.FileField(_("upload"), upload_to="joyous/imports/",
+                              blank=True)
+    name = models.CharField(_("name"), max_length=255, blank=True)
+    utc2local = models.BooleanField(_("convert UTC to localtime"),
+                                    default=True)
+    submit = models.BooleanField(_("submit for moderation"), default=False)
+    publish = models.BooleanField(_("publish"), default=False)
+    status = models.CharField(_("status"), max_length=10, default=QUEUED,
+                              choices=STATUS_CHOICES)
+    files = models.JSONField(_("files"), default=list, blank=True)
+    files.help_text = _("The results of each calendar file imported so far")
+    messages = models.JSONField(_("messages"), default=list, blank=True)
+    created_at = models.DateTimeField(_("created at"), default=timezone.now)
+    started_at = models.DateTimeField(_("started at"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("finished at"), null=True, blank=True)
+
+    def __str__(self):
+        return "{} {}".format(self.name, self.status)
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def totals(self):
+        """The number of successes, failures and errors over all the files."""
+        return {key: sum(results[key] for results in self.files)
+                for key in ("success", "fail", "error")}
+
+    def addFileResults(self, name, success=0, fail=0, error=0):
+        """Record the results of importing one calendar file."""
+        self.files.append({'name':    name,
+                           'success': success,
+                           'fail':    fail,
+                           'error':   error})
+        self.save(update_fields=['files'])
+
+    def addMessage(self, level, message):
+        """Record a message for the user who uploaded the file."""
+        self.messages.append([level, str(message)])
+        self.save(update_fields=['messages'])
+
+    def finish(self, status):
+        """Record that the job has finished, and discard its upload."""
+        self.status = status
+        self.finished_at = timezone.now()
+        if self.upload:
+            self.upload.delete(save=False)
+        self.save(update_fields=['status', 'finished_at', 'upload'])
+
+    def getProgress(self):
+        """The state of the job, as something that can be sent as JSON."""
+        return {'id':       self.id,
+                'name':     self.name,
+                'status':   self.status,
+                'finished': self.finished,
+                'files':    self.files,
+                'totals':   self.totals,
+                'messages': [message for level, message in self.messages]}
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -0,0 +1,244 @@
+# ------------------------------------------------------------------------------
+# Joyous materialized event occurrences
+# ------------------------------------------------------------------------------
+import datetime as dt
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q, Min, Value
+from django.db.models.functions import Concat, Substr
+from django.utils.translation import gettext_lazy as _
+from ..utils.telltime import todayUtc
+
+# ------------------------------------------------------------------------------
+# Helper functions
+# ------------------------------------------------------------------------------
+def getOccurrenceHorizon():
+    """
+    The number of days either side of today which are materialized, or 0 if
+    the occurrence table is not in use.
+    """
+    return getattr(settings, "JOYOUS_OCCURRENCE_HORIZON", 0)
+
+def _getWindow(today=None):
+    if today is None:
+        today = todayUtc()
+    horizon = dt.timedelta(days=getOccurrenceHorizon())
+    return (today - horizon, today + horizon)
+
+# ------------------------------------------------------------------------------
+# Occurrence models
+# ------------------------------------------------------------------------------
+class EventOccurrenceHorizon(models.Model):
+    """
+    The range of dates (in the event's own time zone) for which the
+    occurrences of an event have been materialized.
+    """
+    class Meta:
+        verbose_name = _("event occurrence horizon")
+        verbose_name_plural = _("event occurrence horizons")
+
+    event = models.OneToOneField("joyous.RecurringEventPage",
+                                 on_delete=models.CASCADE,
+                                 primary_key=True,
+                                 related_name="+")
+    from_date = models.DateField(_("from date"))
+    to_date = models.DateField(_("to date"))
+
+    def __str__(self):
+        return "{} {}..{}".format(self.event_id, self.from_date, self.to_date)
+
+    def covers(self, fromDate, toDate):
+        return self.from_date <= fromDate and toDate <= self.to_date
+
+class EventOccurrenceQuerySet(models.QuerySet):
+    def byEvent(self, events, fromDate, toDate):
+        """
+        Returns a dict of event id to the list of (date, kind) tuples of that
+        event's occurrences between fromDate and toDate.  Only events that
+        have been materialized for the whole of that range are included.
+        """
+        retval = {}
+        if not getOccurrenceHorizon():
+            return retval
+        eventIds = [event.id for event in events]
+        if not eventIds:
+            return retval
+        horizons = EventOccurrenceHorizon.objects                            \
+                                         .filter(event_id__in=eventIds,
+                                                 from_date__lte=fromDate,
+                                                 to_date__gte=toDate)
+        coveredIds = list(horizons.values_list('event_id', flat=True))
+        if not coveredIds:
+            return retval
+        retval = {eventId: [] for eventId in coveredIds}
+        occurrences = self.filter(event_id__in=coveredIds,
+                                  date__range=(fromDate, toDate))            \
+                          .order_by('event_id', 'date')                      \
+                          .values_list('event_id', 'date', 'kind')
+        for eventId, date, kind in occurrences:
+            retval[eventId].append((date, kind))
+        return retval
+
+    def refresh(self, event, today=None):
+        """
+        Rematerialize all the occurrences of an event within the horizon.
+        """
+        fromDate, toDate = _getWindow(today)
+        with transaction.atomic():
+            self.filter(event_id=event.id).delete()
+            if not event.live:
+                EventOccurrenceHorizon.objects.filter(event_id=event.id).delete()
+                return
+            self.bulk_create(event._getOccurrences(fromDate, toDate))
+            EventOccurrenceHorizon.objects.update_or_create(event_id=event.id,
+                    defaults={'from_date': fromDate, 'to_date': toDate})
+
+    def extend(self, event, today=None):
+        """
+        Roll the horizon of an event forward to today, only materializing the
+        newly uncovered dates.
+        """
+        fromDate, toDate = _getWindow(today)
+        horizon = EventOccurrenceHorizon.objects                             \
+                                        .filter(event_id=event.id).first()
+        if (horizon is None or not event.live or
+            horizon.from_date > fromDate or horizon.to_date < fromDate):
+            self.refresh(event, today)
+            return
+        if horizon.covers(fromDate, toDate):
+            return
+        with transaction.atomic():
+            self.filter(event_id=event.id, date__lt=fromDate).delete()
+            if toDate > horizon.to_date:
+                fromNew = horizon.to_date + dt.timedelta(days=1)
+                self.bulk_create(event._getOccurrences(fromNew, toDate))
+            horizon.from_date = fromDate
+            horizon.to_date = max(toDate, horizon.to_date)
+            horizon.save()
+
+    def getHorizon(self, event):
+        """
+        The (from_date, to_date) that have been materialized for event, or
+        None.
+        """
+        if getOccurrenceHorizon():
+            return EventOccurrenceHorizon.objects                            \
+                                         .filter(event_id=event.id)          \
+                                         .values_list('from_date', 'to_date')\
+                                         .first()
+
+    def getHorizons(self, events):
+        """
+        Returns a dict of event id to the (from_date, to_date) that have been
+        materialized for that event.
+        """
+        retval = {}
+        eventIds = [event.id for event in events]
+        if getOccurrenceHorizon() and eventIds:
+            horizons = EventOccurrenceHorizon.objects                        \
+                                             .filter(event_id__in=eventIds)  \
+                                             .values_list('event_id',
+                                                          'from_date',
+                                                          'to_date')
+            for eventId, fromDate, toDate in horizons:
+                retval[eventId] = (fromDate, toDate)
+        return retval
+
+    def nextDates(self, events, fromDate):
+        """
+        Returns a dict of event id to the date of the next occurrence of that
+        event on or after fromDate, which is not cancelled and has no extra
+        information, looked up with one range query.  Events which have no
+        such occurrence materialized are not included.
+        """
+        eventIds = [event.id for event in events]
+        if not eventIds:
+            return {}
+        occurrences = self.filter(event_id__in=eventIds, date__gte=fromDate) \
+                          .exclude(kind__in=EventOccurrence.CANCELLED_KINDS) \
+                          .exclude(Q(kind=EventOccurrence.EXTRA_INFO) &
+                                   ~Q(title=""))
+        return dict(occurrences.values('event_id')
+                               .annotate(nextDate=Min('date'))
+                               .values_list('event_id', 'nextDate'))
+
+    def move(self, oldUrlPath, newUrlPath):
+        """
+        Change the url_path of the occurrences of pages which have moved from
+        under oldUrlPath to under newUrlPath.
+        """
+        self.filter(url_path__startswith=oldUrlPath)                         \
+            .update(url_path=Concat(Value(newUrlPath),
+                                    Substr('url_path', len(oldUrlPath) + 1),
+                                    output_field=models.TextField()))
+
+class EventOccurrence(models.Model):
+    """
+    A materialized occurrence of a recurring event.  The occurrences are kept
+    up to date by signal handlers when the event or its exceptions are saved
+    or deleted, and rolled forward by :func:`refreshOccurrences`.
+    """
+    class Meta:
+        verbose_name = _("event occurrence")
+        verbose_name_plural = _("event occurrences")
+        indexes = [models.Index(fields=['event', 'date']),
+                   models.Index(fields=['date']),
+                   models.Index(fields=['start'])]
+
+    objects = EventOccurrenceQuerySet.as_manager()
+
+    OCCURRENCE       = ""
+    EXTRA_INFO       = "extrainfo"
+    CANCELLATION     = "cancellation"
+    POSTPONEMENT     = "postponement"
+    EXT_CANCELLATION = "extcancellation"
+    KIND_CHOICES = [(OCCURRENCE,       _("occurrence")),
+                    (EXTRA_INFO,       _("extra information")),
+                    (CANCELLATION,     _("cancellation")),
+                    (POSTPONEMENT,     _("postponement")),
+                    (EXT_CANCELLATION, _("extended cancellation"))]
+    CANCELLED_KINDS = [CANCELLATION, POSTPONEMENT, EXT_CANCELLATION]
+
+    event = models.ForeignKey("joyous.RecurringEventPage",
+                              on_delete=models.CASCADE,
+                              related_name="+")
+    date = models.DateField(_("date"))
+    date.help_text = _("The date of the occurrence in the event's time zone")
+    start = models.DateTimeField(_("start"))
+    finish = models.DateTimeField(_("finish"))
+    kind = models.CharField(_("kind"), max_length=20, blank=True, default="",
+                            choices=KIND_CHOICES)
+    title = models.CharField(_("title"), max_length=255, blank=True)
+    url_path = models.TextField(_("URL path"), blank=True)
+
+    def __str__(self):
+        return "{} {}".format(self.title, self.date)
+
+# ------------------------------------------------------------------------------
+# Horizon job
+# ------------------------------------------------------------------------------
+def refreshOccurrences(today=None):
+    """
+    Roll the occurrence horizon of every live recurring event forward to
+    today.  Run this daily (e.g. with the refresh_occurrences management
+    command) when :setting:`JOYOUS_OCCURRENCE_HORIZON` is set.
+
+    :param today: the date to centre the horizon on (defaults to today)
+    :rtype: the number of events refreshed
+    """
+    if not getOccurrenceHorizon():
+        return 0
+    RecurringEventPage = apps.get_model("joyous", "RecurringEventPage")
+    EventOccurrenceHorizon.objects                                           \
+                          .exclude(event__live=True).delete()
+    EventOccurrence.objects.exclude(event__live=True).delete()
+    count = 0
+    for event in RecurringEventPage.objects.live().iterator():
+        EventOccurrence.objects.extend(event, today)
+        count += 1
+    return count
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -11,7 +11,7 @@ from wagtail.admin.edit_handlers import FieldPanel
 from wagtail.images.edit_handlers import ImageChooserPanel
 
 from ..utils.telltime import (todayUtc, getAwareDatetime, getLocalDatetime,
-        getLocalDate, getLocalTime)
+        getLocalDatetimes, getLocalTime)
 from ..utils.telltime import timeFormat
 from ..edit_handlers import TimePanel
 from ..forms import FormDefender
@@ -29,6 +29,8 @@ _2days = dt.timedelta(days=2)
 # Event models
 # ------------------------------------------------------------------------------
 class SimpleEventQuerySet(EventQuerySet):
+    startDateField = "date"
+
     def current(self):
         qs = super().current()
         return qs.filter(date__gte = todayUtc() - _1day)
@@ -47,12 +49,12 @@ class SimpleEventQuerySet(EventQuerySet):
             def __iter__(self):
                 evods = EventsByDayList(fromDate, toDate)
                 for page in super().__iter__():
-                    pageFromDate = getLocalDate(page.date,
-                                                page.time_from, page.tz)
-                    pageToDate   = getLocalDate(page.date,
-                                                page.time_to, page.tz)
+                    pageFromDt, pageToDt = getLocalDatetimes(
+                            [(page.date, page.time_from),
+                             (page.date, page.time_to)], page.tz)
                     thisEvent = ThisEvent(page, url=page.get_url(request))
-                    evods.add(thisEvent, pageFromDate, pageToDate)
+                    evods.add(thisEvent, pageFromDt.date(), pageToDt.date(),
+                              pageFromDt.time())
                 yield from evods
 
         qs = self._clone()
@@ -117,6 +119,8 @@ class SimpleEventPage(EventBase, Page, metaclass=FormDefender):
 
 # ------------------------------------------------------------------------------
 class MultidayEventQuerySet(EventQuerySet):
+    startDateField = "date_from"
+
     def current(self):
         qs = super().current()
         return qs.filter(date_to__gte = todayUtc() - _1day)
@@ -135,12 +139,12 @@ class MultidayEventQuerySet(EventQuerySet):
             def __iter__(self):
                 evods = EventsByDayList(fromDate, toDate)
                 for page in super().__iter__():
-                    pageFromDate = getLocalDate(page.date_from,
-                                                page.time_from, page.tz)
-                    pageToDate   = getLocalDate(page.date_to,
-                                                page.time_to, page.tz)
+                    pageFromDt, pageToDt = getLocalDatetimes(
+                            [(page.date_from, page.time_from),
+                             (page.date_to, page.time_to)], page.tz)
                     thisEvent = ThisEvent(page, url=page.get_url(request))
-                    evods.add(thisEvent, pageFromDate, pageToDate)
+                    evods.add(thisEvent, pageFromDt.date(), pageToDt.date(),
+                              pageFromDt.time())
                 yield from evods
 
         qs = self._clone()
@@ -3,7 +3,7 @@
 # ------------------------------------------------------------------------------
 import datetime as dt
 from operator import attrgetter
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.admin.widgets import FilteredSelectMultiple
@@ -15,6 +15,7 @@ from django.forms import widgets
 from django.template.response import TemplateResponse
 from django.utils import timezone
 from django.utils import translation
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext, gettext_noop
@@ -28,9 +29,11 @@ from wagtail.search import index
 from wagtail.admin.forms import WagtailAdminPageForm
 from modelcluster.fields import ParentalKey
 from ..utils.manythings import hrJoin
+from ..utils.intervals import DateIntervalIndex
 from ..utils.mixins import ProxyPageMixin
 from ..utils.telltime import (todayUtc, getAwareDatetime, getLocalDatetime,
-        getLocalDateAndTime, getLocalDate, getLocalTime, getLocalTimeAtDate)
+        getLocalDateAndTime, getLocalDate, getLocalDates, getLocalDatetimes,
+        getLocalTime, getLocalTimeAtDate)
 from ..utils.telltime import getTimeFrom, getTimeTo
 from ..utils.telltime import timeFormat, dateFormat
 from ..fields import RecurrenceField
@@ -39,6 +42,7 @@ from ..edit_handlers import (TZDatePanel, ExceptionDatePanel, TimePanel,
         MapFieldPanel)
 from ..holidays import Holidays
 from .groups import get_group_model_string
+from .occurrences import EventOccurrence, getOccurrenceHorizon
 from .event_base import (ThisEvent, EventsByDayList,
         EventManager, EventQuerySet, EventPageForm, EventBase)
 
@@ -48,6 +52,164 @@ from .event_base import (ThisEvent, EventsByDayList,
 _1day  = dt.timedelta(days=1)
 _2days = dt.timedelta(days=2)
 
+# ------------------------------------------------------------------------------
+# Occurrence memo
+# ------------------------------------------------------------------------------
+_memoGeneration = 0
+
+def _forgetOccurrenceMemos():
+    """
+    Invalidate the occurrence memos of every RecurringEventPage instance.
+    Called whenever a recurring event or one of its exceptions is saved or
+    deleted.
+    """
+    global _memoGeneration
+    _memoGeneration += 1
+
+class _OccurrenceMemo:
+    """
+    The exceptions of a recurring event, each fetched once when first needed,
+    and the results of the searches for occurrences before or after a date.
+    """
+    def __init__(self, page):
+        self.page       = page
+        self.generation = _memoGeneration
+        self.holidays   = page.holidays
+        self.results    = {}
+
+    def isValidFor(self, page):
+        return (self.generation == _memoGeneration and
+                self.holidays is page.holidays)
+
+    @cached_property
+    def cancelled(self):
+        return set(CancellationPage.events.child_of(self.page)
+                           .values_list('except_date', flat=True))
+
+    @cached_property
+    def extraInfo(self):
+        return set(ExtraInfoPage.events.child_of(self.page)
+                           .exclude(extra_title="")
+                           .values_list('except_date', flat=True))
+
+    @cached_property
+    def shutdowns(self):
+        shutdowns = ExtCancellationPage.events.child_of(self.page)
+        return DateIntervalIndex.fromShutdowns(shutdowns)
+
+    @cached_property
+    def closedHols(self):
+        return ClosedForHolidaysPage.events.hols(self.holidays)              \
+                                    .child_of(self.page).first()
+
+    @cached_property
+    def postponements(self):
+        return list(PostponementPage.events.child_of(self.page)
+                            .order_by('date', 'time_from'))
+
+    @cached_property
+    def horizon(self):
+        return EventOccurrence.objects.getHorizon(self.page)
+
+def _primeOccurrenceMemos(pages):
+    """
+    Give the pages which need them new occurrence memos, with the exceptions
+    needed to find their occurrences fetched for all of them at once, one
+    query per type of exception.
+    """
+    memos = {}
+    for page in pages:
+        memo = page._occurrenceMemo
+        if memo is not None and memo.isValidFor(page):
+            continue
+        memo = memos.get(page.id)
+        if memo is None:
+            memo = memos[page.id] = _OccurrenceMemo(page)
+            memo.cancelled  = set()
+            memo.extraInfo  = set()
+            memo.closedHols = None
+        page._occurrenceMemo = memo
+    if not memos:
+        return
+    pages = [memo.page for memo in memos.values()]
+    for pageId, exceptDate in CancellationPage.events.childOfAny(pages)     \
+                                    .values_list('overrides_id', 'except_date'):
+        memos[pageId].cancelled.add(exceptDate)
+    for pageId, exceptDate in ExtraInfoPage.events.childOfAny(pages)        \
+                                    .exclude(extra_title="")                 \
+                                    .values_list('overrides_id', 'except_date'):
+        memos[pageId].extraInfo.add(exceptDate)
+    shutdownsFor = defaultdict(list)
+    for shutdown in ExtCancellationPage.events.childOfAny(pages):
+        shutdownsFor[shutdown.overrides_id].append(shutdown)
+    for pageId, memo in memos.items():
+        memo.shutdowns = DateIntervalIndex.fromShutdowns(shutdownsFor[pageId])
+    if getOccurrenceHorizon():
+        horizons = EventOccurrence.objects.getHorizons(pages)
+        for pageId, memo in memos.items():
+            memo.horizon = horizons.get(pageId)
+    pagesFor = defaultdict(list)
+    for page in pages:
+        pagesFor[id(page.holidays)].append(page)
+    for hpages in pagesFor.values():
+        holidays = hpages[0].holidays
+        for closedHols in ClosedForHolidaysPage.events.hols(holidays)       \
+                                 .childOfAny(hpages).order_by('id'):
+            memo = memos[closedHols.overrides_id]
+            # only the first one counts
+            if memo.closedHols is None:
+                memo.closedHols = closedHols
+
+def _primeNextOccurrences(pages, attribute):
+    """
+    Find when the pages next occur for the upcoming (or current) filter from
+    their materialized occurrences, with one range query for each date that
+    is looked after, rather than one query for each page.  The pages must
+    have been given their occurrence memos already.
+    """
+    if not getOccurrenceHorizon():
+        return
+    toFind = defaultdict(list)
+    for page in pages:
+        memo = page._occurrenceMemo
+        if attribute == "_current_datetime_from":
+            fromDt = page._getCurrentFromDt()
+        else:
+            fromDt = timezone.localtime(timezone=page.tz)
+        key = page._getAfterKey(fromDt, True, True)
+        fromDate = key[1]
+        horizon = memo.horizon
+        if (key in memo.results or memo.closedHols is not None or
+            not horizon or not horizon[0] <= fromDate <= horizon[1]):
+            continue
+        toFind[fromDate].append((page, key))
+    for fromDate, found in toFind.items():
+        nextDates = EventOccurrence.objects                                  \
+                                   .nextDates([page for page, key in found],
+                                              fromDate)
+        for page, key in found:
+            nextDate = nextDates.get(page.id)
+            if nextDate is not None:
+                page._occurrenceMemo.results[key] =                          \
+                        getAwareDatetime(nextDate, page.time_from,
+                                         page.tz, dt.time.min)
+
+def _linkOverrides(pages):
+    """
+    Give the exceptions the events they override, fetched all at once, rather
+    than with one query for each exception.
+    """
+    toLink = [page for page in pages if page.overrides_id is not None and
+              not type(page).overrides.is_cached(page)]
+    if not toLink:
+        return
+    events = RecurringEventPage.objects                                     \
+                               .in_bulk({page.overrides_id for page in toLink})
+    for page in toLink:
+        event = events.get(page.overrides_id)
+        if event is not None:
+            page.overrides = event
+
 # ------------------------------------------------------------------------------
 # Event models
 # ------------------------------------------------------------------------------
@@ -77,7 +239,7 @@ class EventWithHolidaysQuerySet(EventQuerySet):
                 for event in getattr(item, 'all_events', [item]):
                     page = getattr(event, 'page', event)
                     page.holidays = self.holidays
-        super()._filterResults()
+        self._filterResults()
 
     def hols(self, holidays):
         qs = self._clone()
@@ -85,6 +247,20 @@ class EventWithHolidaysQuerySet(EventQuerySet):
         return qs
 
 class RecurringEventQuerySet(EventWithHolidaysQuerySet):
+    def _filterResults(self):
+        if self.postFilter:
+            # the filter looks at the exceptions of every event
+            pages = [getattr(item, 'page', item)
+                     for item in self._result_cache]
+            pages = [page for page in pages
+                     if isinstance(page, RecurringEventPage)]
+            _primeOccurrenceMemos(pages)
+            attribute = getattr(self.postFilter, 'attribute', None)
+            if attribute in ("_current_datetime_from",
+                             "_future_datetime_from"):
+                _primeNextOccurrences(pages, attribute)
+        super()._filterResults()
+
     def this(self):
         request = self.request
         class ThisIterable(ModelIterable):
@@ -101,15 +277,46 @@ class RecurringEventQuerySet(EventWithHolidaysQuerySet):
         class ByDayIterable(ModelIterable):
             def __iter__(self):
                 evods = EventsByDayList(fromDate, toDate, holidays)
-                for page in super().__iter__():
-                    exceptions = self.__getExceptionsFor(page)
-                    closedHols = self.__getClosedForHolidays(page)
+                pages = list(super().__iter__())
+                maxDays = max((page.num_days for page in pages), default=1)
+                materialized = EventOccurrence.objects.byEvent(pages,
+                                  fromDate - dt.timedelta(days=maxDays + 1),
+                                  toDate + _2days)
+                pageOccurences = {}
+                for page in pages:
+                    occurences = materialized.get(page.id)
+                    if occurences is not None:
+                        startDelta = dt.timedelta(days=page.num_days + 1)
+                        myFromDate = fromDate - startDelta
+                        occurences = [(date, kind) for date, kind in occurences
+                                      if date >= myFromDate]
+                    pageOccurences[page.id] = occurences
+                # only look for exceptions if we might find some
+                exceptionsFor, shutdownsFor = self.__getExceptionsFor(
+                         [page for page in pages
+                          if pageOccurences[page.id] is None or
+                             any(kind for date, kind in pageOccurences[page.id])])
+                closedHolsFor = self.__getClosedForHolidays(pages)
+                for page in pages:
                     startDelta = dt.timedelta(days=page.num_days + 1)
-                    for occurence in page.repeat.between(fromDate - startDelta,
+                    occurences = pageOccurences[page.id]
+                    if occurences is not None:
+                        occurences = [date for date, kind in occurences]
+                    else:
+                        occurences = page.repeat.between(fromDate - startDelta,
                                                          toDate + _2days,
-                                                         inc=True):
+                                                         inc=True)
+                    exceptions = exceptionsFor.get(page.id, {})
+                    shutdowns = shutdownsFor.get(page.id)
+                    closedHols = closedHolsFor.get(page.id)
+                    found = []
+                    for occurence in occurences:
                         thisEvent = None
-                        exception = exceptions.get(occurence)
+                        exception = None
+                        if shutdowns:
+                            exception = shutdowns.last(occurence)
+                        if exception is None:
+                            exception = exceptions.get(occurence)
                         if exception:
                             if exception.title:
                                 thisEvent = exception
@@ -124,25 +331,44 @@ class RecurringEventQuerySet(EventWithHolidaysQuerySet):
                         else:
                             thisEvent = ThisEvent(page, url=page.get_url(request))
                         if thisEvent:
-                            pageFromDate = getLocalDate(occurence,
-                                                        page.time_from, page.tz)
-                            daysDelta = dt.timedelta(days=page.num_days - 1)
-                            pageToDate = getLocalDate(occurence + daysDelta,
-                                                      page.time_to, page.tz)
-                            evods.add(thisEvent, pageFromDate, pageToDate)
+                            found.append((occurence, thisEvent))
+                    # convert all the dates of this page in one go
+                    daysDelta = dt.timedelta(days=page.num_days - 1)
+                    pageFromDts = getLocalDatetimes(
+                            [(occurence, page.time_from)
+                             for occurence, thisEvent in found], page.tz)
+                    pageToDates = getLocalDates(
+                            [(occurence + daysDelta, page.time_to)
+                             for occurence, thisEvent in found], page.tz)
+                    for (occurence, thisEvent), pageFromDt, pageToDate in \
+                            zip(found, pageFromDts, pageToDates):
+                        evods.add(thisEvent, pageFromDt.date(), pageToDate,
+                                  pageFromDt.time())
                 yield from evods
 
-            def __getExceptionsFor(self, page):
+            def __getExceptionsFor(self, pages):
+                # Fetch the exceptions of all the pages at once, one query
+                # per type of exception, and then sort them out by parent
+                exceptionsFor = {page.id: {} for page in pages}
+                shutdownsFor = {page.id: [] for page in pages}
+                if not pages:
+                    return exceptionsFor, {}
+                parents = {page.id: page for page in pages}
                 dateRange = (fromDate - _2days, toDate + _2days)
-                exceptions = {}
-                for extraInfo in ExtraInfoPage.events(request).child_of(page)\
-                                     .filter(except_date__range=dateRange):
+                for extraInfo in ExtraInfoPage.events(request)               \
+                                     .childOfAny(pages)                      \
+                                     .filter(except_date__range=dateRange)   \
+                                     .order_by('path'):
+                    page = parents[extraInfo.overrides_id]
                     title = extraInfo.extra_title or page.title
                     exceptDate = extraInfo.except_date
+                    exceptions = exceptionsFor[page.id]
                     exceptions[exceptDate] = ThisEvent(title, extraInfo,
                                                        extraInfo.get_url(request))
-                for cancellation in CancellationPage.events.child_of(page)   \
-                                     .filter(except_date__range=dateRange):
+                for cancellation in CancellationPage.events                  \
+                                     .childOfAny(pages)                      \
+                                     .filter(except_date__range=dateRange)   \
+                                     .order_by('path'):
                     # The cancellation still affects the event, even if the
                     # user is not authorized to view the cancellation.
                     if cancellation.isAuthorized(request):
@@ -152,12 +378,15 @@ class RecurringEventQuerySet(EventWithHolidaysQuerySet):
                         title = None
                         url = None
                     exceptDate = cancellation.except_date
+                    page = parents[cancellation.overrides_id]
+                    exceptions = exceptionsFor[page.id]
                     exceptions[exceptDate] = ThisEvent(title, cancellation, url)
-                # TODO consider storing extended cancellations in an interval tree?
-                for shutdown in ExtCancellationPage.events.child_of(page)    \
+                for shutdown in ExtCancellationPage.events                   \
+                           .childOfAny(pages)                                \
                            .filter(cancelled_from_date__lte=dateRange[1])    \
                            .filter(Q(cancelled_to_date__gte=dateRange[0]) |
-                                   Q(cancelled_to_date__isnull = True)):
+                                   Q(cancelled_to_date__isnull = True))      \
+                           .order_by('path'):
                     if shutdown.isAuthorized(request):
                         title = shutdown.cancellation_title
                         url = shutdown.get_url(request)
@@ -165,14 +394,29 @@ class RecurringEventQuerySet(EventWithHolidaysQuerySet):
                         title = None
                         url = None
                     thisEvent = ThisEvent(title, shutdown, url)
-                    for myDate in shutdown._getMyRawDates(*dateRange):
-                        exceptions[myDate] = thisEvent
-                return exceptions
-
-            def __getClosedForHolidays(self, page):
-                closedHols = ClosedForHolidaysPage.events.hols(holidays)     \
-                                                  .child_of(page).first()
-                return closedHols
+                    page = parents[shutdown.overrides_id]
+                    shutdownTo = shutdown.cancelled_to_date
+                    if shutdownTo is None or shutdownTo > dateRange[1]:
+                        shutdownTo = dateRange[1]
+                    shutdownsFor[page.id].append(
+                            (max(shutdown.cancelled_from_date, dateRange[0]),
+                             shutdownTo, thisEvent))
+                shutdownsFor = {pageId: DateIntervalIndex(shutdowns)
+                                for pageId, shutdowns in shutdownsFor.items()
+                                if shutdowns}
+                return exceptionsFor, shutdownsFor
+
+            def __getClosedForHolidays(self, pages):
+                closedHolsFor = {}
+                if not pages:
+                    return closedHolsFor
+                parents = {page.id: page for page in pages}
+                for closedHols in ClosedForHolidaysPage.events.hols(holidays)\
+                                          .childOfAny(pages).order_by('path'):
+                    page = parents[closedHols.overrides_id]
+                    # only the first one counts
+                    closedHolsFor.setdefault(page.id, closedHols)
+                return closedHolsFor
 
         qs = self._clone()
         qs._iterable_class = ByDayIterable
@@ -250,8 +494,20 @@ class RecurringEventPage(EventBase, Page, metaclass=FormDefender):
     # modeltranslation patch_constructor may break it
     def __init__(self, *args, **kwargs):
         self.holidays = kwargs.pop("holidays", None)
+        self._occurrenceMemo = None
         super().__init__(*args, **kwargs)
 
+    def __getstate__(self):
+        # the holidays and memo are not worth pickling, e.g. into the cache
+        state = dict(super().__getstate__())
+        state['holidays'] = None
+        state['_occurrenceMemo'] = None
+        return state
+
+    def save(self, *args, **kwargs):
+        self._occurrenceMemo = None
+        return super().save(*args, **kwargs)
+
     @property
     def next_date(self):
         """
@@ -269,15 +525,7 @@ class RecurringEventPage(EventBase, Page, metaclass=FormDefender):
         The datetime this event will start or did start in the local timezone, or
         None if it is finished.
         """
-        myNow = timezone.localtime(timezone=self.tz)
-        timeFrom = getTimeFrom(self.time_from)
-        timeTo = getTimeTo(self.time_to)
-        # Yes this ignores DST transitions and milliseconds
-        timeDelta = dt.timedelta(days    = self.num_days - 1,
-                                 hours   = timeTo.hour   - timeFrom.hour,
-                                 minutes = timeTo.minute - timeFrom.minute,
-                                 seconds = timeTo.second - timeFrom.second)
-        myNextDt = self.__after(myNow - timeDelta,
+        myNextDt = self.__after(self._getCurrentFromDt(),
                               excludeCancellations=True,
                               excludeExtraInfo=True)
         if myNextDt is not None:
@@ -467,18 +715,12 @@ class RecurringEventPage(EventBase, Page, metaclass=FormDefender):
         """
         if myDate not in self.repeat:
             return False
-        if CancellationPage.events.child_of(self)                            \
-                           .filter(except_date=myDate).exists():
+        memo = self.__getMemo()
+        if myDate in memo.cancelled:
             return False
-        if ExtCancellationPage.events.child_of(self)                         \
-                           .filter(cancelled_from_date__lte=myDate)          \
-                           .filter(Q(cancelled_to_date__gte=myDate) |
-                                   Q(cancelled_to_date__isnull = True))      \
-                           .exists():
+        if memo.shutdowns.first(myDate) is not None:
             return False
-        closedHols = ClosedForHolidaysPage.events.hols(self.holidays)        \
-                                          .child_of(self).first()
-        if closedHols and closedHols._closedOn(myDate):
+        if memo.closedHols and memo.closedHols._closedOn(myDate):
             return False
         return True
 
@@ -511,6 +753,61 @@ class RecurringEventPage(EventBase, Page, metaclass=FormDefender):
         if myNextDt is not None:
             return myNextDt.date()
 
+    def _getOccurrences(self, fromDate, toDate):
+        """
+        Build the occurrences of this event between fromDate and toDate
+        (given in the event's own timezone) ready for saving to the
+        occurrence table.  ClosedForHolidaysPage is not materialized as that
+        depends upon the holidays of the calendar being shown.
+        """
+        dateRange = (fromDate, toDate)
+        exceptions = {}
+        for extraInfo in ExtraInfoPage.events.child_of(self)                  \
+                                      .filter(except_date__range=dateRange):
+            exceptions[extraInfo.except_date] = (EventOccurrence.EXTRA_INFO,
+                                                 extraInfo.extra_title,
+                                                 extraInfo.url_path)
+        postponed = set(PostponementPage.events.child_of(self)               \
+                                       .filter(except_date__range=dateRange) \
+                                       .values_list('except_date', flat=True))
+        for cancellation in CancellationPage.events.child_of(self)            \
+                                       .filter(except_date__range=dateRange):
+            exceptDate = cancellation.except_date
+            if exceptDate in postponed:
+                kind = EventOccurrence.POSTPONEMENT
+            else:
+                kind = EventOccurrence.CANCELLATION
+            exceptions[exceptDate] = (kind,
+                                      cancellation.cancellation_title,
+                                      cancellation.url_path)
+        for shutdown in ExtCancellationPage.events.child_of(self)            \
+                           .filter(cancelled_from_date__lte=toDate)          \
+                           .filter(Q(cancelled_to_date__gte=fromDate) |
+                                   Q(cancelled_to_date__isnull = True)):
+            for myDate in shutdown._getMyRawDates(fromDate, toDate):
+                exceptions[myDate] = (EventOccurrence.EXT_CANCELLATION,
+                                      shutdown.cancellation_title,
+                                      shutdown.url_path)
+        daysDelta = dt.timedelta(days=self.num_days - 1)
+        occurrences = []
+        for occurence in self.repeat.between(fromDate, toDate, inc=True):
+            kind, title, urlPath = exceptions.get(occurence,
+                                                  (EventOccurrence.OCCURRENCE,
+                                                   self.title,
+                                                   self.url_path))
+            start = getAwareDatetime(occurence, self.time_from,
+                                     self.tz, dt.time.min)
+            finish = getAwareDatetime(occurence + daysDelta, self.time_to,
+                                      self.tz, dt.time.max)
+            occurrences.append(EventOccurrence(event=self,
+                                               date=occurence,
+                                               start=start,
+                                               finish=finish,
+                                               kind=kind,
+                                               title=title,
+                                               url_path=urlPath))
+        return occurrences
+
     def __getMyFromDt(self):
         """
         Get the datetime of the next event after or before now in my timezone.
@@ -521,14 +818,14 @@ class RecurringEventPage(EventBase, Page, metaclass=FormDefender):
     def __afterOrPostponedTo(self, fromDt):
         after = self.__after(fromDt)
         # We know all postponement exception dates are in the parent time zone
+        postponements = self.__getMemo().postponements
         if after:
             # is there a postponed event before that?
             # nb: range is inclusive
             dateRange = (fromDt.date(), after.date())
-            postponements = PostponementPage.events.child_of(self)           \
-                                     .filter(date__range=(dateRange))        \
-                                     .order_by('date', 'time_from')
             for postponement in postponements:
+                if not dateRange[0] <= postponement.date <= dateRange[1]:
+                    continue
                 postDt = getAwareDatetime(postponement.date,
                                           postponement.time_from,
                                           self.tz, dt.time.min)
@@ -539,10 +836,9 @@ class RecurringEventPage(EventBase, Page, metaclass=FormDefender):
                     return (postDt, postponement)
         else:
             # is there a postponed event then?
-            postponements = PostponementPage.events.child_of(self)           \
-                                     .filter(date__gte=fromDt.date())        \
-                                     .order_by('date', 'time_from')
             for postponement in postponements:
+                if postponement.date < fromDt.date():
+                    continue
                 postDt = getAwareDatetime(postponement.date,
                                           postponement.time_from,
                                           self.tz, dt.time.min)
@@ -557,80 +853,169 @@ class RecurringEventPage(EventBase, Page, metaclass=FormDefender):
         else:
             return (None, None)
 
-    def __after(self, fromDt, excludeCancellations=True, excludeExtraInfo=False):
+    def __getMemo(self):
+        """
+        The exceptions of this event, and the answers already worked out from
+        them, cached on this instance until it or any exception is saved.
+        """
+        memo = self._occurrenceMemo
+        if memo is None or not memo.isValidFor(self):
+            memo = self._occurrenceMemo = _OccurrenceMemo(self)
+        return memo
+
+    def _getCurrentFromDt(self):
+        """
+        The datetime in my timezone after which an occurrence which has not
+        finished yet would have started.
+        """
+        myNow = timezone.localtime(timezone=self.tz)
+        timeFrom = getTimeFrom(self.time_from)
+        timeTo = getTimeTo(self.time_to)
+        # Yes this ignores DST transitions and milliseconds
+        timeDelta = dt.timedelta(days    = self.num_days - 1,
+                                 hours   = timeTo.hour   - timeFrom.hour,
+                                 minutes = timeTo.minute - timeFrom.minute,
+                                 seconds = timeTo.second - timeFrom.second)
+        return myNow - timeDelta
+
+    def _getAfterKey(self, fromDt, excludeCancellations, excludeExtraInfo):
+        """
+        The key of the memo of the next occurrence after fromDt.
+        """
         fromDate = fromDt.date()
         if self.time_from and self.time_from < fromDt.time():
             fromDate += _1day
+        return ("after", fromDate, excludeCancellations, excludeExtraInfo)
+
+    def __after(self, fromDt, excludeCancellations=True, excludeExtraInfo=False):
+        key = self._getAfterKey(fromDt, excludeCancellations, excludeExtraInfo)
+        fromDate = key[1]
+        memo = self.__getMemo()
+        if key not in memo.results:
+            memo.results[key] = self.__calcAfter(memo, fromDate,
+                                                 excludeCancellations,
+                                                 excludeExtraInfo)
+        return memo.results[key]
+
+    def __calcAfter(self, memo, fromDate, excludeCancellations,
+                    excludeExtraInfo):
+        horizon = memo.horizon
+        if horizon and horizon[0] <= fromDate <= horizon[1]:
+            occurences = self.__materialized(excludeCancellations,
+                                             excludeExtraInfo)              \
+                             .filter(date__gte=fromDate)                     \
+                             .order_by('date')
+            occurence = self.__firstNotClosed(memo, occurences,
+                                              excludeCancellations)
+            if occurence is not None:
+                return getAwareDatetime(occurence, self.time_from,
+                                        self.tz, dt.time.min)
+            fromDate = horizon[1] + _1day
         exceptions = set()
-        shutdowns  = []
+        shutdowns  = DateIntervalIndex()
         closedHols = None
         if excludeCancellations:
-            for cancelled in CancellationPage.events.child_of(self)          \
-                           .filter(except_date__gte=fromDate):
-                exceptions.add(cancelled.except_date)
-            # TODO consider storing extended cancellations in an interval tree?
-            shutdowns = ExtCancellationPage.events.child_of(self) \
-                           .filter(Q(cancelled_to_date__gte=fromDate) |
-                                   Q(cancelled_to_date__isnull = True))
-            closedHols = ClosedForHolidaysPage.events.hols(self.holidays)    \
-                                              .child_of(self).first()
+            exceptions |= memo.cancelled
+            shutdowns = memo.shutdowns
+            closedHols = memo.closedHols
         if excludeExtraInfo:
-            for info in ExtraInfoPage.events.child_of(self)                  \
-                                     .filter(except_date__gte=fromDate)      \
-                                     .exclude(extra_title=""):
-                exceptions.add(info.except_date)
-        for occurence in self.repeat.xafter(fromDate,
-                                            count=self.MAX_REPEAT_COUNT,
-                                            inc=True):
-            if occurence in exceptions:
-                continue
-            shutdown = next((shutdown for shutdown in shutdowns
-                             if shutdown._closedOn(occurence)), None)
-            if shutdown is not None:
-                if shutdown.cancelled_to_date is None:
+            exceptions |= memo.extraInfo
+        while fromDate is not None:
+            restartDate = None
+            for occurence in self.repeat.xafter(fromDate,
+                                                count=self.MAX_REPEAT_COUNT,
+                                                inc=True):
+                if occurence in exceptions:
+                    continue
+                shutdownEnd = shutdowns.skip(occurence)
+                if shutdownEnd is not None:
+                    if shutdownEnd != dt.date.max:
+                        # jump to the end of the shutdown
+                        restartDate = shutdownEnd + _1day
                     break
-                else:
-                    # the next line is run; coverage is wrong
-                    continue  # pragma: no cover
-            if closedHols and closedHols._closedOn(occurence):
-                continue
-            return getAwareDatetime(occurence, self.time_from,
-                                    self.tz, dt.time.min)
+                if closedHols and closedHols._closedOn(occurence):
+                    continue
+                return getAwareDatetime(occurence, self.time_from,
+                                        self.tz, dt.time.min)
+            fromDate = restartDate
 
     def __before(self, fromDt, excludeCancellations=True, excludeExtraInfo=False):
         fromDate = fromDt.date()
         if self.time_from and self.time_from > fromDt.time():
             fromDate -= _1day
+        memo = self.__getMemo()
+        key = ("before", fromDate, excludeCancellations, excludeExtraInfo)
+        if key not in memo.results:
+            memo.results[key] = self.__calcBefore(memo, fromDate,
+                                                  excludeCancellations,
+                                                  excludeExtraInfo)
+        return memo.results[key]
+
+    def __calcBefore(self, memo, fromDate, excludeCancellations,
+                     excludeExtraInfo):
+        horizon = memo.horizon
+        if horizon and horizon[0] <= fromDate <= horizon[1]:
+            occurences = self.__materialized(excludeCancellations,
+                                             excludeExtraInfo)              \
+                             .filter(date__lte=fromDate)                     \
+                             .order_by('-date')
+            occurence = self.__firstNotClosed(memo, occurences,
+                                              excludeCancellations)
+            if occurence is not None:
+                return getAwareDatetime(occurence, self.time_from,
+                                        self.tz, dt.time.min)
+            fromDate = horizon[0] - _1day
         exceptions = set()
-        shutdowns  = []
+        shutdowns  = DateIntervalIndex()
+        closedHols = None
         if excludeCancellations:
-            for cancelled in CancellationPage.events.child_of(self)          \
-                           .filter(except_date__lte=fromDate):
-                exceptions.add(cancelled.except_date)
-            shutdowns = ExtCancellationPage.events.child_of(self)            \
-                           .filter(cancelled_from_date__lte=fromDate)
-            closedHols = ClosedForHolidaysPage.events.hols(self.holidays)    \
-                                              .child_of(self).first()
+            exceptions |= memo.cancelled
+            shutdowns = memo.shutdowns
+            closedHols = memo.closedHols
         if excludeExtraInfo:
-            for info in ExtraInfoPage.events.child_of(self)                  \
-                                     .filter(except_date__lte=fromDate)      \
-                                     .exclude(extra_title=""):
-                exceptions.add(info.except_date)
+            exceptions |= memo.extraInfo
         last = None
-        for occurence in self.repeat:
-            if occurence > fromDate:
-                break
-            if occurence in exceptions:
-                continue
-            if any(shutdown._closedOn(occurence) for shutdown in shutdowns):
-                continue
-            if closedHols and closedHols._closedOn(occurence):
-                continue
-            last = occurence
+        occurences = iter(self.repeat)
+        while occurences is not None:
+            restartDate = None
+            for occurence in occurences:
+                if occurence > fromDate:
+                    break
+                if occurence in exceptions:
+                    continue
+                shutdownEnd = shutdowns.skip(occurence)
+                if shutdownEnd is not None:
+                    if shutdownEnd < fromDate:
+                        # jump to the end of the shutdown
+                        restartDate = shutdownEnd + _1day
+                    break
+                if closedHols and closedHols._closedOn(occurence):
+                    continue
+                last = occurence
+            occurences = None
+            if restartDate is not None:
+                occurences = self.repeat.xafter(restartDate, inc=True)
 
         if last is not None:
             return getAwareDatetime(last, self.time_from, self.tz, dt.time.min)
 
+    def __materialized(self, excludeCancellations, excludeExtraInfo):
+        occurences = EventOccurrence.objects.filter(event_id=self.id)
+        if excludeCancellations:
+            occurences = occurences.exclude(
+                                kind__in=EventOccurrence.CANCELLED_KINDS)
+        if excludeExtraInfo:
+            occurences = occurences.exclude(Q(kind=EventOccurrence.EXTRA_INFO) &
+                                            ~Q(title=""))
+        return occurences
+
+    def __firstNotClosed(self, memo, occurences, excludeCancellations):
+        closedHols = memo.closedHols if excludeCancellations else None
+        for occurence in occurences.values_list('date', flat=True).iterator():
+            if closedHols and closedHols._closedOn(occurence):
+                continue
+            return occurence
+
 # ------------------------------------------------------------------------------
 class MultidayRecurringEventPage(ProxyPageMixin, RecurringEventPage):
     """
@@ -739,7 +1124,17 @@ class EventExceptionBase(models.Model):
         self.overrides = parent
 
 # ------------------------------------------------------------------------------
-class DateExceptionQuerySet(EventQuerySet):
+class EventExceptionQuerySet(EventQuerySet):
+    def _filterResults(self):
+        if self.postFilter:
+            # the filter looks at the event each exception overrides
+            _linkOverrides([getattr(item, 'page', item)
+                            for item in self._result_cache])
+        super()._filterResults()
+
+class DateExceptionQuerySet(EventExceptionQuerySet):
+    startDateField = "except_date"
+
     def current(self):
         qs = super().current()
         return qs.filter(except_date__gte = todayUtc() - _1day)
@@ -798,6 +1193,10 @@ class DateExceptionBase(EventExceptionBase):
         Apply fixups that need to happen before per-field validation occurs.
         Sets the page's title.
         """
+        self._setTitleAndSlug()
+        super().full_clean(*args, **kwargs)
+
+    def _setTitleAndSlug(self):
         name = self.slugName.title()
         # generate the title and slug in English
         # the translation of the title will happen in the property local_title
@@ -805,7 +1204,6 @@ class DateExceptionBase(EventExceptionBase):
             # FIXME? year may be missing which makes the title ambiguous
             self.title = "{} for {}".format(name, dateFormat(self.except_date))
             self.slug = "{}-{}".format(self.except_date, self.slugName)
-        super().full_clean(*args, **kwargs)
 
     def _getLocalWhen(self, date_from, num_days=1):
         """
@@ -866,6 +1264,16 @@ class DateExceptionBase(EventExceptionBase):
 
 # ------------------------------------------------------------------------------
 class ExtraInfoQuerySet(DateExceptionQuerySet):
+    def _filterResults(self):
+        if self.postFilter:
+            # and whether that event occurs looks at its other exceptions
+            pages = [getattr(item, 'page', item)
+                     for item in self._result_cache]
+            _linkOverrides(pages)
+            _primeOccurrenceMemos([page.overrides for page in pages
+                                   if page.overrides_id is not None])
+        super()._filterResults()
+
     def this(self):
         request = self.request
         class ThisIterable(ModelIterable):
@@ -1121,7 +1529,9 @@ class CancellationPage(CancellationBase, DateExceptionBase, Page):
     cancellation_url = property(getCancellationUrl)
 
 # ------------------------------------------------------------------------------
-class PostponementQuerySet(EventQuerySet):
+class PostponementQuerySet(EventExceptionQuerySet):
+    startDateField = "date"
+
     def current(self):
         qs = super().current()
         return qs.filter(date__gte = todayUtc() - _1day)
@@ -1153,12 +1563,12 @@ class PostponementQuerySet(EventQuerySet):
                 for page in super().__iter__():
                     thisEvent = ThisEvent(page.postponement_title,
                                           page, page.get_url(request))
-                    pageFromDate = getLocalDate(page.date,
-                                                page.time_from, page.tz)
                     daysDelta = dt.timedelta(days=page.num_days - 1)
-                    pageToDate = getLocalDate(page.date + daysDelta,
-                                              page.time_to, page.tz)
-                    evods.add(thisEvent, pageFromDate, pageToDate)
+                    pageFromDt, pageToDt = getLocalDatetimes(
+                            [(page.date, page.time_from),
+                             (page.date + daysDelta, page.time_to)], page.tz)
+                    evods.add(thisEvent, pageFromDt.date(), pageToDt.date(),
+                              pageFromDt.time())
                 yield from evods
 
         qs = self._clone()
@@ -1397,7 +1807,8 @@ class ClosedFor(models.Model):
     def __str__(self):
         return self.name
 
-class ClosedForHolidaysQuerySet(EventWithHolidaysQuerySet):
+class ClosedForHolidaysQuerySet(EventExceptionQuerySet,
+                                EventWithHolidaysQuerySet):
     def this(self):
         request = self.request
         class ThisIterable(ModelIterable):
@@ -1493,14 +1904,23 @@ class ClosedForHolidaysPage(CancellationBase, EventExceptionBase, Page,
         super().__init__(*args, **kwargs)
         self.__closedSet = None
 
+    def __getstate__(self):
+        # the holidays are not worth pickling, e.g. into the cache
+        state = dict(super().__getstate__())
+        state['holidays'] = None
+        return state
+
     def full_clean(self, *args, **kwargs):
         """
         Apply fixups that need to happen before per-field validation occurs.
         Sets the page's title.
         """
+        self._setTitleAndSlug()
+        super().full_clean(*args, **kwargs)
+
+    def _setTitleAndSlug(self):
         self.title = "Closed for holidays"
         self.slug  = "closed-for-holidays"
-        super().full_clean(*args, **kwargs)
 
     @property
     def local_title(self):
@@ -1684,23 +2104,19 @@ class ClosedForHolidaysPage(CancellationBase, EventExceptionBase, Page,
                 exceptions.add(cancelled.except_date)
             shutdowns = ExtCancellationPage.events.child_of(self.overrides)  \
                            .filter(cancelled_from_date__lte=fromDate)
-        last = None
         repeat = self.overrides.repeat
-        for occurence in repeat:
-            if occurence > fromDate:
-                break
+        for occurence in repeat.xbefore(fromDate, inc=True):
             if occurence in exceptions:
                 continue
             if any(shutdown._closedOn(occurence) for shutdown in shutdowns):
                 continue
             if not self._closedOn(occurence):
                 continue
-            last = occurence
-        if last is not None:
-            return getAwareDatetime(last, self.time_from, self.tz, dt.time.min)
+            return getAwareDatetime(occurence, self.time_from,
+                                    self.tz, dt.time.min)
 
 # ------------------------------------------------------------------------------
-class ExtCancellationQuerySet(EventQuerySet):
+class ExtCancellationQuerySet(EventExceptionQuerySet):
     def current(self):
         qs = super().current()
         return qs.filter(Q(cancelled_to_date__gte=todayUtc() - _1day) |
@@ -1853,6 +2269,10 @@ class ExtCancellationPage(CancellationBase, EventExceptionBase, Page,
         Apply fixups that need to happen before per-field validation occurs.
         Sets the page's title.
         """
+        self._setTitleAndSlug()
+        super().full_clean(*args, **kwargs)
+
+    def _setTitleAndSlug(self):
         # generate the title and slug in English
         # the translation of the title will happen in the property local_title
         with translation.override("en"):
@@ -1869,7 +2289,6 @@ class ExtCancellationPage(CancellationBase, EventExceptionBase, Page,
                                 dateFormat(self.cancelled_from_date), titleTo)
             self.slug = "{}-{}-cancellation".format(
                                 self.cancelled_from_date, slugTo)
-        super().full_clean(*args, **kwargs)
 
     def _getMyDates(self, fromDate=dt.date.min, toDate=FAR_DATE):
         """
@@ -0,0 +1,226 @@
+# ------------------------------------------------------------------------------
+# Joyous event timeline
+# ------------------------------------------------------------------------------
+import datetime as dt
+import heapq
+from operator import itemgetter
+from django.db import models
+from django.db.models import Q
+from django.db.models.query import ModelIterable
+
+# ------------------------------------------------------------------------------
+# Helper types and constants
+# ------------------------------------------------------------------------------
+_2days = dt.timedelta(days=2)
+
+# ------------------------------------------------------------------------------
+# Helper functions
+# ------------------------------------------------------------------------------
+def _getDeferredFields(model):
+    """
+    The long text fields of model, which are not needed to put its pages in
+    order, e.g. details and extra_information.
+    """
+    return [field.name for field in model._meta.concrete_fields
+            if isinstance(field, models.TextField) and
+               field.name != "url_path"]
+
+def _getMidnightUtc(date):
+    return dt.datetime.combine(date, dt.time.min, tzinfo=dt.timezone.utc)
+
+def _fetchChunk(qry):
+    """
+    The pages of qry, and those of them which pass its postFilter.  They are
+    filtered by the queryset itself, which first prepares them for it all at
+    once, e.g. primes the occurrence memos of recurring events.
+    """
+    unfiltered = qry._clone()
+    unfiltered.postFilter = None
+    pages = list(unfiltered)
+    qry._result_cache = list(pages)
+    qry._filterResults()
+    return pages, qry._result_cache
+
+# ------------------------------------------------------------------------------
+# Timeline
+# ------------------------------------------------------------------------------
+class EventTimeline:
+    """
+    A lazy sequence of ThisEvents, drawn from querysets of different event
+    page types, in the order given by key.
+
+    The pages of each queryset are streamed in order (in chunks, by their
+    startDateField if they have one) without their long text fields, and
+    merged together only as far as is needed.  The complete pages (and their
+    urls) are only fetched for the items that are actually looked at, e.g.
+    the current page of a Paginator, with one query per page type.  Any
+    pages which have gone (or no longer pass their queryset's postFilter)
+    by the time they are fetched are dropped from the timeline, and the
+    items after them move up to take their place.  A Paginator is given an
+    estimate by count(), so it need not merge all of the events.
+    """
+    # How many pages to fetch at a time
+    CHUNK_SIZE = 100
+
+    def __init__(self, qrys, key, reverse=False):
+        """
+        :param qrys: querysets of events that yield ThisEvents, e.g. qry.this()
+        :param key: the sort key function, called with each page
+        :param reverse: sort in descending order
+        """
+        self._qrys = list(qrys)
+        self._key = key
+        self._reverse = reverse
+        # (src, pageId) of each event in order, as far as they are merged
+        self._entries = []
+        # the ThisEvents which have been fetched, by their entry
+        self._cache = {}
+        streams = [self._getStream(src) for src in range(len(self._qrys))]
+        self._merged = heapq.merge(*streams, key=itemgetter(0),
+                                   reverse=reverse)
+        self._exhausted = False
+
+    def __len__(self):
+        self._extendTo(None)
+        return len(self._entries)
+
+    def __bool__(self):
+        self._extendTo(1)
+        return bool(self._entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if (index.start or 0) < 0 or index.stop is None or index.stop < 0:
+                length = None
+            else:
+                length = index.stop
+            while True:
+                self._extendTo(length)
+                indexes = range(len(self._entries))[index]
+                if self._fetch(indexes):
+                    return [self._cache[self._entries[i]] for i in indexes]
+        while True:
+            if index < 0:
+                self._extendTo(None)
+                position = index + len(self._entries)
+            else:
+                self._extendTo(index + 1)
+                position = index
+            if not 0 <= position < len(self._entries):
+                raise IndexError("EventTimeline index out of range")
+            if self._fetch([position]):
+                return self._cache[self._entries[position]]
+
+    def __iter__(self):
+        start = 0
+        while True:
+            stop = start + self.CHUNK_SIZE
+            self._extendTo(stop)
+            indexes = range(start, min(stop, len(self._entries)))
+            if not indexes:
+                break
+            if self._fetch(indexes):
+                yield from [self._cache[self._entries[index]]
+                            for index in indexes]
+                start = stop
+
+    def count(self):
+        """
+        An estimate of the number of events, for a Paginator, which never
+        falls short of the real number.  This is one count query for each
+        source, of the events which its SQL filters let through, without
+        merging or testing any of them.  Once all the events have been
+        merged their exact number is given.
+        """
+        if self._exhausted:
+            return len(self._entries)
+        total = 0
+        for qry in self._qrys:
+            qry = qry._clone()
+            qry.postFilter = None
+            total += qry.count()
+        return total
+
+    def _extendTo(self, length):
+        # Merge in more entries, up to length (or all of them if None)
+        while not self._exhausted and (length is None or
+                                       len(self._entries) < length):
+            try:
+                key, src, pageId = next(self._merged)
+            except StopIteration:
+                self._exhausted = True
+            else:
+                self._entries.append((src, pageId))
+
+    def _getStream(self, src):
+        # Yield (key, src, pageId) entries for one source, in order
+        qry = self._qrys[src]
+        light = qry.defer(*_getDeferredFields(qry.model))
+        light._iterable_class = ModelIterable
+        dateField = qry.startDateField
+        if dateField is None:
+            pages, passed = _fetchChunk(light)
+            entries = [(self._key(page), src, page.id) for page in passed]
+            entries.sort(key=itemgetter(0), reverse=self._reverse)
+            yield from entries
+            return
+
+        # Pages ordered by their date are within a couple of days of being
+        # in order, whatever their time zones, so hold back each chunk until
+        # nothing after it could come before it.  Each chunk carries on from
+        # the (date, id) of the last page of the one before.
+        sign, op = ("-", "lt") if self._reverse else ("", "gt")
+        light = light.order_by(sign + dateField, sign + "id")
+        entries = []
+        chunk = light
+        while True:
+            pages, passed = _fetchChunk(chunk[:self.CHUNK_SIZE])
+            entries += [(self._key(page), src, page.id) for page in passed]
+            entries.sort(key=itemgetter(0), reverse=self._reverse)
+            if len(pages) < self.CHUNK_SIZE:
+                break
+            lastDate = getattr(pages[-1], dateField)
+            chunk = light.filter(Q(**{dateField+"__"+op: lastDate}) |
+                                 Q(**{dateField: lastDate,
+                                      "id__"+op: pages[-1].id}))
+            if self._reverse:
+                bound = _getMidnightUtc(lastDate + _2days)
+                numReady = next((i for i, entry in enumerate(entries)
+                                 if entry[0] <= bound), len(entries))
+            else:
+                bound = _getMidnightUtc(lastDate - _2days)
+                numReady = next((i for i, entry in enumerate(entries)
+                                 if entry[0] >= bound), len(entries))
+            yield from entries[:numReady]
+            del entries[:numReady]
+        yield from entries
+
+    def _fetch(self, indexes):
+        # Fetch the ThisEvents at indexes that we don't have yet, one query
+        # per source.  Returns False if any of them have gone, and so have
+        # been dropped, which moves the indexes of those after them.
+        wanted = {}
+        for index in indexes:
+            entry = self._entries[index]
+            if entry not in self._cache:
+                wanted.setdefault(entry[0], []).append(entry[1])
+        gone = set()
+        for src, pageIds in wanted.items():
+            # filtering them again prepares them for display, e.g. primes
+            # the occurrence memos of recurring events, and drops any which
+            # no longer pass
+            qry = self._qrys[src].filter(id__in=pageIds)
+            fetched = {thisEvent.page.id: thisEvent for thisEvent in qry}
+            for pageId in pageIds:
+                if pageId in fetched:
+                    self._cache[(src, pageId)] = fetched[pageId]
+                else:
+                    gone.add((src, pageId))
+        if gone:
+            self._entries = [entry for entry in self._entries
+                             if entry not in gone]
+        return not gone
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
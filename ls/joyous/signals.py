@@ -2,9 +2,35 @@
 # Joyous models
 # ------------------------------------------------------------------------------
 import datetime as dt
+from django.apps import apps
+from django.db import transaction
+from django.contrib.auth.models import Group
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from wagtail.admin.signals import init_new_page
-from .models import RecurringEventPage, EventExceptionBase
+from wagtail.core.models import PageViewRestriction
+from wagtail.core.signals import (post_page_move, page_published,
+        page_unpublished)
+from .models import (EventBase, RecurringEventPage, EventExceptionBase,
+        ExtraInfoPage, CancellationPage, ExtCancellationPage, EventOccurrence,
+        CalendarPage)
+from .models.occurrences import getOccurrenceHorizon
+from .models.recurring_events import _forgetOccurrenceMemos
+from .models.event_base import _forgetAuthorizedFilters
+from .models.calendar import _changeCalendarVersions
+from .formats.ical import _forgetVEvent
+
+# ------------------------------------------------------------------------------
+# Fields which change the materialized occurrences
+_OCCURRENCE_FIELDS = frozenset(["live", "title", "url_path", "repeat",
+                                "num_days", "time_from", "time_to", "tz",
+                                "except_date", "extra_title",
+                                "cancellation_title", "cancelled_from_date",
+                                "cancelled_to_date"])
+
+# Models whose changes change the materialized occurrences
+_OCCURRENCE_MODELS = (RecurringEventPage, ExtraInfoPage, CancellationPage,
+                      ExtCancellationPage)
 
 # ------------------------------------------------------------------------------
 # Recieve Signals
@@ -20,5 +46,89 @@ def identifyExpectantParent(sender, **kwargs):
         not page.overrides):
         page._copyFieldsFromParent(parent)
 
+@receiver(post_save)
+@receiver(post_delete)
+def forgetOccurrenceMemos(sender, instance, **kwargs):
+    if isinstance(instance, (RecurringEventPage, EventExceptionBase)):
+        _forgetOccurrenceMemos()
+
+@receiver(post_save)
+@receiver(post_delete)
+def forgetAuthorizedFiltersOnSave(sender, instance, **kwargs):
+    if isinstance(instance, PageViewRestriction):
+        _forgetAuthorizedFilters()
+
+@receiver(m2m_changed)
+def forgetAuthorizedFiltersOnGroups(sender, instance, model, **kwargs):
+    # the groups of a restriction or of a user, or the users of a group
+    if issubclass(model, Group) or isinstance(instance, Group):
+        _forgetAuthorizedFilters()
+
+@receiver(post_page_move)
+def forgetAuthorizedFiltersOnMove(sender, **kwargs):
+    _forgetAuthorizedFilters()
+    _changeCalendarVersions()
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete)
+def changeCalendarVersions(sender, instance, **kwargs):
+    if isinstance(instance, (EventBase, EventExceptionBase, CalendarPage)):
+        _changeCalendarVersions(instance)
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete)
+def forgetVEvents(sender, instance, **kwargs):
+    if isinstance(instance, (EventBase, EventExceptionBase)):
+        # not until it is committed, or the old event could be cached again
+        transaction.on_commit(lambda: _forgetVEvent(instance))
+
+# Publishing and unpublishing a page both save it, so listening to post_save
+# also catches changes made without going through a publish.  These are only
+# connected to the senders which can change the occurrences, see below.
+def refreshOccurrencesOnSave(sender, instance, raw=False, update_fields=None,
+                             **kwargs):
+    if raw or not getOccurrenceHorizon():
+        return
+    if update_fields is not None and _OCCURRENCE_FIELDS.isdisjoint(update_fields):
+        return
+    if isinstance(instance, RecurringEventPage):
+        EventOccurrence.objects.refresh(instance)
+    elif isinstance(instance, (ExtraInfoPage, CancellationPage,
+                               ExtCancellationPage)):
+        if instance.overrides is not None:
+            EventOccurrence.objects.refresh(instance.overrides)
+
+def refreshOccurrencesOnDelete(sender, instance, **kwargs):
+    if not getOccurrenceHorizon():
+        return
+    if isinstance(instance, (ExtraInfoPage, CancellationPage,
+                             ExtCancellationPage)):
+        # the event may be going too, so wait until the dust has settled
+        eventId = instance.overrides_id
+        def refresh():
+            event = RecurringEventPage.objects.filter(id=eventId).first()
+            if event is not None:
+                EventOccurrence.objects.refresh(event)
+        transaction.on_commit(refresh)
+
+# Wagtail updates the url_path of the descendants of a moved page with raw
+# SQL, so no post_save is sent for them
+@receiver(post_page_move)
+def refreshOccurrencesOnMove(sender, url_path_before, url_path_after,
+                             **kwargs):
+    if not getOccurrenceHorizon() or url_path_before == url_path_after:
+        return
+    EventOccurrence.objects.move(url_path_before, url_path_after)
+
+# Signals are sent with the exact class of the instance as the sender, so
+# connect to every model (including proxies and subclasses) which can change
+# the occurrences, rather than to the saves of every model
+for model in apps.get_models():
+    if issubclass(model, _OCCURRENCE_MODELS):
+        post_save.connect(refreshOccurrencesOnSave, sender=model)
+        post_delete.connect(refreshOccurrencesOnDelete, sender=model)
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
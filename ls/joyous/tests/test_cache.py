@@ -0,0 +1,38 @@
+# ------------------------------------------------------------------------------
+# Test Cache Utilities
+# ------------------------------------------------------------------------------
+import sys
+from django.test import TestCase
+from ls.joyous.utils.cache import LRUCache, makeCacheKey
+
+# ------------------------------------------------------------------------------
+class Test(TestCase):
+    def testLRUCache(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("b", 0), 0)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def testNoSize(self):
+        cache = LRUCache(0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+    def testMakeCacheKey(self):
+        key = makeCacheKey("test", "DTSTART:20150105\nRRULE:FREQ=DAILY", 1)
+        self.assertTrue(key.startswith("joyous.test."))
+        self.assertNotIn("\n", key)
+        self.assertEqual(key, makeCacheKey("test", "DTSTART:20150105\n"
+                                                   "RRULE:FREQ=DAILY", 1))
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
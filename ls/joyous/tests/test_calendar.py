@@ -3,18 +3,23 @@
 # ------------------------------------------------------------------------------
 import sys
 import datetime as dt
-from unittest.mock import Mock
+import pickle
+from unittest.mock import Mock, patch
 from django_bs_test import TestCase
-from django.contrib.auth.models import User
-from django.test import RequestFactory
+from django.contrib.auth.models import User, AnonymousUser
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
 from django.utils import translation
 from django.urls import reverse
 from wagtail.admin.edit_handlers import get_form_for_model
-from wagtail.core.models import Site, Page
+from wagtail.core.models import Site, Page, PageViewRestriction
 from ls.joyous.models import (CalendarPage, SpecificCalendarPage,
         CalendarPageForm, GeneralCalendarPage)
-from ls.joyous.models import SimpleEventPage
+from ls.joyous.models import SimpleEventPage, RecurringEventPage
+from ls.joyous.models.calendar import CalendarVersion
 from ls.joyous.models import get_group_model
+from ls.joyous.utils.recurrence import Recurrence, WEEKLY, MO
 from .testutils import freeze_timetz, getPage
 
 GroupPage = get_group_model()
@@ -299,6 +304,20 @@ class TestCalendarPageForm(TestCase):
         handler.load.assert_called_with(self.page, self.request,
                                         "FILE", utc2local=True)
 
+    @override_settings(JOYOUS_IMPORT_IN_BACKGROUND=True)
+    def testSaveInBackground(self):
+        Form = get_form_for_model(CalendarPage, form_class=CalendarPageForm)
+        setattr(self.page, '__joyous_edit_request', self.request)
+        form = Form(instance=self.page, parent_page=self.home)
+        handler = Mock()
+        CalendarPageForm.registerImportHandler(handler)
+        form.cleaned_data = {'utc2local': False,
+                             'upload':    "FILE"}
+        form.save()
+        handler.load.assert_not_called()
+        handler.loadLater.assert_called_with(self.page, self.request,
+                                             "FILE", utc2local=False)
+
 
 # ------------------------------------------------------------------------------
 class TestFrançais(TestCase):
@@ -426,6 +445,15 @@ class TestSpecificCalendar(TestCase):
                                                 "eb50e787-12bf-477b-8493-c4414ac001ca")
         self.assertIsNone(event)
 
+    def testGetEventsFromUids(self):
+        events = self.calendar1._getEventsFromUids(self.request,
+                                                   ["570ed9c4-4503-4b45-b15e-c99faed9c531",
+                                                    "eb50e787-12bf-477b-8493-c4414ac001ca"])
+        self.assertEqual(events["570ed9c4-4503-4b45-b15e-c99faed9c531"].title,
+                         "Football Game")
+        # the other calendar's event is found, but not ours
+        self.assertIsNone(events["eb50e787-12bf-477b-8493-c4414ac001ca"])
+
     def testGetAllEventsByDay(self):
         events = self.calendar2._getAllEvents(self.request)
         self.assertEqual(len(events), 1)
@@ -525,6 +553,224 @@ class TestGeneralCalendar(TestCase):
         self.assertEqual(events[0].title, "Planning to Plan")
         self.assertEqual(events[1].title, "BBQ")
 
+# ------------------------------------------------------------------------------
+@override_settings(CACHES={'default':
+                     {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+                           'calendar':
+                     {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                      'LOCATION': 'joyous-calendar-test'}},
+                   JOYOUS_CALENDAR_CACHE="calendar")
+class TestCalendarCache(TestCase):
+    def setUp(self):
+        caches['calendar'].clear()
+        SpecificCalendarPage.is_creatable = True
+        self.user = User.objects.create_user('i', 'i@j.test', 's3(r3t')
+        home = getPage("/home/")
+        self.calendar1 = SpecificCalendarPage(owner  = self.user,
+                                              slug  = "calendar1",
+                                              title = "Red Team Calendar")
+        home.add_child(instance=self.calendar1)
+        self.calendar1.save_revision().publish()
+        self.calendar2 = SpecificCalendarPage(owner  = self.user,
+                                              slug  = "calendar2",
+                                              title = "Green Team Calendar")
+        home.add_child(instance=self.calendar2)
+        self.calendar2.save_revision().publish()
+        self._addEvent(self.calendar1, "football", dt.date(2011,6,5))
+
+    def _addEvent(self, calendar, slug, date):
+        event = SimpleEventPage(owner = self.user,
+                                slug  = slug,
+                                title = slug.title(),
+                                date  = date)
+        calendar.add_child(instance=event)
+        event.save_revision().publish()
+        return event
+
+    def _getTitles(self, calendar, year=2011, month=6, user=None):
+        request = RequestFactory().get("/test")
+        request.user = user or self.user
+        request.session = {}
+        events = calendar._getCachedEvents(request,
+                                           calendar._getEventsByWeek,
+                                           year, month)
+        return [thisEvent.title for week in events for day in week if day
+                for thisEvent in day.days_events]
+
+    def testCached(self):
+        with patch.object(SpecificCalendarPage, "_getEventsByWeek",
+                          side_effect=self.calendar1._getEventsByWeek) as get:
+            get.__name__ = "_getEventsByWeek"
+            calendar = SpecificCalendarPage.objects.get(id=self.calendar1.id)
+            self.assertEqual(self._getTitles(calendar), ["Football"])
+            self.assertEqual(self._getTitles(calendar), ["Football"])
+            self.assertEqual(get.call_count, 1)
+            self.assertEqual(self._getTitles(calendar, month=7), [])
+            self.assertEqual(get.call_count, 2)
+            with translation.override("fr"):
+                self._getTitles(calendar)
+            self.assertEqual(get.call_count, 3)
+            with freeze_timetz("2011-06-06 00:01"):
+                self._getTitles(calendar)
+            self.assertEqual(get.call_count, 4)
+
+    def testForgetOnPublish(self):
+        self.assertEqual(self._getTitles(self.calendar1), ["Football"])
+        event = self._addEvent(self.calendar1, "rugby", dt.date(2011,6,6))
+        self.assertEqual(self._getTitles(self.calendar1), ["Football", "Rugby"])
+        event.unpublish()
+        self.assertEqual(self._getTitles(self.calendar1), ["Football"])
+        event.save_revision().publish()
+        self.assertEqual(self._getTitles(self.calendar1), ["Football", "Rugby"])
+        event.delete()
+        self.assertEqual(self._getTitles(self.calendar1), ["Football"])
+
+    def testOtherCalendarKept(self):
+        version1 = CalendarVersion.objects.getVersion(self.calendar1.id)
+        version2 = CalendarVersion.objects.getVersion(self.calendar2.id)
+        self._addEvent(self.calendar2, "tree-planting", dt.date(2011,6,5))
+        self.assertEqual(CalendarVersion.objects.getVersion(self.calendar1.id),
+                         version1)
+        self.assertNotEqual(CalendarVersion.objects.getVersion(self.calendar2.id),
+                            version2)
+
+    def testViewers(self):
+        self.assertEqual(self._getTitles(self.calendar1), ["Football"])
+        other = User.objects.create_user('j', 'j@j.test', 's3(r3t')
+        anon = AnonymousUser()
+        restriction = PageViewRestriction.objects.create(
+                                    restriction_type = PageViewRestriction.LOGIN,
+                                    page = self.calendar1)
+        with patch.object(SpecificCalendarPage, "_getEventsByWeek",
+                          side_effect=self.calendar1._getEventsByWeek) as get:
+            get.__name__ = "_getEventsByWeek"
+            calendar = SpecificCalendarPage.objects.get(id=self.calendar1.id)
+            # the same restrictions are passed, so the same events are shared
+            self.assertEqual(self._getTitles(calendar), ["Football"])
+            self.assertEqual(self._getTitles(calendar, user=other),
+                             ["Football"])
+            self.assertEqual(get.call_count, 0)
+            self.assertEqual(self._getTitles(calendar, user=anon), [])
+            self.assertEqual(get.call_count, 1)
+
+    def testHolidaysNotCached(self):
+        event = RecurringEventPage(owner     = self.user,
+                                   slug      = "training",
+                                   title     = "Training",
+                                   repeat    = Recurrence(dtstart=dt.date(2011,6,6),
+                                                          freq=WEEKLY,
+                                                          byweekday=[MO]),
+                                   time_from = dt.time(18))
+        self.calendar1.add_child(instance=event)
+        event.save_revision().publish()
+        event.holidays = self.calendar1.holidays
+        event._occurrenceMemo = object()
+        state = pickle.loads(pickle.dumps(event))
+        self.assertIsNone(state.holidays)
+        self.assertIsNone(state._occurrenceMemo)
+        self.assertIs(event.holidays, self.calendar1.holidays)
+        self._getTitles(self.calendar1)
+        request = RequestFactory().get("/test")
+        request.user = self.user
+        request.session = {}
+        events = self.calendar1._getCachedEvents(request,
+                                                 self.calendar1._getEventsByWeek,
+                                                 2011, 6)
+        pages = [thisEvent.page for week in events for day in week if day
+                 for thisEvent in day.days_events
+                 if thisEvent.title == "Training"]
+        self.assertEqual(len(pages), 4)
+        for page in pages:
+            self.assertIs(page.holidays, self.calendar1.holidays)
+
+# ------------------------------------------------------------------------------
+class TestCalendarNotModified(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('i', 'i@j.test', 's3(r3t')
+        self.calendar = CalendarPage(owner  = self.user,
+                                     slug  = "events",
+                                     title = "Events")
+        self.home = Page.objects.get(slug='home')
+        self.home.add_child(instance=self.calendar)
+        self.calendar.save_revision().publish()
+
+    def _serveMonth(self, etag=None):
+        request = RequestFactory().get("/events/2011/06/")
+        request.user = self.user
+        request.session = {}
+        if etag:
+            request.META['HTTP_IF_NONE_MATCH'] = etag
+        with patch.object(CalendarPage, "serveMonth",
+                          return_value=HttpResponse("June")) as serveMonth:
+            response = self.calendar.serve(request, serveMonth, [2011, 6], {})
+        return response, serveMonth.call_count
+
+    def testNotModified(self):
+        response, calls = self._serveMonth()
+        self.assertEqual((response.status_code, calls), (200, 1))
+        etag = response['ETag']
+        response, calls = self._serveMonth(etag)
+        self.assertEqual((response.status_code, calls), (304, 0))
+
+    def testChanged(self):
+        response, calls = self._serveMonth()
+        etag = response['ETag']
+        event = SimpleEventPage(owner = self.user,
+                                slug  = "tree-planting",
+                                title = "Tree Planting",
+                                date  = dt.date(2011,6,5))
+        self.calendar.add_child(instance=event)
+        event.save_revision().publish()
+        response, calls = self._serveMonth(etag)
+        self.assertEqual((response.status_code, calls), (200, 1))
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+        group = Page(slug="group", title="Group")
+        self.home.add_child(instance=group)
+        event.move(group, pos="last-child")
+        response, calls = self._serveMonth(etag)
+        self.assertEqual((response.status_code, calls), (200, 1))
+        etag = response['ETag']
+        event.delete()
+        response, calls = self._serveMonth(etag)
+        self.assertEqual((response.status_code, calls), (200, 1))
+
+    def testNewDay(self):
+        with freeze_timetz("2011-06-05 23:59"):
+            response, calls = self._serveMonth()
+            etag = response['ETag']
+        with freeze_timetz("2011-06-06 00:01"):
+            response, calls = self._serveMonth(etag)
+        self.assertEqual((response.status_code, calls), (200, 1))
+
+    def testUpcomingNotValidated(self):
+        request = RequestFactory().get("/events/upcoming/")
+        request.user = self.user
+        request.session = {}
+        with patch.object(CalendarPage, "serveUpcoming",
+                          return_value=HttpResponse("Soon")) as serveUpcoming:
+            serveUpcoming.__name__ = "serveUpcoming"
+            response = self.calendar.serve(request, serveUpcoming, [], {})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def testListDefaultNotValidated(self):
+        request = RequestFactory().get("/events/")
+        request.user = self.user
+        request.session = {}
+        self.calendar.default_view = "L"
+        with patch.object(CalendarPage, "routeDefault",
+                          return_value=HttpResponse("Soon")) as routeDefault:
+            routeDefault.__name__ = "routeDefault"
+            response = self.calendar.serve(request, routeDefault, [], {})
+            self.assertFalse(response.has_header('ETag'))
+            request = RequestFactory().get("/events/?view=monthly")
+            request.user = self.user
+            request.session = {}
+            response = self.calendar.serve(request, routeDefault, [], {})
+            self.assertTrue(response.has_header('ETag'))
+
 # ------------------------------------------------------------------------------
 class TestMultiCalendarCreate(TestCase):
     def setUp(self):
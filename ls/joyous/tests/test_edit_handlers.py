@@ -15,9 +15,10 @@ from wagtail.core.models import Site, Page
 from ls.joyous.models.recurring_events import (CancellationPageForm,
         RecurringEventPageForm, HiddenNumDaysPanel)
 from ls.joyous.models import (CalendarPage, CancellationPage,
-        RecurringEventPage, MultidayRecurringEventPage)
+        RecurringEventPage, MultidayRecurringEventPage, ImportJob)
 from ls.joyous.utils.recurrence import Recurrence, MONTHLY, YEARLY, TU, FR
-from ls.joyous.edit_handlers import ExceptionDatePanel, ConcealedPanel
+from ls.joyous.edit_handlers import (ExceptionDatePanel, ConcealedPanel,
+        ImportJobsPanel)
 from ls.joyous.widgets import Time12hrInput, ExceptionDateInput
 from .testutils import datetimetz, freeze_timetz, getPage
 import ls.joyous.edit_handlers
@@ -300,6 +301,46 @@ class TestHiddenNumDaysPanel(TestCase):
         content = panel.render_as_object()
         self.assertHTMLEqual(content, self.FIELD_CONTENT)
 
+# ------------------------------------------------------------------------------
+class TestImportJobsPanel(TestCase):
+    def setUp(self):
+        self.home = getPage("/home/")
+        self.user = User.objects.create_superuser('i', 'i@joy.test', 's3(r3t')
+        self.calendar = CalendarPage(owner = self.user,
+                                     slug  = "events",
+                                     title = "Events")
+        self.home.add_child(instance=self.calendar)
+
+    def testNoJobs(self):
+        panel = ImportJobsPanel().bind_to(instance=self.calendar)
+        self.assertEqual(panel.render(), "")
+
+    def testNewPage(self):
+        panel = ImportJobsPanel().bind_to(instance=CalendarPage())
+        self.assertEqual(panel.render(), "")
+
+    def testJobs(self):
+        done = ImportJob.objects.create(calendar = self.calendar,
+                                        name     = "old.ics",
+                                        status   = ImportJob.DONE,
+                                        files    = [{'name': "old.ics",
+                                                     'success': 3,
+                                                     'fail': 1,
+                                                     'error': 0}],
+                                        messages = [[25, "3 iCal events loaded"]])
+        running = ImportJob.objects.create(calendar = self.calendar,
+                                           name     = "new.zip",
+                                           status   = ImportJob.RUNNING)
+        panel = ImportJobsPanel().bind_to(instance=self.calendar)
+        content = panel.render()
+        self.assertEqual(list(panel.jobs), [running, done])
+        self.assertIn("3 loaded, 1 failed", content)
+        self.assertIn("<li>3 iCal events loaded</li>", content)
+        self.assertIn('data-progress-url="/admin/joyous/import-jobs/{}/"'
+                      .format(running.id), content)
+        self.assertNotIn("/admin/joyous/import-jobs/{}/".format(done.id),
+                         content)
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
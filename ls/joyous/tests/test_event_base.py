@@ -11,7 +11,8 @@ from django.utils import timezone
 from wagtail.core.models import Page, PageViewRestriction
 from ls.joyous.models import (EventBase, removeContentPanels, SimpleEventPage,
             MultidayEventPage, RecurringEventPage, MultidayRecurringEventPage,
-            PostponementPage, RescheduleMultidayEventPage)
+            PostponementPage, RescheduleMultidayEventPage, ThisEvent)
+from ls.joyous.models.event_base import EventsByDayList
 from .testutils import datetimetz, freeze_timetz
 
 # ------------------------------------------------------------------------------
@@ -29,6 +30,30 @@ class Test(TestCase):
                                      for panel in cls.content_panels
                                      for field in panel.required_fields()))
 
+    def testEventsByDayList(self):
+        evods = EventsByDayList(dt.date(2020,2,1), dt.date(2020,2,3))
+        pages = [SimpleEventPage(title=str(num)) for num in range(4)]
+        evods.add(ThisEvent(pages[0]), dt.date(2020,2,1), dt.date(2020,2,2),
+                  dt.time(14))
+        evods.add(ThisEvent(pages[1]), dt.date(2020,2,1), dt.date(2020,2,1),
+                  dt.time.max)
+        evods.add(ThisEvent(pages[2]), dt.date(2020,2,1), dt.date(2020,2,1),
+                  dt.time(8))
+        evods.add(ThisEvent(pages[3]), dt.date(2020,2,1), dt.date(2020,2,1),
+                  dt.time(14))
+        self.assertEqual([event.title for event in evods[0].days_events],
+                         ["2", "0", "3", "1"])
+        self.assertEqual([event.title for event in evods[1].continuing_events],
+                         ["0"])
+        # the same ThisEvent can start at a different time on another day
+        shared = ThisEvent(pages[0])
+        evods.add(shared, dt.date(2020,2,2), dt.date(2020,2,2), dt.time(9))
+        evods.add(shared, dt.date(2020,2,3), dt.date(2020,2,3), dt.time(10))
+        self.assertIs(evods[1].days_events[0], shared)
+        self.assertIsNot(evods[2].days_events[0], shared)
+        self.assertEqual(evods[1].days_events[0]._fromTime, dt.time(9))
+        self.assertEqual(evods[2].days_events[0]._fromTime, dt.time(10))
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -0,0 +1,205 @@
+# ------------------------------------------------------------------------------
+# Test Recurrence Window Expansion
+# ------------------------------------------------------------------------------
+import sys
+import random
+import datetime as dt
+from dateutil.rrule import rrule
+from django.test import TestCase
+from ls.joyous.utils.expansion import WindowExpander
+from ls.joyous.utils.recurrence import Recurrence, Weekday
+from ls.joyous.utils.recurrence import MO, TU, WE, TH, FR, SA, SU
+from ls.joyous.utils.recurrence import YEARLY, MONTHLY, WEEKLY, DAILY
+
+# ------------------------------------------------------------------------------
+def _randomRule(rand):
+    # Only generate rules which will keep on matching, otherwise dateutil
+    # searches all the way to the year 9999 looking for the next occurrence
+    freq = rand.choice([YEARLY, MONTHLY, WEEKLY, DAILY])
+    dtstart = dt.datetime(rand.randint(1990, 2030),
+                          rand.randint(1, 12),
+                          rand.randint(1, 28))
+    kwargs = {'freq':     freq,
+              'dtstart':  dtstart,
+              'interval': rand.choice([1, 1, 1, 2, 3, 5]),
+              'wkst':     rand.randrange(7),
+              'until':    dtstart + dt.timedelta(days=rand.randint(0, 8000))}
+    nth = freq in (YEARLY, MONTHLY) and rand.random() < 0.5
+    if rand.random() < 0.6:
+        kwargs['byweekday'] = [Weekday(rand.randrange(7),
+                                       rand.choice([1, 2, 3, 4, -1])
+                                       if nth else None)
+                               for _ in range(rand.randint(1, 3))]
+    else:
+        nth = False
+    if not nth and rand.random() < 0.4:
+        kwargs['bymonthday'] = rand.sample([1, 2, 5, 13, 15, 28, -1],
+                                           rand.randint(1, 3))
+    if (freq != MONTHLY or kwargs['interval'] == 1) and rand.random() < 0.4:
+        kwargs['bymonth'] = rand.sample(range(1, 13), rand.randint(1, 4))
+    if freq in (YEARLY, MONTHLY) and rand.random() < 0.3:
+        kwargs['bysetpos'] = rand.sample([1, -1], rand.randint(1, 2))
+    return rrule(**kwargs)
+
+# ------------------------------------------------------------------------------
+class TestWindowExpander(TestCase):
+    def testSupports(self):
+        self.assertTrue(WindowExpander.supports(
+                rrule(freq=MONTHLY, dtstart=dt.datetime(2020,1,1),
+                      byweekday=[FR(-1)], bymonth=[1,2])))
+        self.assertFalse(WindowExpander.supports(
+                rrule(freq=DAILY, dtstart=dt.datetime(2020,1,1), count=10)))
+        self.assertFalse(WindowExpander.supports(
+                rrule(freq=YEARLY, dtstart=dt.datetime(2020,1,1),
+                      byweekno=[20])))
+        self.assertFalse(WindowExpander.supports(
+                rrule(freq=WEEKLY, dtstart=dt.datetime(2020,1,1,9,30))))
+        self.assertIsNone(WindowExpander.create(
+                rrule(freq=YEARLY, dtstart=dt.datetime(2020,1,1), byeaster=0)))
+
+    def testWeeklyFirstPeriod(self):
+        rule = rrule(freq=WEEKLY, interval=2, wkst=SU,
+                     dtstart=dt.datetime(2020,1,8),
+                     byweekday=[MO,WE,FR])
+        expander = WindowExpander.create(rule)
+        self.assertEqual(expander.between(dt.date(2020,1,1),
+                                          dt.date(2020,1,31)),
+                         [dt.date(2020,1,8),  dt.date(2020,1,10),
+                          dt.date(2020,1,20), dt.date(2020,1,22),
+                          dt.date(2020,1,24)])
+
+    def testAfterBefore(self):
+        rule = rrule(freq=YEARLY, interval=4,
+                     dtstart=dt.datetime(1996,1,1),
+                     byweekday=[TU(1)], bymonth=[11])
+        expander = WindowExpander.create(rule)
+        self.assertEqual(expander.after(dt.date(2019,1,1)),
+                         dt.date(2020,11,3))
+        self.assertEqual(expander.after(dt.date(2020,11,3)),
+                         dt.date(2024,11,5))
+        self.assertEqual(expander.after(dt.date(2020,11,3), inc=True),
+                         dt.date(2020,11,3))
+        self.assertEqual(expander.before(dt.date(2020,11,3)),
+                         dt.date(2016,11,1))
+        self.assertIsNone(expander.before(dt.date(1996,11,5)))
+        self.assertEqual(list(expander.xafter(dt.date(2000,1,1), count=3)),
+                         [dt.date(2000,11,7), dt.date(2004,11,2),
+                          dt.date(2008,11,4)])
+
+    def testUntil(self):
+        rule = rrule(freq=DAILY, interval=3,
+                     dtstart=dt.datetime(2020,2,26),
+                     until=dt.datetime(2020,3,6))
+        expander = WindowExpander.create(rule)
+        self.assertEqual(expander.between(dt.date(2020,1,1),
+                                          dt.date(2020,12,31)),
+                         [dt.date(2020,2,26), dt.date(2020,2,29),
+                          dt.date(2020,3,3),  dt.date(2020,3,6)])
+        self.assertIsNone(expander.after(dt.date(2020,3,6)))
+        self.assertEqual(expander.before(dt.date(2021,1,1)),
+                         dt.date(2020,3,6))
+
+    def testMatchesDateutil(self):
+        rand = random.Random(5545)
+        for _ in range(250):
+            rule = _randomRule(rand)
+            expander = WindowExpander.create(rule)
+            fromDate = dt.date(rand.randint(1985, 2040),
+                               rand.randint(1, 12),
+                               rand.randint(1, 28))
+            toDate = fromDate + dt.timedelta(days=rand.randint(0, 2000))
+            fromDt = dt.datetime.combine(fromDate, dt.time.min)
+            toDt = dt.datetime.combine(toDate, dt.time.min)
+            with self.subTest(rule=str(rule), fromDate=fromDate,
+                              toDate=toDate):
+                self.assertIsNotNone(expander)
+                self.assertEqual(expander.between(fromDate, toDate),
+                                 [value.date() for value in
+                                  rule.between(fromDt, toDt, inc=True)])
+                after = rule.after(fromDt)
+                self.assertEqual(expander.after(fromDate),
+                                 after.date() if after else None)
+                before = rule.before(toDt, inc=True)
+                self.assertEqual(expander.before(toDate, inc=True),
+                                 before.date() if before else None)
+                occurences = set(expander.between(fromDate, toDate))
+                for days in range(0, (toDate - fromDate).days + 1, 7):
+                    date = fromDate + dt.timedelta(days=days)
+                    self.assertEqual(expander.contains(date),
+                                     date in occurences)
+
+# ------------------------------------------------------------------------------
+class TestRecurrenceExpansion(TestCase):
+    def testBetween(self):
+        rr = Recurrence(dtstart=dt.date(2015,1,1),
+                        freq=MONTHLY,
+                        byweekday=[WE(2), WE(4)])
+        self.assertIsNotNone(rr._expander)
+        self.assertEqual(rr.between(dt.date(2021,3,1), dt.date(2021,3,31),
+                                    inc=True),
+                         (dt.date(2021,3,10), dt.date(2021,3,24)))
+        self.assertEqual(rr.between(dt.date(2021,3,10), dt.date(2021,3,24)),
+                         ())
+        self.assertEqual(rr.after(dt.date(2021,3,10)), dt.date(2021,3,24))
+        self.assertEqual(rr.before(dt.date(2021,3,10), inc=True),
+                         dt.date(2021,3,10))
+        self.assertEqual(list(rr.xafter(dt.date(2021,3,10), count=2)),
+                         [dt.date(2021,3,24), dt.date(2021,4,14)])
+
+    def testContains(self):
+        rr = Recurrence(dtstart=dt.date(2015,1,1),
+                        freq=DAILY,
+                        until=dt.date(2030,12,31))
+        self.assertIn(dt.date(2029,2,28), rr)
+        self.assertNotIn(dt.date(2014,12,31), rr)
+        self.assertNotIn(dt.date(2031,1,1), rr)
+        rr = Recurrence(dtstart=dt.date(2015,1,1),
+                        freq=MONTHLY,
+                        byweekday=[MO,TU,WE,TH,FR],
+                        bysetpos=[-1])
+        self.assertIn(dt.date(2021,7,30), rr)
+        self.assertNotIn(dt.date(2021,7,29), rr)
+        self.assertIn(dt.date(2021,10,29), rr)
+        self.assertNotIn(dt.date(2021,10,31), rr)
+
+    def testXbefore(self):
+        rr = Recurrence(dtstart=dt.date(2015,1,1),
+                        freq=WEEKLY,
+                        byweekday=[SA])
+        self.assertEqual(list(rr.xbefore(dt.date(2015,1,17), inc=True)),
+                         [dt.date(2015,1,17), dt.date(2015,1,10),
+                          dt.date(2015,1,3)])
+        self.assertEqual(list(rr.xbefore(dt.date(2021,1,1), count=2)),
+                         [dt.date(2020,12,26), dt.date(2020,12,19)])
+
+    def testNearest(self):
+        rr = Recurrence(dtstart=dt.date(2015,1,1),
+                        freq=MONTHLY,
+                        bymonthday=[1,15])
+        self.assertEqual(rr.nearest(dt.date(2021,5,15)), dt.date(2021,5,15))
+        self.assertEqual(rr.nearest(dt.date(2021,5,8)), dt.date(2021,5,1))
+        self.assertEqual(rr.nearest(dt.date(2021,5,9)), dt.date(2021,5,15))
+        self.assertEqual(rr.nearest(dt.date(2021,5,2), 1),
+                         dt.date(2021,5,15))
+        self.assertEqual(rr.nearest(dt.date(2021,5,14), -1),
+                         dt.date(2021,5,1))
+        self.assertIsNone(rr.nearest(dt.date(2014,12,31), -1))
+
+    def testFallback(self):
+        rr = Recurrence(dtstart=dt.date(2015,1,1),
+                        freq=DAILY, count=5)
+        self.assertIsNone(rr._expander)
+        self.assertEqual(rr.after(dt.date(2015,1,3)), dt.date(2015,1,4))
+        self.assertIsNone(rr.after(dt.date(2015,1,5)))
+        self.assertEqual(rr.between(dt.date(2015,1,2), dt.date(2015,1,9)),
+                         (dt.date(2015,1,3), dt.date(2015,1,4),
+                          dt.date(2015,1,5)))
+        self.assertIn(dt.date(2015,1,5), rr)
+        self.assertNotIn(dt.date(2015,1,6), rr)
+        self.assertEqual(list(rr.xbefore(dt.date(2015,1,3))),
+                         [dt.date(2015,1,2), dt.date(2015,1,1)])
+        self.assertEqual(rr.nearest(dt.date(2015,3,1)), dt.date(2015,1,5))
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
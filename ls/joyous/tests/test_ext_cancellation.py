@@ -119,6 +119,26 @@ class Test(TestCase):
     def testEventNextDate(self):
         self.assertEqual(self.event.next_date, dt.date(2020,6,3))
 
+    @freeze_timetz("2020-03-19")
+    def testEventNextDateAfterShutdowns(self):
+        shutdown = ExtCancellationPage(owner = self.user,
+                                       overrides = self.event,
+                                       cancelled_from_date = dt.date(2020,6,2),
+                                       cancelled_to_date = dt.date(2020,7,1))
+        self.event.add_child(instance=shutdown)
+        shutdown.save_revision().publish()
+        self.assertEqual(self.event.next_date, dt.date(2020,7,3))
+
+    @freeze_timetz("2020-07-20")
+    def testEventPrevDateBetweenShutdowns(self):
+        shutdown = ExtCancellationPage(owner = self.user,
+                                       overrides = self.event,
+                                       cancelled_from_date = dt.date(2020,6,4),
+                                       cancelled_to_date = dt.date(2020,7,31))
+        self.event.add_child(instance=shutdown)
+        shutdown.save_revision().publish()
+        self.assertEqual(self.event.prev_date, dt.date(2020,6,3))
+
     @freeze_timetz("2020-06-01")
     def testEventPastDatetime(self):
         self.assertEqual(self.event._past_datetime_from, datetimetz(2020,3,18,13,0))
@@ -18,8 +18,9 @@ from ls.joyous.models import (SimpleEventPage, MultidayEventPage,
         RecurringEventPage, PostponementPage, CancellationPage, ExtraInfoPage)
 from ls.joyous.models import (getAllEventsByDay, getAllEventsByWeek,
         getAllUpcomingEvents, getAllPastEvents, getGroupUpcomingEvents,
-        getEventFromUid)
+        getEventFromUid, getEventsFromUids, getAuthorizedFingerprint)
 from ls.joyous.models import get_group_model
+from ls.joyous.models.events_api import _getPastTimeline
 from .testutils import datetimetz
 
 GroupPage = get_group_model()
@@ -120,6 +121,25 @@ class Test(TestCase):
         self.assertEqual(evod10.date, dt.date(2013,1,10))
         self.assertEqual(len(evod10.all_events), 0)
 
+    def testGetAllEventsByDayOrder(self):
+        for slug, timeFrom in (("late", dt.time(20)), ("allday", None),
+                               ("early", dt.time(9))):
+            event = SimpleEventPage(owner = self.user,
+                                    slug  = slug,
+                                    title = slug.title(),
+                                    date  = dt.date(2013,1,16),
+                                    time_from = timeFrom)
+            self.calendar.add_child(instance=event)
+        events = getAllEventsByDay(self.request,
+                                   dt.date(2013,1,14), dt.date(2013,1,17))
+        evod16 = events[2]
+        self.assertEqual(evod16.date, dt.date(2013,1,16))
+        self.assertEqual([event.title for event in evod16.days_events],
+                         ["Early", "Meeting Postponed", "Late", "Allday"])
+        evod17 = events[3]
+        self.assertEqual([event.title for event in evod17.days_events],
+                         ["A Meeting"])
+
     def testAuthGetAllEventsByDay(self):
         self.request.user.groups.set([self.friends])
         events = getAllEventsByDay(self.request, dt.date(2013,1,1), dt.date(2013,1,31))
@@ -190,6 +210,23 @@ class Test(TestCase):
         self.assertEqual(events[3].title, "Pet Show")
         self.assertEqual(events[4].title, "All Night")
 
+    def testPastEventsSlice(self):
+        events = _getPastTimeline(self.request)
+        self.assertEqual(events[0].title, "Test Meeting")
+        with self.assertNumQueries(1):
+            # just the one SimpleEventPage is fetched in full
+            pageOfEvents = events[3:4]
+        self.assertEqual([event.title for event in pageOfEvents], ["Pet Show"])
+        self.assertEqual(len(events._cache), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(events[-2].title, "Pet Show")
+        self.assertEqual([event.title for event in events],
+                         ["Test Meeting", "A Meeting", "Meeting Postponed",
+                          "Pet Show", "All Night"])
+        self.assertEqual(events[10:], [])
+        with self.assertRaises(IndexError):
+            events[5]
+
     def testGetGroupUpcomingEvents(self):
         meeting = RecurringEventPage(owner = self.user,
                                      slug  = "plan-plan",
@@ -253,6 +290,62 @@ class Test(TestCase):
         self.assertEqual(events[0].title, "Planning to Plan")
         self.assertEqual(events[0].page.group, self.group)
 
+    def testGetGroupUpcomingEventsQueries(self):
+        def addMeetings(first, last):
+            for num in range(first, last):
+                meeting = RecurringEventPage(owner = self.user,
+                                             slug  = "meeting-{}".format(num),
+                                             title = "Meeting {}".format(num),
+                                             repeat = Recurrence(dtstart=dt.date(2018,5,1),
+                                                                 freq=WEEKLY,
+                                                                 byweekday=[TU]),
+                                             time_from = dt.time(18,30),
+                                             time_to   = dt.time(20))
+                # half are children of the group, half are linked to it
+                if num % 2:
+                    self.group.add_child(instance=meeting)
+                else:
+                    meeting.group_page = self.group
+                    self.calendar.add_child(instance=meeting)
+                memo = ExtraInfoPage(owner = self.user,
+                                     overrides = meeting,
+                                     except_date = meeting.next_date,
+                                     extra_title = "Agenda {}".format(num))
+                meeting.add_child(instance=memo)
+
+        def getEvents():
+            request = RequestFactory().get("/test")
+            request.user = self.user
+            request.session = {}
+            return getGroupUpcomingEvents(request, self.group)
+
+        addMeetings(0, 2)
+        # the same number of queries however many recurring events there are
+        with self.assertNumQueries(23):
+            events = getEvents()
+        self.assertEqual(len(events), 4)
+        addMeetings(2, 10)
+        with self.assertNumQueries(23):
+            events = getEvents()
+        self.assertEqual(len(events), 20)
+        self.assertEqual(sum(event.title.startswith("Agenda")
+                             for event in events), 10)
+
+    def testAuthorizedFingerprint(self):
+        fingerprint = getAuthorizedFingerprint(self.request)
+        other = RequestFactory().get("/test")
+        other.user = User.objects.create_user('j', 'j@foo.test', 's3cr3t')
+        other.session = {}
+        self.assertEqual(getAuthorizedFingerprint(other), fingerprint)
+        other.user = AnonymousUser()
+        self.assertEqual(getAuthorizedFingerprint(other), fingerprint)
+        other.user = User.objects.create_superuser('k', 'k@foo.test', 's3cr3t')
+        self.assertNotEqual(getAuthorizedFingerprint(other), fingerprint)
+        self.request.user.groups.set([self.friends])
+        self.assertEqual(getAuthorizedFingerprint(self.request),
+                         getAuthorizedFingerprint(other))
+        self.assertIsNone(getAuthorizedFingerprint(None))
+
     def testGetEventFromUid(self):
         event = getEventFromUid(self.request, "29daefed-fed1-4e47-9408-43ec9b06a06d")
         self.assertEqual(event.title, "Pet Show")
@@ -273,6 +366,37 @@ class Test(TestCase):
         self.assertIsNotNone(event.title)
         self.assertEqual(event.title, "Private Rendezvous")
 
+    def testGetEventsFromUids(self):
+        uids = ["29daefed-fed1-4e47-9408-43ec9b06a06d",
+                "80af64e7-84e6-40d9-8b4f-7edf92aab9f7",
+                "d12971fb-e694-4a04-aba2-fb1a4a7166b9"]
+        # the user's groups, the restrictions and one for each type of event
+        with self.assertNumQueries(5):
+            events = getEventsFromUids(self.request, uids)
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[uids[0]].title, "Pet Show")
+        # no authority
+        self.assertIsNone(events[uids[1]])
+        self.assertNotIn(uids[2], events)
+        self.request.user.groups.set([self.friends])
+        events = getEventsFromUids(self.request, uids)
+        self.assertEqual(events[uids[1]].title, "Private Rendezvous")
+        events = getEventsFromUids(None, uids)
+        self.assertEqual(events[uids[0]].title, "Pet Show")
+        self.assertIsNone(events[uids[1]])
+        self.assertEqual(getEventsFromUids(self.request, []), {})
+
+    def testGetEventsFromUidsHome(self):
+        uids = ["29daefed-fed1-4e47-9408-43ec9b06a06d"]
+        events = getEventsFromUids(self.request, uids, home=self.calendar)
+        self.assertEqual(events[uids[0]].title, "Pet Show")
+        events = getEventsFromUids(self.request, uids, home=self.group)
+        self.assertEqual(events, {uids[0]: None})
+
+    def testMultiGetEventsFromUids(self):
+        with self.assertRaises(MultipleObjectsReturned):
+            getEventsFromUids(self.request, ["initiative+technology"])
+
 # ------------------------------------------------------------------------------
 class TestTZ(TestCase):
     def setUp(self):
@@ -3,14 +3,15 @@
 # ------------------------------------------------------------------------------
 import sys
 import datetime as dt
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 from django.conf import settings
 from django.test import TestCase, override_settings
 from holidays import NZ, AU
 from ls.joyous.models import CalendarPage
 from ls.joyous.models import SimpleEventPage
 from ls.joyous.holidays import Holidays
-from ls.joyous.holidays.parser import parseHolidays, _parseSubdivisions
+from ls.joyous.holidays.parser import (parseHolidays, _parseSubdivisions,
+        _createMap)
 from .testutils import freeze_timetz, getPage
 
 # ------------------------------------------------------------------------------
@@ -27,6 +28,17 @@ class TestHolidays(TestCase):
         hols = Holidays()
         self.assertEqual(hols.get(dt.date(1999,4,25)), "Anzac Day")
 
+    def testLazyParse(self):
+        with patch("ls.joyous.holidays.parseHolidays",
+                   wraps=parseHolidays) as parse:
+            hols = Holidays()
+            with override_settings(JOYOUS_HOLIDAYS = "AU"):
+                parse.assert_not_called()
+                self.assertEqual(len(hols.srcs), 2)
+            parse.assert_called_once_with("NZ[*]")
+            self.assertEqual(hols.get(dt.date(1999,4,25)), "Anzac Day")
+            parse.assert_called_once()
+
     @override_settings(JOYOUS_HOLIDAYS = None)
     def testSimple(self):
         hols = Holidays()
@@ -51,6 +63,41 @@ class TestHolidays(TestCase):
         self.assertEqual(hols.get(dt.date(1999,1,1)),
                          "Gliffy, Whatnot, New Year's Day")
 
+    @override_settings(JOYOUS_HOLIDAYS = None)
+    def testYearIndex(self):
+        hols = Holidays()
+        hols.register(NZ())
+        self.assertEqual(hols.get(dt.date(1999,4,25)), "Anzac Day")
+        self.assertIn(1999, hols._index)
+        hols.add(dt.date(1999,4,25), "Poppy Day")
+        self.assertNotIn(1999, hols._index)
+        self.assertEqual(hols.get(dt.date(1999,4,25)), "Poppy Day, Anzac Day")
+        self.assertEqual(hols.get(dt.date(1999,4,26)), "")
+        hols.register(AU())
+        self.assertEqual(hols._index, {})
+        self.assertEqual(hols.get(dt.date(1999,1,26)), "Australia Day")
+
+    def testBetween(self):
+        hols = Holidays()
+        hols.add(dt.date(2020,12,31), "Hogmanay")
+        self.assertEqual(hols.between(dt.date(2020,12,24), dt.date(2021,1,3)),
+                         {dt.date(2020,12,25): "Christmas Day",
+                          dt.date(2020,12,26): "Boxing Day",
+                          dt.date(2020,12,28): "Boxing Day (Observed)",
+                          dt.date(2020,12,31): "Hogmanay",
+                          dt.date(2021,1,1):   "New Year's Day",
+                          dt.date(2021,1,2):   "Day after New Year's Day"})
+
+    @override_settings(JOYOUS_HOLIDAYS = None)
+    def testWorkalendarBetween(self):
+        class Woral:
+            get_holiday_label = Mock(return_value="JOY JOY")
+        hols = Holidays()
+        hols.register(Woral())
+        self.assertEqual(hols.between(dt.date(1999,4,30), dt.date(1999,5,1)),
+                         {dt.date(1999,4,30): "JOY JOY",
+                          dt.date(1999,5,1):  "JOY JOY"})
+
     @override_settings(JOYOUS_HOLIDAYS = None)
     def testNoNames(self):
         hols = Holidays()
@@ -109,6 +156,47 @@ class TestHolidays(TestCase):
         hols.register(woral)
         self.assertEqual(hols.names(), ["JOY JOY"])
 
+    @override_settings(JOYOUS_HOLIDAYS = None)
+    @freeze_timetz("2017-05-31")
+    def testNamesCached(self):
+        class Woral:
+            get_calendar_holidays = Mock(return_value=[(dt.date(2017,4,30),
+                                                        "JOY JOY")])
+        woral = Woral()
+        hols = Holidays()
+        hols.register(woral)
+        self.assertEqual(hols.names(), ["JOY JOY"])
+        callCount = woral.get_calendar_holidays.call_count
+        self.assertEqual(hols.names(), ["JOY JOY"])
+        hols.add(dt.date(2017,1,2), "HAPPY HAPPY")
+        self.assertEqual(hols.names(), ["HAPPY HAPPY", "JOY JOY"])
+        hols.register(NZ())
+        self.assertIn("Anzac Day", hols.names())
+        self.assertEqual(woral.get_calendar_holidays.call_count, callCount)
+
+    @override_settings(JOYOUS_HOLIDAYS = None,
+                       JOYOUS_HOLIDAYS_CACHE="shared",
+                       CACHES={'default': {'BACKEND': 'django.core.cache.'
+                                           'backends.dummy.DummyCache'},
+                               'shared':  {'BACKEND': 'django.core.cache.'
+                                           'backends.locmem.LocMemCache'}})
+    def testSharedNamesCache(self):
+        class Woral:
+            get_calendar_holidays = Mock(return_value=[(dt.date(2017,4,30),
+                                                        "JOY JOY")])
+        hols1 = Holidays()
+        hols1.register(Woral())
+        self.assertEqual(hols1.names(), ["JOY JOY"])
+        woral = Woral()
+        Woral.get_calendar_holidays.reset_mock()
+        hols2 = Holidays()
+        hols2.register(woral)
+        self.assertEqual(hols2.names(), ["JOY JOY"])
+        woral.get_calendar_holidays.assert_not_called()
+        hols2.add(dt.date(2017,1,2), "HAPPY HAPPY")
+        self.assertEqual(hols2.names(), ["HAPPY HAPPY", "JOY JOY"])
+        self.assertEqual(hols1.names(), ["JOY JOY"])
+
     def testAdd(self):
         ausHols = Holidays(None)
         ausHols.add(dt.date(2020,10,20), "Kangaroo Day")
@@ -184,6 +272,19 @@ class TestParser(TestCase):
     def testInvalidCountry(self):
         self.assertIsNone(parseHolidays("Ruritania"))
 
+    def testCreateMap(self):
+        from holidays.holiday_base import HolidayBase
+        class Ruritania(HolidayBase):
+            country = "RU"
+            def __init__(self, **kwargs):
+                raise AssertionError("Should not be instantiated")
+        self.assertEqual(_createMap([("Ruritania", Ruritania),
+                                     ("RR", Ruritania),
+                                     ("HolidayBase", HolidayBase),
+                                     ("Sausage", "Chorizo")]),
+                         {"Ruritania": Ruritania, "RR": Ruritania,
+                          "RU": Ruritania})
+
     def testInvalidSubdivision(self):
         from holidays import UK
         self.assertEqual(_parseSubdivisions("ZZZ", UK), 0)
@@ -3,15 +3,22 @@
 # see also test_vevents.py, test_vutils.py and test_vcalendar.py
 # ------------------------------------------------------------------------------
 import sys
+import os
 import datetime as dt
 import pytz
 from io import BytesIO
-from icalendar import vDatetime
+from tempfile import NamedTemporaryFile
+from zipfile import ZipFile
+from unittest.mock import patch
+from icalendar import vDatetime, Calendar
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.contrib import messages
-from django.test import TestCase, RequestFactory
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from wagtail.core.models import Site, Page
 from ls.joyous.models.calendar import CalendarPage
@@ -21,9 +28,13 @@ from ls.joyous.models import (SimpleEventPage, MultidayEventPage,
 from ls.joyous.models import getAllEvents
 from ls.joyous.utils.recurrence import Recurrence
 from ls.joyous.utils.recurrence import WEEKLY, MONTHLY, TU, SA
-from ls.joyous.formats.ical import ICalHandler
+from ls.joyous.models import ImportJob
+from ls.joyous.formats.ical import ICalHandler, VCalendar, VResults
+from ls.joyous.formats.ical import runImportJob, runQueuedImportJobs
+from ls.joyous.formats.ical import _parseZipMember, _readSpool
+from ls.joyous.formats.errors import CalendarParseError
 from freezegun import freeze_time
-from .testutils import datetimetz
+from .testutils import datetimetz, captureOnCommitCallbacks
 
 # ------------------------------------------------------------------------------
 class TestImport(TestCase):
@@ -841,6 +852,288 @@ END:VCALENDAR""")
         self.assertEqual(msg.level, messages.ERROR)
         self.assertEqual(msg.message, "Could not load 1 iCal events")
 
+# ------------------------------------------------------------------------------
+@override_settings(JOYOUS_ICAL_BULK_IMPORT=True)
+class TestBulkImport(TestImport):
+    def _getStream(self, numEvents, exdates=("20190114T090000",), name="meeting"):
+        lines = ["BEGIN:VCALENDAR",
+                 "VERSION:2.0",
+                 "PRODID:-//linuxsoftware.nz//NONSGML Joyous v0.9//EN"]
+        for num in range(numEvents):
+            lines += ["BEGIN:VEVENT",
+                      "SUMMARY:Meeting {}".format(num),
+                      "DTSTART;TZID=Pacific/Auckland:20190107T090000",
+                      "DTEND;TZID=Pacific/Auckland:20190107T100000",
+                      "DTSTAMP:20190101T000000Z",
+                      "UID:{}-{}@joy.test".format(name, num),
+                      "SEQUENCE:1",
+                      "RRULE:FREQ=WEEKLY;BYDAY=MO",
+                      "EXDATE;TZID=Pacific/Auckland:{}".format(",".join(exdates)),
+                      "END:VEVENT"]
+        lines.append("END:VCALENDAR")
+        return BytesIO("\r\n".join(lines).encode())
+
+    def _countLoadQueries(self, stream):
+        with CaptureQueriesContext(connection) as queries:
+            self.handler.load(self.calendar, self._getRequest(), stream)
+        return len(queries)
+
+    def testQueriesPerLoad(self):
+        # the first load fills some caches
+        self.handler.load(self.calendar, self._getRequest(),
+                          self._getStream(1, name="first"))
+        numQueries = self._countLoadQueries(self._getStream(2, name="a"))
+        self.assertEqual(self._countLoadQueries(self._getStream(10, name="b")),
+                         numQueries)
+        self.assertEqual(len(self.calendar.get_children()), 13)
+
+    def testReloadWithNewExdate(self):
+        self.handler.load(self.calendar, self._getRequest(), self._getStream(3))
+        self.handler.load(self.calendar, self._getRequest(),
+                          self._getStream(3, ("20190114T090000",
+                                              "20190121T090000")))
+        events = RecurringEventPage.events.child_of(self.calendar).all()
+        self.assertEqual(len(events), 3)
+        for event in events:
+            self.assertTrue(event.live)
+            self.assertEqual(event.numchild, 2)
+            cancellations = CancellationPage.objects.child_of(event)
+            self.assertEqual([page.except_date for page in cancellations],
+                             [dt.date(2019,1,14), dt.date(2019,1,21)])
+            self.assertTrue(all(page.live for page in cancellations))
+        self.assertEqual([problems for problems in Page.find_problems()
+                          if problems], [])
+
+# ------------------------------------------------------------------------------
+@override_settings(JOYOUS_JOB_RUNNER="ls.joyous.utils.jobs.DatabaseRunner")
+class TestImportJob(TestCase):
+    def setUp(self):
+        Site.objects.update(hostname="joy.test")
+        self.home = Page.objects.get(slug='home')
+        self.user = User.objects.create_superuser('i', 'i@joy.test', 's3cr3t')
+        self.requestFactory = RequestFactory()
+        self.calendar = CalendarPage(owner = self.user,
+                                     slug  = "events",
+                                     title = "Events")
+        self.home.add_child(instance=self.calendar)
+        self.calendar.save_revision().publish()
+        self.handler = ICalHandler()
+
+    def tearDown(self):
+        for job in ImportJob.objects.all():
+            job.upload.delete(save=False)
+
+    def _getRequest(self, path="/"):
+        request = self.requestFactory.post(path, {'action-publish': "action-publish"})
+        request.user = self.user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        return request
+
+    def _loadLater(self, filename):
+        path = "{}/{}".format(settings.TEST_IMPORT_DIR, filename)
+        with open(path, "rb") as stream:
+            upload = SimpleUploadedFile(filename, stream.read())
+        request = self._getRequest()
+        with captureOnCommitCallbacks(execute=True):
+            job = self.handler.loadLater(self.calendar, request, upload)
+        msgs = list(messages.get_messages(request))
+        self.assertEqual(len(msgs), 1)
+        self.assertEqual(msgs[0].level, messages.INFO)
+        self.assertEqual(msgs[0].message,
+                         "Importing {} in the background".format(filename))
+        return job
+
+    def testLoadLater(self):
+        job = self._loadLater("djm@software.net.nz.ical.zip")
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.QUEUED)
+        self.assertEqual(job.calendar_id, self.calendar.id)
+        self.assertEqual(job.user, self.user)
+        self.assertTrue(job.publish)
+        self.assertFalse(job.submit)
+        self.assertTrue(job.upload)
+        self.assertEqual(Page.objects.child_of(self.calendar).count(), 0)
+
+    def testRunImportJob(self):
+        job = self._loadLater("foobar.ical.zip")
+        self.assertTrue(runImportJob(job.id))
+        self.assertFalse(runImportJob(job.id))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(job.upload)
+        self.assertEqual(job.files,
+                         [{'name': "addressbook#contacts@group.v.calendar.google.com.ics",
+                           'success': 0, 'fail': 0, 'error': 0},
+                          {'name': "foobar@group.calendar.google.com.ics",
+                           'success': 0, 'fail': 0, 'error': 1},
+                          {'name': "Joyous Test2_kij8nb5hlrtoi0oakfjdg72rt4@group.calendar.google.com.ics",
+                           'success': 1, 'fail': 0, 'error': 0}])
+        self.assertEqual(job.totals, {'success': 1, 'fail': 0, 'error': 1})
+        self.assertEqual(job.messages,
+                         [[messages.ERROR, "Could not parse iCalendar file "
+                                           "foobar@group.calendar.google.com.ics"],
+                          [messages.SUCCESS, "1 iCal events loaded"]])
+        events = Page.objects.child_of(self.calendar)
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0].live)
+        self.assertEqual(events[0].owner, self.user)
+
+    def testRunQueuedImportJobs(self):
+        self._loadLater("djm@software.net.nz.ical.zip")
+        self._loadLater("junk.zip")
+        self.assertEqual(runQueuedImportJobs(), 2)
+        self.assertEqual(runQueuedImportJobs(), 0)
+        jobs = ImportJob.objects.order_by('id')
+        self.assertEqual([job.status for job in jobs],
+                         [ImportJob.DONE, ImportJob.DONE])
+        self.assertEqual(jobs[0].totals, {'success': 2, 'fail': 0, 'error': 0})
+        self.assertEqual(jobs[1].totals, {'success': 0, 'fail': 0, 'error': 1})
+        self.assertEqual(jobs[1].messages,
+                         [[messages.ERROR, "Could not parse iCalendar file junk.zip"]])
+        self.assertEqual(len(Page.objects.child_of(self.calendar)), 2)
+
+    def testRunImportJobFails(self):
+        job = self._loadLater("junk.zip")
+        job.upload.delete(save=True)
+        self.assertTrue(runImportJob(job.id))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.FAILED)
+        self.assertEqual(len(job.messages), 1)
+        self.assertTrue(job.messages[0][1].startswith("Could not import junk.zip"))
+
+    def testRunImportJobNoUser(self):
+        job = self._loadLater("djm@software.net.nz.ical.zip")
+        ImportJob.objects.filter(id=job.id).update(user=None)
+        self.assertTrue(runImportJob(job.id))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.FAILED)
+        self.assertEqual(job.messages,
+                         [[messages.ERROR, "Could not import "
+                                           "djm@software.net.nz.ical.zip: the "
+                                           "user who uploaded it no longer "
+                                           "exists"]])
+        self.assertFalse(job.upload)
+        self.assertEqual(Page.objects.child_of(self.calendar).count(), 0)
+
+    def testRunStaleImportJob(self):
+        job = self._loadLater("djm@software.net.nz.ical.zip")
+        ImportJob.objects.filter(id=job.id)                                  \
+                         .update(status=ImportJob.RUNNING,
+                                 started_at=timezone.now(),
+                                 files=[{'name': "dead.ics", 'success': 0,
+                                         'fail': 0, 'error': 0}])
+        self.assertEqual(runQueuedImportJobs(), 0)
+        self.assertFalse(runImportJob(job.id))
+        ImportJob.objects.filter(id=job.id)                                  \
+                         .update(started_at=timezone.now() - dt.timedelta(hours=2))
+        self.assertEqual(runQueuedImportJobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertNotIn("dead.ics", [result['name'] for result in job.files])
+        self.assertEqual(job.totals, {'success': 2, 'fail': 0, 'error': 0})
+
+    @override_settings(JOYOUS_ICAL_PARSE_PROCESSES=2)
+    def testParseInProcesses(self):
+        path = "{}/foobar.ical.zip".format(settings.TEST_IMPORT_DIR)
+        request = self._getRequest()
+        results = []
+        with open(path, "rb") as stream:
+            self.handler.load(self.calendar, request, stream,
+                              lambda name, result: results.append((name, result)))
+        self.assertEqual([(name, result) for name, result in results],
+                         [("addressbook#contacts@group.v.calendar.google.com.ics",
+                           VResults()),
+                          ("foobar@group.calendar.google.com.ics",
+                           VResults(error=1)),
+                          ("Joyous Test2_kij8nb5hlrtoi0oakfjdg72rt4@group.calendar.google.com.ics",
+                           VResults(success=1))])
+        self.assertEqual(len(Page.objects.child_of(self.calendar)), 1)
+
+    def testProgressView(self):
+        job = self._loadLater("djm@software.net.nz.ical.zip")
+        runImportJob(job.id)
+        self.client.force_login(self.user)
+        response = self.client.get("/admin/joyous/import-jobs/{}/".format(job.id))
+        self.assertEqual(response.status_code, 200)
+        progress = response.json()
+        self.assertEqual(progress['status'], "done")
+        self.assertTrue(progress['finished'])
+        self.assertEqual(progress['summary'], "2 loaded, 0 failed")
+        self.assertEqual(progress['messages'], ["2 iCal events loaded"])
+        response = self.client.get("/admin/joyous/import-jobs/999/")
+        self.assertEqual(response.status_code, 404)
+
+# ------------------------------------------------------------------------------
+class TestParseZipMember(TestCase):
+    def _makeZip(self, *lines):
+        package = NamedTemporaryFile(suffix=".zip", delete=False)
+        self.addCleanup(os.remove, package.name)
+        with package, ZipFile(package, "w") as zipped:
+            zipped.writestr("events.ics", b"\r\n".join(lines))
+        return package.name
+
+    def _readBack(self, spoolPath):
+        self.addCleanup(os.remove, spoolPath)
+        uids = []
+        for calendar, vevents in _readSpool(spoolPath):
+            for vevent in vevents:
+                uids.append(str(vevent['UID']))
+        return uids
+
+    def testSpool(self):
+        path = self._makeZip(b"BEGIN:VCALENDAR",
+                             b"VERSION:2.0",
+                             b"BEGIN:VEVENT",
+                             b"UID:one",
+                             b"DTSTART;TZID=Pacific/Auckland:20190601T100000",
+                             b"END:VEVENT",
+                             b"BEGIN:VEVENT",
+                             b"UID:two",
+                             b"DTSTART:20190602T100000",
+                             b"END:VEVENT",
+                             b"END:VCALENDAR")
+        spoolPath = _parseZipMember(path, "events.ics")
+        self.assertEqual(self._readBack(spoolPath), ["one", "two"])
+
+    def testParseError(self):
+        # the events before the error are kept, as when read in-process
+        path = self._makeZip(b"BEGIN:VCALENDAR",
+                             b"VERSION:2.0",
+                             b"BEGIN:VEVENT",
+                             b"UID:one",
+                             b"DTSTART:20190601T100000",
+                             b"END:VEVENT",
+                             b"BEGIN:VEVENT",
+                             b"UID:two")
+        spoolPath = _parseZipMember(path, "events.ics")
+        uids = []
+        with self.assertRaises(CalendarParseError):
+            for calendar, vevents in _readSpool(spoolPath):
+                for vevent in vevents:
+                    uids.append(str(vevent['UID']))
+        os.remove(spoolPath)
+        self.assertEqual(uids, ["one"])
+
+    def testUnknownTimeZone(self):
+        path = self._makeZip(b"BEGIN:VCALENDAR",
+                             b"VERSION:2.0",
+                             b"BEGIN:VTIMEZONE",
+                             b"TZID:Middle Earth Standard Time",
+                             b"BEGIN:STANDARD",
+                             b"DTSTART:19700101T000000",
+                             b"TZOFFSETFROM:+0300",
+                             b"TZOFFSETTO:+0300",
+                             b"END:STANDARD",
+                             b"END:VTIMEZONE",
+                             b"BEGIN:VEVENT",
+                             b"UID:one",
+                             b"DTSTART;TZID=Middle Earth Standard Time:20190601T100000",
+                             b"END:VEVENT",
+                             b"END:VCALENDAR")
+        self.assertIsNone(_parseZipMember(path, "events.ics"))
+
 # ------------------------------------------------------------------------------
 class TestExport(TestCase):
     def setUp(self):
@@ -885,7 +1178,8 @@ class TestExport(TestCase):
         self.assertEqual(response.get('Content-Type'), "text/calendar")
         self.assertEqual(response.get('Content-Disposition'),
                          "attachment; filename=events.ics")
-        self.assertEqual(response.content.count(b"BEGIN:VEVENT"), 2)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.getvalue().count(b"BEGIN:VEVENT"), 2)
 
     def testServeEvent(self):
         response = self.handler.serve(self.dicerun,
@@ -905,6 +1199,114 @@ class TestExport(TestCase):
         response = self.handler.serve(self.home, self._getRequest("/"))
         self.assertIsNone(response)
 
+    def testServeCalendarNotModified(self):
+        response = self.handler.serve(self.calendar,
+                                      self._getRequest("/events/"))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        request = self._getRequest("/events/")
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        # the version, the user's groups and the view restrictions, but no
+        # events
+        with self.assertNumQueries(3):
+            response = self.handler.serve(self.calendar, request)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b"")
+
+        self.dicerun.unpublish()
+        request = self._getRequest("/events/")
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        response = self.handler.serve(self.calendar, request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.getvalue().count(b"BEGIN:VEVENT"), 1)
+
+    @freeze_time("2020-03-01 10:00:00")
+    def testExportSameAsVCalendar(self):
+        chess = RecurringEventPage(owner = self.user,
+                                   slug  = "chess",
+                                   title = "Chess",
+                                   repeat = Recurrence(dtstart=dt.date(2020,1,7),
+                                                       freq=WEEKLY,
+                                                       byweekday=[TU]),
+                                   time_from = dt.time(19),
+                                   tz = pytz.timezone("Europe/London"))
+        self.calendar.add_child(instance=chess)
+        chess.save_revision().publish()
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = chess,
+                                        except_date = dt.date(2020,3,10))
+        chess.add_child(instance=cancellation)
+        cancellation.save_revision().publish()
+        request = self._getRequest("/events/")
+        vcal = VCalendar.fromPage(self.calendar, request)
+        self.assertEqual(VCalendar.exportPage(self.calendar, request),
+                         vcal.to_ical())
+
+    @override_settings(JOYOUS_ICAL_CACHE="ical",
+                       CACHES={'default': {'BACKEND': "django.core.cache.backends.dummy.DummyCache"},
+                               'ical':    {'BACKEND': "django.core.cache.backends.locmem.LocMemCache",
+                                           'LOCATION': "joyous-test-ical"}})
+    def testServeCalendarCached(self):
+        makeFromPage = VCalendar.factory.makeFromPage
+        with patch.object(VCalendar.factory, "makeFromPage",
+                          side_effect=makeFromPage) as mock:
+            response = self.handler.serve(self.calendar,
+                                          self._getRequest("/events/"))
+            first = response.getvalue()
+            self.assertEqual(mock.call_count, 2)
+            response = self.handler.serve(self.calendar,
+                                          self._getRequest("/events/"))
+            self.assertEqual(response.getvalue(), first)
+            self.assertEqual(mock.call_count, 2)
+
+            self.dicerun.title = "Mercy Dice Race"
+            with captureOnCommitCallbacks(execute=True):
+                self.dicerun.save_revision().publish()
+            response = self.handler.serve(self.calendar,
+                                          self._getRequest("/events/"))
+            content = response.getvalue()
+            self.assertEqual(mock.call_count, 3)
+            self.assertIn(b"SUMMARY:Mercy Dice Race", content)
+            self.assertNotIn(b"SUMMARY:Mercy Dice Run", content)
+            self.assertIn(b"SUMMARY:Workshop", content)
+
+    @freeze_time("2020-03-01 10:00:00")
+    @patch("ls.joyous.formats.ical.STREAM_CHUNK_SIZE", 2)
+    def testStreamCalendar(self):
+        zones = ["Europe/London", "America/New_York", "Asia/Tokyo"]
+        for num in range(5):
+            event = RecurringEventPage(owner = self.user,
+                                       slug  = "club-{}".format(num),
+                                       title = "Club {}".format(num),
+                                       repeat = Recurrence(dtstart=dt.date(2020,1,num+1),
+                                                           freq=MONTHLY),
+                                       time_from = dt.time(18),
+                                       tz = pytz.timezone(zones[num % 3]))
+            self.calendar.add_child(instance=event)
+            event.save_revision().publish()
+        request = self._getRequest("/events/")
+        pieces = list(VCalendar.streamPage(self.calendar, request))
+        self.assertTrue(pieces[0].startswith(b"BEGIN:VCALENDAR\r\n"))
+        self.assertEqual(pieces[-1], b"END:VCALENDAR\r\n")
+        self.assertEqual(sum(piece.startswith(b"BEGIN:VTIMEZONE")
+                             for piece in pieces), 3)
+        self.assertEqual(sum(piece.startswith(b"BEGIN:VEVENT")
+                             for piece in pieces), 7)
+        streamed = Calendar.from_ical(b"".join(pieces))
+        exported = Calendar.from_ical(VCalendar.exportPage(self.calendar,
+                                                           request))
+        self.assertEqual(sorted(vevent.to_ical()
+                                for vevent in streamed.walk("VEVENT")),
+                         sorted(vevent.to_ical()
+                                for vevent in exported.walk("VEVENT")))
+        self.assertEqual(sorted(str(vtz['TZID'])
+                                for vtz in streamed.walk("VTIMEZONE")),
+                         sorted(str(vtz['TZID'])
+                                for vtz in exported.walk("VTIMEZONE")))
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -0,0 +1,62 @@
+# ------------------------------------------------------------------------------
+# Test Interval Utilities
+# ------------------------------------------------------------------------------
+import sys
+import datetime as dt
+from django.test import TestCase
+from ls.joyous.utils.intervals import DateIntervalIndex
+
+# ------------------------------------------------------------------------------
+class Test(TestCase):
+    def setUp(self):
+        self.index = DateIntervalIndex([(dt.date(2020,3,1),  dt.date(2020,3,10), "a"),
+                                        (dt.date(2020,1,1),  dt.date(2020,1,31), "b"),
+                                        (dt.date(2020,3,5),  dt.date(2020,3,20), "c"),
+                                        (dt.date(2020,3,21), dt.date(2020,3,25), "d"),
+                                        (dt.date(2020,6,1),  None,               "e"),
+                                        (dt.date(2020,6,10), dt.date(2020,6,12), "f")])
+
+    def testEmpty(self):
+        index = DateIntervalIndex()
+        self.assertFalse(index)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.covering(dt.date(2020,1,1)), [])
+        self.assertIsNone(index.first(dt.date(2020,1,1)))
+        self.assertIsNone(index.skip(dt.date(2020,1,1)))
+        self.assertEqual(index.spans(), [])
+
+    def testCovering(self):
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(self.index.covering(dt.date(2019,12,31)), [])
+        self.assertEqual(self.index.covering(dt.date(2020,1,31)), ["b"])
+        self.assertEqual(self.index.covering(dt.date(2020,2,1)), [])
+        self.assertEqual(self.index.covering(dt.date(2020,3,7)), ["a", "c"])
+        self.assertEqual(self.index.covering(dt.date(2020,3,11)), ["c"])
+        self.assertEqual(self.index.covering(dt.date(2020,6,11)), ["e", "f"])
+        self.assertEqual(self.index.covering(dt.date(2999,1,1)), ["e"])
+
+    def testFirstLast(self):
+        self.assertEqual(self.index.first(dt.date(2020,3,7)), "a")
+        self.assertEqual(self.index.last(dt.date(2020,3,7)), "c")
+        self.assertIsNone(self.index.last(dt.date(2020,5,7)))
+
+    def testSkip(self):
+        self.assertIsNone(self.index.skip(dt.date(2020,2,14)))
+        self.assertEqual(self.index.skip(dt.date(2020,1,14)), dt.date(2020,1,31))
+        # a, c and d run on from each other
+        self.assertEqual(self.index.skip(dt.date(2020,3,2)), dt.date(2020,3,25))
+        self.assertEqual(self.index.skip(dt.date(2020,3,22)), dt.date(2020,3,25))
+        self.assertEqual(self.index.skip(dt.date(2020,6,2)), dt.date.max)
+
+    def testSpans(self):
+        self.assertEqual(self.index.spans(),
+                         [(dt.date(2020,1,1), dt.date(2020,1,31)),
+                          (dt.date(2020,3,1), dt.date(2020,3,25)),
+                          (dt.date(2020,6,1), dt.date.max)])
+        self.assertEqual(self.index.spans(dt.date(2020,3,10), dt.date(2020,12,31)),
+                         [(dt.date(2020,3,10), dt.date(2020,3,25)),
+                          (dt.date(2020,6,1), dt.date(2020,12,31))])
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
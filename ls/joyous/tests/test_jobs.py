@@ -0,0 +1,35 @@
+# ------------------------------------------------------------------------------
+# Test Job Runners
+# ------------------------------------------------------------------------------
+import sys
+from threading import current_thread, main_thread
+from django.test import TestCase, override_settings
+from ls.joyous.utils.jobs import (getJobRunner, ThreadPoolRunner,
+        DatabaseRunner)
+
+# ------------------------------------------------------------------------------
+def _whereAmI(value):
+    return (current_thread().name, value)
+
+class Test(TestCase):
+    def testDefaultRunner(self):
+        runner = getJobRunner()
+        self.assertIs(type(runner), ThreadPoolRunner)
+        self.assertIs(getJobRunner(), runner)
+
+    @override_settings(JOYOUS_JOB_RUNNER="ls.joyous.utils.jobs.DatabaseRunner")
+    def testDatabaseRunner(self):
+        runner = getJobRunner()
+        self.assertIs(type(runner), DatabaseRunner)
+        self.assertIsNone(runner.submit(_whereAmI, 1))
+
+    def testThreadPoolRunner(self):
+        future = ThreadPoolRunner().submit(_whereAmI, 2)
+        threadName, value = future.result(timeout=10)
+        self.assertEqual(value, 2)
+        self.assertNotEqual(threadName, main_thread().name)
+        self.assertTrue(threadName.startswith("joyous-job"))
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
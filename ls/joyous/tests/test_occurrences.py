@@ -0,0 +1,193 @@
+# ------------------------------------------------------------------------------
+# Test Materialized Occurrences
+# ------------------------------------------------------------------------------
+import sys
+import datetime as dt
+from django.test import TestCase, RequestFactory, override_settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from wagtail.core.models import Site, Page
+from ls.joyous.utils.recurrence import Recurrence
+from ls.joyous.utils.recurrence import WEEKLY, MONTHLY, TU, FR
+from ls.joyous.models import CalendarPage
+from ls.joyous.models import (RecurringEventPage, CancellationPage,
+        ExtraInfoPage, ExtCancellationPage, EventOccurrence,
+        EventOccurrenceHorizon, MultidayRecurringEventPage,
+        refreshOccurrences)
+from .testutils import freeze_timetz, captureOnCommitCallbacks
+
+# ------------------------------------------------------------------------------
+@override_settings(JOYOUS_OCCURRENCE_HORIZON=100)
+@freeze_timetz("2017-08-15 10:00")
+class Test(TestCase):
+    def setUp(self):
+        Site.objects.update(hostname="joy.test")
+        self.user = User.objects.create_user('i', 'i@joy.test', 's3cr3t')
+        self.request = RequestFactory().get("/test")
+        self.request.user = self.user
+        self.request.session = {}
+        self.calendar = CalendarPage(owner = self.user,
+                                     slug  = "events",
+                                     title = "Events")
+        Page.objects.get(slug='home').add_child(instance=self.calendar)
+        self.calendar.save_revision().publish()
+        self.event = RecurringEventPage(owner = self.user,
+                                        slug  = "fridays",
+                                        title = "Friday Drinks",
+                                        repeat = Recurrence(dtstart=dt.date(2017,1,6),
+                                                            freq=WEEKLY,
+                                                            byweekday=[FR]),
+                                        time_from = dt.time(17))
+        self.calendar.add_child(instance=self.event)
+        self.event.save_revision().publish()
+
+    def _byDay(self, fromDate, toDate):
+        return [[(thisEvent.title, thisEvent.page.id)
+                 for thisEvent in evod.days_events]
+                for evod in RecurringEventPage.events(self.request, None)
+                                              .byDay(fromDate, toDate)]
+
+    def testRefresh(self):
+        horizon = EventOccurrenceHorizon.objects.get(event=self.event)
+        self.assertEqual(horizon.from_date, dt.date(2017,5,7))
+        self.assertEqual(horizon.to_date, dt.date(2017,11,23))
+        occurrences = EventOccurrence.objects.filter(event=self.event)
+        self.assertEqual(occurrences.count(), 28)
+        first = occurrences.order_by('date').first()
+        self.assertEqual(first.date, dt.date(2017,5,12))
+        self.assertEqual(first.kind, "")
+        self.assertEqual(first.title, "Friday Drinks")
+        self.assertEqual(first.url_path, "/home/events/fridays/")
+        self.assertEqual(first.start.date(), dt.date(2017,5,12))
+
+    def testExceptions(self):
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2017,8,18),
+                                        cancellation_title = "No drinks")
+        self.event.add_child(instance=cancellation)
+        cancellation.save_revision().publish()
+        info = ExtraInfoPage(owner = self.user,
+                             overrides = self.event,
+                             except_date = dt.date(2017,8,25),
+                             extra_title = "Cocktails")
+        self.event.add_child(instance=info)
+        info.save_revision().publish()
+        kinds = dict(EventOccurrence.objects.filter(event=self.event)
+                                    .exclude(kind="")
+                                    .values_list('date', 'kind'))
+        self.assertEqual(kinds, {dt.date(2017,8,18): "cancellation",
+                                 dt.date(2017,8,25): "extrainfo"})
+        self.assertEqual(self.event.next_date, dt.date(2017,8,25))
+        self.assertEqual(self.event._future_datetime_from.date(),
+                         dt.date(2017,9,1))
+
+    def testByDayMatchesRrule(self):
+        shutdown = ExtCancellationPage(owner = self.user,
+                                       overrides = self.event,
+                                       cancelled_from_date = dt.date(2017,9,1),
+                                       cancelled_to_date = dt.date(2017,9,10),
+                                       cancellation_title = "Away")
+        self.event.add_child(instance=shutdown)
+        shutdown.save_revision().publish()
+        fromDate, toDate = dt.date(2017,8,1), dt.date(2017,9,30)
+        materialized = self._byDay(fromDate, toDate)
+        with override_settings(JOYOUS_OCCURRENCE_HORIZON=0):
+            expanded = self._byDay(fromDate, toDate)
+        self.assertEqual(materialized, expanded)
+        self.assertEqual(materialized[31], [("Away", shutdown.id)])
+
+    def testOutsideHorizon(self):
+        self.assertEqual(self.event._getMyNextDate(), dt.date(2017,8,18))
+        self.assertEqual(self._byDay(dt.date(2018,3,1),
+                                     dt.date(2018,3,31))[1],
+                         [("Friday Drinks", self.event.id)])
+
+    def testUnpublish(self):
+        self.event.unpublish()
+        self.assertFalse(EventOccurrence.objects.filter(event=self.event)
+                                                .exists())
+        self.assertFalse(EventOccurrenceHorizon.objects
+                                               .filter(event=self.event)
+                                               .exists())
+
+    def testDeleteException(self):
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2017,8,18))
+        self.event.add_child(instance=cancellation)
+        cancellation.save_revision().publish()
+        with captureOnCommitCallbacks(execute=True):
+            cancellation.delete()
+        self.assertFalse(EventOccurrence.objects.filter(event=self.event)
+                                                .exclude(kind="").exists())
+        self.assertEqual(self.event.next_date, dt.date(2017,8,18))
+
+    def testExtend(self):
+        refreshOccurrences(dt.date(2017,9,15))
+        horizon = EventOccurrenceHorizon.objects.get(event=self.event)
+        self.assertEqual(horizon.from_date, dt.date(2017,6,7))
+        self.assertEqual(horizon.to_date, dt.date(2017,12,24))
+        dates = EventOccurrence.objects.filter(event=self.event)             \
+                                       .values_list('date', flat=True)
+        self.assertEqual(min(dates), dt.date(2017,6,9))
+        self.assertEqual(max(dates), dt.date(2017,12,22))
+        self.assertEqual(len(dates), len(set(dates)))
+
+    def testMove(self):
+        group = Page(slug="group", title="Group")
+        Page.objects.get(slug='home').add_child(instance=group)
+        self.calendar.move(group, pos="last-child")
+        urlPaths = set(EventOccurrence.objects.filter(event=self.event)
+                                      .values_list('url_path', flat=True))
+        self.assertEqual(urlPaths, {"/home/group/events/fridays/"})
+
+    def testProxy(self):
+        event = MultidayRecurringEventPage(owner = self.user,
+                                           slug  = "retreat",
+                                           title = "Retreat",
+                                           repeat = Recurrence(dtstart=dt.date(2017,1,3),
+                                                               freq=MONTHLY,
+                                                               byweekday=[TU(1)]),
+                                           num_days = 2)
+        self.calendar.add_child(instance=event)
+        event.save_revision().publish()
+        self.assertTrue(EventOccurrenceHorizon.objects.filter(event=event)
+                                                      .exists())
+
+    def testUpcomingQueries(self):
+        def countQueries():
+            with CaptureQueriesContext(connection) as queries:
+                events = RecurringEventPage.events(self.request, None)       \
+                                           .upcoming().this()
+                dates = [thisEvent.page._future_datetime_from.date()
+                         for thisEvent in events]
+            return len(queries), dates
+        # the first look up fills some caches
+        countQueries()
+        numQueries, dates = countQueries()
+        self.assertEqual(dates, [dt.date(2017,8,18)])
+        for day in (1, 2, 3):
+            event = RecurringEventPage(owner = self.user,
+                                       slug  = "lunch{}".format(day),
+                                       title = "Lunch",
+                                       repeat = Recurrence(dtstart=dt.date(2017,1,day),
+                                                           freq=MONTHLY),
+                                       time_from = dt.time(12))
+            self.calendar.add_child(instance=event)
+            event.save_revision().publish()
+        self.assertEqual(countQueries(),
+                         (numQueries, [dt.date(2017,8,18), dt.date(2017,9,1),
+                                       dt.date(2017,9,2), dt.date(2017,9,3)]))
+
+    def testCommand(self):
+        EventOccurrence.objects.all().delete()
+        EventOccurrenceHorizon.objects.all().delete()
+        call_command("refresh_occurrences", stdout=sys.stdout)
+        self.assertEqual(EventOccurrence.objects.count(), 28)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -0,0 +1,129 @@
+# ------------------------------------------------------------------------------
+# Test Page Batch
+# ------------------------------------------------------------------------------
+import sys
+import datetime as dt
+from django.core.exceptions import ValidationError
+from django.contrib.auth.models import User
+from django.test import TestCase
+from wagtail.core.models import Page, PageLogEntry
+from ls.joyous.models import (GeneralCalendarPage, SimpleEventPage,
+        RecurringEventPage, CancellationPage, PostponementPage)
+from ls.joyous.utils.recurrence import Recurrence, WEEKLY, MO
+from ls.joyous.utils.pagebatch import PageBatch
+
+# ------------------------------------------------------------------------------
+class Test(TestCase):
+    def setUp(self):
+        self.home = Page.objects.get(slug='home')
+        self.user = User.objects.create_user('i', 'i@joy.test', 's3cr3t')
+        self.calendar = GeneralCalendarPage(owner = self.user,
+                                            slug  = "events",
+                                            title = "Events")
+        self.home.add_child(instance=self.calendar)
+        self.lunch = SimpleEventPage(owner = self.user,
+                                     slug  = "lunch",
+                                     title = "Lunch",
+                                     date  = dt.date(2019,1,1))
+        self.calendar.add_child(instance=self.lunch)
+
+    def _makeMeeting(self, title="Meeting"):
+        return RecurringEventPage(title      = title,
+                                  repeat     = Recurrence(dtstart=dt.date(2019,1,7),
+                                                          freq=WEEKLY,
+                                                          byweekday=[MO]),
+                                  time_from  = dt.time(9))
+
+    def testSave(self):
+        batch = PageBatch(self.user, publish=True)
+        meeting = self._makeMeeting()
+        batch.add(self.calendar, meeting)
+        cancellation = CancellationPage(overrides   = meeting,
+                                        except_date = dt.date(2019,1,14))
+        batch.add(meeting, cancellation)
+        postponement = PostponementPage(overrides   = meeting,
+                                        except_date = dt.date(2019,1,21),
+                                        postponement_title = "Delayed",
+                                        date        = dt.date(2019,1,22))
+        batch.add(meeting, postponement)
+        lunch = SimpleEventPage(title="Lunch", date=dt.date(2019,2,1))
+        batch.add(self.calendar, lunch)
+        self.assertEqual(len(batch), 4)
+        with self.assertNumQueries(17):
+            pages = batch.save()
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(len(batch), 0)
+        self.assertEqual([problems for problems in Page.find_problems()
+                          if problems], [])
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.numchild, 3)
+        self.assertEqual([page.slug for page in self.calendar.get_children()],
+                         ["lunch", "meeting", "lunch-2"])
+        meeting = RecurringEventPage.objects.get(id=meeting.id)
+        self.assertEqual(meeting.owner, self.user)
+        self.assertEqual(meeting.url_path, "/home/events/meeting/")
+        self.assertTrue(meeting.live)
+        self.assertFalse(meeting.has_unpublished_changes)
+        self.assertEqual(meeting.live_revision, meeting.get_latest_revision())
+        self.assertEqual(meeting.numchild, 2)
+        self.assertEqual(meeting.get_latest_revision_as_page().title, "Meeting")
+        children = meeting.get_children().specific()
+        self.assertEqual([page.slug for page in children],
+                         ["2019-01-14-cancellation", "2019-01-21-postponement"])
+        self.assertEqual(children[1].overrides, meeting)
+        self.assertEqual(children[1].date, dt.date(2019,1,22))
+        self.assertEqual(PageLogEntry.objects.filter(action="wagtail.publish")
+                                             .count(), 4)
+
+    def testSaveDraft(self):
+        batch = PageBatch(self.user, submit=True)
+        meeting = self._makeMeeting()
+        batch.add(self.calendar, meeting)
+        batch.save()
+        meeting.refresh_from_db()
+        self.assertFalse(meeting.live)
+        self.assertTrue(meeting.has_unpublished_changes)
+        self.assertIsNone(meeting.live_revision)
+        self.assertTrue(meeting.get_latest_revision().submitted_for_moderation)
+        self.assertFalse(PageLogEntry.objects.filter(action="wagtail.publish")
+                                             .exists())
+
+    def testSaveNothing(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(PageBatch(self.user).save(), [])
+
+    def testAddToExisting(self):
+        meeting = self._makeMeeting()
+        self.calendar.add_child(instance=meeting)
+        batch = PageBatch(self.user)
+        for day in (7, 14):
+            batch.add(meeting, CancellationPage(overrides   = meeting,
+                                                except_date = dt.date(2019,1,day)))
+        batch.save()
+        self.assertEqual(meeting.numchild, 2)
+        meeting.refresh_from_db()
+        self.assertEqual(meeting.numchild, 2)
+        # and again, after the ones just added
+        batch.add(meeting, CancellationPage(overrides   = meeting,
+                                            except_date = dt.date(2019,1,21)))
+        batch.save()
+        meeting.refresh_from_db()
+        self.assertEqual(meeting.numchild, 3)
+        self.assertEqual([problems for problems in Page.find_problems()
+                          if problems], [])
+
+    def testSlugInUse(self):
+        meeting = self._makeMeeting()
+        self.calendar.add_child(instance=meeting)
+        meeting.add_child(instance=CancellationPage(overrides   = meeting,
+                                                    except_date = dt.date(2019,1,7)))
+        batch = PageBatch(self.user)
+        batch.add(meeting, CancellationPage(overrides   = meeting,
+                                            except_date = dt.date(2019,1,7)))
+        with self.assertRaises(ValidationError):
+            batch.save()
+        self.assertEqual(CancellationPage.objects.count(), 1)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -2,8 +2,9 @@
 import sys
 import datetime as dt
 from dateutil.rrule import rrule
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from ls.joyous.utils.recurrence import Recurrence, Weekday
+from ls.joyous.utils.recurrence import internRecurrence, clearRecurrenceCaches
 from ls.joyous.utils.recurrence import MO, TU, WE, TH, FR, SA, SU
 from ls.joyous.utils.recurrence import YEARLY, MONTHLY, WEEKLY, DAILY
 from .testutils import datetimetz
@@ -270,6 +271,54 @@ class TestGetWhen(TestCase):
                         bymonthday=[1,-1])
         self.assertEqual(rr._getWhen(-1), "The day before the first and the last day of the month")
 
+# ------------------------------------------------------------------------------
+class TestCaches(TestCase):
+    RULE = "DTSTART:20150105\nRRULE:FREQ=WEEKLY;WKST=SU;BYDAY=MO,TH"
+
+    def setUp(self):
+        clearRecurrenceCaches()
+
+    def tearDown(self):
+        clearRecurrenceCaches()
+
+    def testIntern(self):
+        rr = internRecurrence(self.RULE)
+        self.assertIs(internRecurrence(self.RULE), rr)
+        self.assertEqual(rr, Recurrence(self.RULE))
+
+    def testBetweenCached(self):
+        rr1 = Recurrence(self.RULE)
+        rr2 = Recurrence(self.RULE)
+        occurences = rr1.between(dt.date(2020,3,1), dt.date(2020,3,7),
+                                 inc=True)
+        self.assertEqual(occurences, (dt.date(2020,3,2), dt.date(2020,3,5)))
+        self.assertIs(rr2.between(dt.date(2020,3,1), dt.date(2020,3,7),
+                                  inc=True), occurences)
+        self.assertIs(rr2.between(dt.date(2020,2,29), dt.date(2020,3,8)),
+                      occurences)
+
+    @override_settings(JOYOUS_RECURRENCE_CACHE_SIZE=0)
+    def testNoCache(self):
+        self.assertIsNot(internRecurrence(self.RULE),
+                         internRecurrence(self.RULE))
+        rr = Recurrence(self.RULE)
+        occurences = rr.between(dt.date(2020,3,1), dt.date(2020,3,7))
+        self.assertEqual(occurences, (dt.date(2020,3,2), dt.date(2020,3,5)))
+        self.assertIsNot(rr.between(dt.date(2020,3,1), dt.date(2020,3,7)),
+                         occurences)
+
+    @override_settings(JOYOUS_RECURRENCE_CACHE="shared",
+                       CACHES={'default': {'BACKEND': 'django.core.cache.'
+                                           'backends.dummy.DummyCache'},
+                               'shared':  {'BACKEND': 'django.core.cache.'
+                                           'backends.locmem.LocMemCache'}})
+    def testSharedCache(self):
+        rr = Recurrence(self.RULE)
+        occurences = rr.between(dt.date(2020,3,1), dt.date(2020,3,7))
+        clearRecurrenceCaches()
+        self.assertEqual(rr.between(dt.date(2020,3,1), dt.date(2020,3,7)),
+                         occurences)
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
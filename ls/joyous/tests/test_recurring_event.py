@@ -6,6 +6,8 @@ import datetime as dt
 import pytz
 import calendar
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth.models import User
 from django.utils import timezone
 from wagtail.core.models import Site, Page
@@ -50,6 +52,28 @@ class Test(TestCase):
         self.assertEqual(len(evod.days_events), 1)
         self.assertEqual(len(evod.continuing_events), 0)
 
+    def testGetEventsByDayQueries(self):
+        request = RequestFactory().get("/test")
+        request.user = self.user
+        request.session = {}
+        def countQueries():
+            with CaptureQueriesContext(connection) as queries:
+                list(RecurringEventPage.events(request, None)
+                                       .byDay(dt.date(2017,8,1),
+                                              dt.date(2017,10,31)))
+            return len(queries)
+        countQueries()      # prime the request's cache of site root paths
+        oneEvent = countQueries()
+        for n in range(5):
+            event = RecurringEventPage(owner = self.user,
+                                       slug  = "meetup-{}".format(n),
+                                       title = "Meetup {}".format(n),
+                                       repeat = Recurrence(dtstart=dt.date(2017,8,5),
+                                                           freq=WEEKLY,
+                                                           byweekday=[TH]))
+            self.calendar.add_child(instance=event)
+        self.assertEqual(countQueries(), oneEvent)
+
     def testStatus(self):
         pastEvent = RecurringEventPage(owner = self.user,
                                        slug  = "past",
@@ -226,6 +250,30 @@ class Test(TestCase):
     def testGroup(self):
         self.assertIsNone(self.event.group)
 
+    @freeze_timetz("2018-03-05 10:00")
+    def testMemoized(self):
+        event = RecurringEventPage.objects.get(id=self.event.id)
+        self.assertEqual(event.next_date, dt.date(2018,3,6))
+        self.assertEqual(event.prev_date, dt.date(2018,2,6))
+        self.assertEqual(event._past_datetime_from, datetimetz(2018,2,6,18,30))
+        self.assertIsNone(event.status)
+        with self.assertNumQueries(0):
+            self.assertEqual(event._future_datetime_from,
+                             datetimetz(2018,3,6,18,30))
+            self.assertEqual(event._current_datetime_from,
+                             datetimetz(2018,3,6,18,30))
+            self.assertEqual(event.next_date, dt.date(2018,3,6))
+            self.assertIsNone(event.status)
+            self.assertIs(event._occursOn(dt.date(2018,3,6)), True)
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2018,3,6))
+        self.event.add_child(instance=cancellation)
+        self.assertEqual(event.next_date, dt.date(2018,4,3))
+        self.assertIs(event._occursOn(dt.date(2018,3,6)), False)
+        self.event.save()
+        self.assertIsNone(self.event._occurrenceMemo)
+
     def testOccursOn(self):
         self.assertIs(self.event._occursOn(dt.date(2018,3,6)), True)
         self.assertIs(self.event._occursOn(dt.date(2018,3,13)), False)
@@ -386,6 +386,33 @@ class TestQuerySet(TestCase):
         self.assertEqual(list(SimpleEventPage.events.auth(request)),
                          [self.event, meeting])
 
+    def testAuthCached(self):
+        LOGIN = PageViewRestriction.LOGIN
+        bee = SimpleEventPage(owner = self.user,
+                              slug   = "bee",
+                              title  = "Working Bee",
+                              date   = dt.date(2013,3,30),
+                              time_from = dt.time(10))
+        self.calendar.add_child(instance=bee)
+        bee.save_revision().publish()
+        request = RequestFactory().get("/test")
+        request.user = AnonymousUser()
+        request.session = {}
+        self.assertEqual(list(SimpleEventPage.events.auth(request)),
+                         [self.event, bee])
+        with self.assertNumQueries(0):
+            SimpleEventPage.events.all().authorized_q(request)
+        PageViewRestriction.objects.create(restriction_type = LOGIN,
+                                           page = bee)
+        self.assertEqual(list(SimpleEventPage.events.auth(request)),
+                         [self.event])
+        # restricting the calendar too covers the restriction on bee
+        PageViewRestriction.objects.create(restriction_type = LOGIN,
+                                           page = self.calendar)
+        events = SimpleEventPage.events.auth(request)
+        self.assertEqual(str(events.query).count(" LIKE "), 1)
+        self.assertEqual(list(events), [])
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
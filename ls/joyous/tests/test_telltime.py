@@ -9,7 +9,8 @@ from django.utils import timezone
 from .testutils import datetimetz
 from ls.joyous.utils.telltime import (getAwareDatetime, getLocalDatetime,
         getLocalDateAndTime, getLocalDate, getLocalTime, getLocalTimeAtDate,
-        getTimeFrom, getTimeTo, timeFormat, dateFormat, dateShortFormat)
+        getLocalDatetimes, getLocalDates, getTimeFrom, getTimeTo, timeFormat,
+        dateFormat, dateShortFormat)
 
 # ------------------------------------------------------------------------------
 class TestLocalTimes(TestCase):
@@ -77,6 +78,51 @@ class TestLocalTimes(TestCase):
                                   pytz.timezone("Pacific/Pago_Pago"))
         self.assertEqual(time, dt.time(0,30))
 
+    def testGetLocalDatetimes(self):
+        tz = pytz.timezone("America/New_York")
+        whens = getLocalDatetimes([(dt.date(2019,3,10), dt.time(1,30)),
+                                   (dt.date(2019,3,10), dt.time(2,30)),
+                                   (dt.date(2019,3,10), dt.time(3,30)),
+                                   (dt.date(2019,11,3), dt.time(1,30)),
+                                   (dt.date(2019,11,3), None)], tz)
+        self.assertEqual(whens, [datetimetz(2019,3,10,15,30),
+                                 datetimetz(2019,3,10,16,30),
+                                 datetimetz(2019,3,10,16,30),
+                                 datetimetz(2019,11,3,15,30),
+                                 datetimetz(2019,11,4,23,59,59,999999)])
+        self.assertEqual(whens[0].tzinfo.zone, "Asia/Tokyo")
+
+    def testGetLocalDatetimesSame(self):
+        # the same as converting them one at a time the slow way
+        localTZ = timezone.get_current_timezone()
+        times = [None, dt.time(0), dt.time(1,30), dt.time(2,30), dt.time(23)]
+        for zone in ("Europe/London", "Australia/Lord_Howe", "Asia/Tokyo",
+                     "America/St_Johns", "Pacific/Apia", "UTC"):
+            tz = pytz.timezone(zone)
+            dateTimes = [(dt.date(2011,1,1) + dt.timedelta(days=day), time)
+                         for day in range(0, 1200, 3) for time in times]
+            for (date, time), when in zip(dateTimes,
+                                          getLocalDatetimes(dateTimes, tz)):
+                expected = getAwareDatetime(date, time, tz).astimezone(localTZ)
+                if time is None:
+                    expected = getAwareDatetime(expected.date(), None, localTZ)
+                self.assertEqual(when, expected)
+                self.assertEqual(when.utcoffset(), expected.utcoffset())
+
+    @timezone.override("Europe/Berlin")
+    def testGetLocalDatetimesGap(self):
+        # a time that does not exist is left alone in standard time
+        whens = getLocalDatetimes([(dt.date(2020,3,29), dt.time(2,15))])
+        self.assertEqual(whens[0].time(), dt.time(2,15))
+        self.assertEqual(whens[0].utcoffset(), dt.timedelta(hours=1))
+
+    def testGetLocalDates(self):
+        dates = getLocalDates([(dt.date(1993,8,8), None),
+                               (dt.date(1993,8,8), dt.time(9))],
+                              pytz.timezone("Europe/London"))
+        self.assertEqual(dates, [dt.date(1993,8,9), dt.date(1993,8,8)])
+        self.assertEqual(getLocalDates([]), [])
+
 # ------------------------------------------------------------------------------
 class TestNullableTimes(TestCase):
     def testTimeFrom(self):
@@ -0,0 +1,234 @@
+# ------------------------------------------------------------------------------
+# Test Event Timeline
+# ------------------------------------------------------------------------------
+import datetime as dt
+import pytz
+from unittest.mock import patch
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from wagtail.core.models import Page
+from ls.joyous.utils.recurrence import Recurrence, MONTHLY
+from ls.joyous.utils.telltime import todayUtc
+from ls.joyous.models import (GeneralCalendarPage, SimpleEventPage,
+        RecurringEventPage, CancellationPage, ExtraInfoPage, getAllPastEvents,
+        getAllUpcomingEvents)
+from ls.joyous.models.events_api import _getPastTimeline, _getUpcomingTimeline
+from ls.joyous.models.timeline import EventTimeline
+from .testutils import freeze_timetz
+
+# ------------------------------------------------------------------------------
+class Test(TestCase):
+    def setUp(self):
+        self.home = Page.objects.get(slug='home')
+        self.user = User.objects.create_user('i', 'i@joy.test', 's3cr3t')
+        self.request = RequestFactory().get("/test")
+        self.request.user = self.user
+        self.request.session = {}
+        self.calendar = GeneralCalendarPage(owner = self.user,
+                                            slug  = "events",
+                                            title = "Events")
+        self.home.add_child(instance=self.calendar)
+        # consecutive days in time zones far apart, so not in date order
+        zones = ["Pacific/Pago_Pago", "Pacific/Kiritimati", "Asia/Tokyo",
+                 "America/Los_Angeles", "Europe/London"]
+        times = [dt.time(23), dt.time(0), dt.time(12), dt.time(9), None]
+        for day in range(30):
+            event = SimpleEventPage(owner = self.user,
+                                    slug  = "event-{}".format(day),
+                                    title = "Event {}".format(day),
+                                    date  = dt.date(2016,3,1) +
+                                            dt.timedelta(days=day),
+                                    time_from = times[day % 5],
+                                    tz = pytz.timezone(zones[day % 5]))
+            self.calendar.add_child(instance=event)
+
+    def _getSortedTitles(self, reverse):
+        events = SimpleEventPage.events(self.request).past().this()
+        events = sorted(events, key=lambda event: event.page._past_datetime_from,
+                        reverse=reverse)
+        return [event.title for event in events]
+
+    @patch.object(EventTimeline, "CHUNK_SIZE", 4)
+    def testOrder(self):
+        events = _getPastTimeline(self.request)
+        self.assertEqual([event.title for event in events],
+                         self._getSortedTitles(reverse=True))
+        qrys = [SimpleEventPage.events(self.request).past().this()]
+        key = lambda page: page._past_datetime_from
+        events = EventTimeline(qrys, key=key)
+        self.assertEqual([event.title for event in events],
+                         self._getSortedTitles(reverse=False))
+
+    def testLists(self):
+        events = getAllPastEvents(self.request)
+        self.assertIs(type(events), list)
+        self.assertEqual([event.title for event in events],
+                         self._getSortedTitles(reverse=True))
+        self.assertEqual(getAllUpcomingEvents(self.request), [])
+
+    @patch.object(EventTimeline, "CHUNK_SIZE", 4)
+    def testLazy(self):
+        events = _getPastTimeline(self.request)
+        self.assertEqual(events[0].title, "Event 29")
+        self.assertLess(len(events._entries), 30)
+        self.assertEqual(len(events._cache), 1)
+        self.assertEqual(len(events), 30)
+        self.assertEqual(len(events._cache), 1)
+        self.assertEqual(events[-1].title, "Event 1")
+        with self.assertRaises(IndexError):
+            events[30]
+
+    @patch.object(EventTimeline, "CHUNK_SIZE", 4)
+    def testPaginator(self):
+        events = _getPastTimeline(self.request)
+        paginator = Paginator(events, 7)
+        self.assertEqual(paginator.num_pages, 5)
+        page = paginator.page(2)
+        self.assertEqual([event.title for event in page],
+                         self._getSortedTitles(reverse=True)[7:14])
+        self.assertEqual(len(events._cache), 7)
+
+    def testCount(self):
+        event = SimpleEventPage(owner = self.user,
+                                slug  = "event-future",
+                                title = "Event Future",
+                                date  = dt.date(2099,3,1))
+        self.calendar.add_child(instance=event)
+        events = _getPastTimeline(self.request)
+        # one count query per source, without merging any events
+        with self.assertNumQueries(len(events._qrys)):
+            self.assertEqual(events.count(), 30)
+        self.assertEqual(events._entries, [])
+        paginator = Paginator(events, 10)
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertEqual(len(paginator.page(3)), 10)
+        self.assertEqual(len(events._entries), 30)
+
+    def testCountEstimate(self):
+        # tomorrow's event might be past already, depending on its time zone
+        event = SimpleEventPage(owner = self.user,
+                                slug  = "event-tomorrow",
+                                title = "Event Tomorrow",
+                                date  = todayUtc() + dt.timedelta(days=1),
+                                time_from = dt.time(23,59),
+                                tz = pytz.timezone("Pacific/Kiritimati"))
+        self.calendar.add_child(instance=event)
+        events = _getPastTimeline(self.request)
+        self.assertGreaterEqual(events.count(), 30)
+        self.assertEqual(len(events), 30)
+        self.assertEqual(events.count(), 30)
+
+    @patch.object(EventTimeline, "CHUNK_SIZE", 2)
+    def testSameDates(self):
+        for num in range(5):
+            event = SimpleEventPage(owner = self.user,
+                                    slug  = "event-same-{}".format(num),
+                                    title = "Event Same {}".format(num),
+                                    date  = dt.date(2016,2,1),
+                                    time_from = dt.time(num),
+                                    tz = pytz.utc)
+            self.calendar.add_child(instance=event)
+        titles = [event.title for event in _getPastTimeline(self.request)]
+        self.assertEqual(len(titles), 35)
+        self.assertEqual(titles[-5:], ["Event Same {}".format(num)
+                                       for num in range(4, -1, -1)])
+
+    @patch.object(EventTimeline, "CHUNK_SIZE", 4)
+    def testPageGone(self):
+        events = _getPastTimeline(self.request)
+        self.assertEqual(len(events), 30)
+        SimpleEventPage.objects.get(slug="event-28").delete()
+        self.assertEqual(events[1].title, "Event 27")
+        self.assertEqual(len(events), 29)
+        events = _getPastTimeline(self.request)
+        self.assertEqual(len(events), 29)
+        SimpleEventPage.objects.get(slug="event-26").delete()
+        self.assertEqual([event.title for event in events[1:4]],
+                         ["Event 27", "Event 25", "Event 24"])
+        events = _getPastTimeline(self.request)
+        self.assertEqual(len(events), 28)
+        SimpleEventPage.objects.get(slug="event-20").delete()
+        titles = [event.title for event in events]
+        self.assertEqual(len(titles), 27)
+        self.assertNotIn("Event 20", titles)
+
+    def testEmpty(self):
+        events = _getUpcomingTimeline(self.request)
+        self.assertFalse(events)
+        self.assertEqual(events.count(), 0)
+        self.assertEqual(list(events), [])
+        self.assertEqual(events[:5], [])
+
+# ------------------------------------------------------------------------------
+@freeze_timetz("2017-08-15 10:00")
+class TestRecurring(TestCase):
+    def setUp(self):
+        self.home = Page.objects.get(slug='home')
+        self.user = User.objects.create_user('i', 'i@joy.test', 's3cr3t')
+        self.request = RequestFactory().get("/test")
+        self.request.user = self.user
+        self.request.session = {}
+        self.calendar = GeneralCalendarPage(owner = self.user,
+                                            slug  = "events",
+                                            title = "Events")
+        self.home.add_child(instance=self.calendar)
+        self._addEvents(0, 5)
+
+    def _addEvents(self, start, stop):
+        # the exceptions are all after the next lunches, so the first page
+        # of events stays the same
+        for num in range(start, stop):
+            event = RecurringEventPage(owner = self.user,
+                                       slug  = "lunch-{}".format(num),
+                                       title = "Lunch {}".format(num),
+                                       repeat = Recurrence(dtstart=dt.date(2017,1,num+1),
+                                                           freq=MONTHLY),
+                                       time_from = dt.time(12))
+            self.calendar.add_child(instance=event)
+            cancellation = CancellationPage(owner = self.user,
+                                            overrides = event,
+                                            except_date = dt.date(2017,11,num+1),
+                                            cancellation_title = "No lunch")
+            event.add_child(instance=cancellation)
+            info = ExtraInfoPage(owner = self.user,
+                                 overrides = event,
+                                 except_date = dt.date(2017,12,num+1),
+                                 extra_title = "Xmas lunch")
+            event.add_child(instance=info)
+
+    def _countQueries(self, getTimeline, attr):
+        # the first look up fills some caches
+        Paginator(getTimeline(self.request), 5).page(1)
+        with CaptureQueriesContext(connection) as queries:
+            events = Paginator(getTimeline(self.request), 5).page(1)
+            dates = [getattr(thisEvent.page, attr) for thisEvent in events]
+        return len(queries), dates
+
+    def testUpcomingQueries(self):
+        numQueries, dates = self._countQueries(_getUpcomingTimeline,
+                                               "_future_datetime_from")
+        self.assertEqual([date.date() for date in dates],
+                         [dt.date(2017,9,day) for day in range(1, 6)])
+        self._addEvents(5, 10)
+        self.assertEqual(self._countQueries(_getUpcomingTimeline,
+                                            "_future_datetime_from"),
+                         (numQueries, dates))
+
+    def testPastQueries(self):
+        numQueries, dates = self._countQueries(_getPastTimeline,
+                                               "_past_datetime_from")
+        self.assertEqual([date.date() for date in dates],
+                         [dt.date(2017,8,day) for day in range(5, 0, -1)])
+        self._addEvents(5, 10)
+        numQueries2, dates = self._countQueries(_getPastTimeline,
+                                                "_past_datetime_from")
+        self.assertEqual(numQueries2, numQueries)
+        self.assertEqual([date.date() for date in dates],
+                         [dt.date(2017,8,day) for day in range(10, 5, -1)])
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -4,6 +4,8 @@
 import sys
 import datetime as dt
 import pytz
+from io import BytesIO
+from unittest.mock import patch
 from django.contrib.auth.models import User, AnonymousUser, Group
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.contrib import messages
@@ -372,6 +374,44 @@ class Test(TestCase):
         self.assertEqual(event.time_from,  dt.time(9,30))
         self.assertEqual(event.time_to,    dt.time(11,30))
 
+    def testLoadUidInAnotherSite(self):
+        nova = Page(slug="nova", title="Nova Homepage")
+        self.home.get_parent().add_child(instance=nova)
+        Site.objects.create(hostname='nova.joy.test',
+                            root_page_id=nova.id,
+                            is_default_site=False)
+        novaEvents = CalendarPage(owner = self.user,
+                                  slug  = "events",
+                                  title = "Nova Events")
+        nova.add_child(instance=novaEvents)
+        novaEvents.save_revision().publish()
+        fair = SimpleEventPage(owner = self.user,
+                               slug  = "fair",
+                               title = "Nova Fair",
+                               uid   = "978-1523093400-1523100600@bloorneighbours.ca",
+                               date  = dt.date(2018,4,7))
+        novaEvents.add_child(instance=fair)
+        fair.save_revision().publish()
+        data  = b"\r\n".join([
+                b"BEGIN:VCALENDAR",
+                b"VERSION:2.0",
+                b"PRODID:-//Bloor &amp; Spadina - ECPv4.6.13//NONSGML v1.0//EN",
+                b"BEGIN:VEVENT",
+                b"DTSTART:20180407T093000",
+                b"DTEND:20180407T113000",
+                b"DTSTAMP:20180402T054745",
+                b"UID:978-1523093400-1523100600@bloorneighbours.ca",
+                b"SUMMARY:Mini-Fair & Garage Sale",
+                b"END:VEVENT",
+                b"END:VCALENDAR",])
+        vcal = VCalendar(self.calendar)
+        results = vcal.load(self._getRequest(), data)
+        self.assertEqual(results.success, 0)
+        self.assertEqual(results.fail, 1)
+        self.assertEqual(SimpleEventPage.objects.count(), 1)
+        fair.refresh_from_db()
+        self.assertEqual(fair.title, "Nova Fair")
+
     def testLoadInvalidFile(self):
         data  = b"FOO:BAR:SNAFU"
         vcal = VCalendar(self.calendar)
@@ -494,6 +534,147 @@ class Test(TestCase):
         self.assertEqual(results.success, 1)
         self.assertEqual(results.fail, 0)
 
+    @patch("ls.joyous.formats.ical.LOAD_BATCH_SIZE", 1)
+    def testLoadExceptionInLaterBatch(self):
+        data  = b"\r\n".join([
+                b"BEGIN:VCALENDAR",
+                b"VERSION:2.0",
+                b"PRODID:-//Bloor &amp; Spadina - ECPv4.6.13//NONSGML v1.0//EN",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Tango Thursdays",
+                b"DTSTART:20180329T193000",
+                b"DTEND:20180329T220000",
+                b"RRULE:FREQ=WEEKLY;BYDAY=TH",
+                b"DTSTAMP:20180408T094745Z",
+                b"LAST-MODIFIED:20180131T010000Z",
+                b"UID:645-1524080440-854495893@bloorneighbours.ca",
+                b"END:VEVENT",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Mini-Fair & Garage Sale",
+                b"DTSTART:20180407T093000",
+                b"DTEND:20180407T113000",
+                b"DTSTAMP:20180402T054745",
+                b"LAST-MODIFIED:20180304T225154Z",
+                b"UID:978-1523093400-1523100600@bloorneighbours.ca",
+                b"END:VEVENT",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Fierce Tango",
+                b"DESCRIPTION:Argentine Show Tango Performance",
+                b"DTSTART:20180405T193000",
+                b"DTEND:20180405T220000",
+                b"RECURRENCE-ID:20180405T193000",
+                b"DTSTAMP:20180408T094745Z",
+                b"LAST-MODIFIED:20180314T010000Z",
+                b"UID:645-1524080440-854495893@bloorneighbours.ca",
+                b"END:VEVENT",
+                b"END:VCALENDAR",])
+        vcal = VCalendar(self.calendar)
+        results = vcal.load(self._getRequest(), data)
+        self.assertEqual(results.success, 2)
+        self.assertEqual(results.fail, 0)
+        self.assertEqual(results.error, 0)
+        event = RecurringEventPage.events.child_of(self.calendar).get()
+        self.assertEqual(event.title, "Tango Thursdays")
+        info = ExtraInfoPage.events.child_of(event).get()
+        self.assertEqual(info.extra_title, "Fierce Tango")
+        self.assertEqual(info.except_date, dt.date(2018,4,5))
+        self.assertEqual(SimpleEventPage.events.child_of(self.calendar).count(), 1)
+
+    @patch("ls.joyous.formats.ical.LOAD_BATCH_SIZE", 1)
+    def testLoadExceptionInEarlierBatch(self):
+        data  = b"\r\n".join([
+                b"BEGIN:VCALENDAR",
+                b"VERSION:2.0",
+                b"PRODID:-//Bloor &amp; Spadina - ECPv4.6.13//NONSGML v1.0//EN",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Fierce Tango",
+                b"DESCRIPTION:Argentine Show Tango Performance",
+                b"DTSTART:20180405T193000",
+                b"DTEND:20180405T220000",
+                b"RECURRENCE-ID:20180405T193000",
+                b"DTSTAMP:20180408T094745Z",
+                b"LAST-MODIFIED:20180314T010000Z",
+                b"UID:645-1524080440-854495893@bloorneighbours.ca",
+                b"END:VEVENT",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Mini-Fair & Garage Sale",
+                b"DTSTART:20180407T093000",
+                b"DTEND:20180407T113000",
+                b"DTSTAMP:20180402T054745",
+                b"LAST-MODIFIED:20180304T225154Z",
+                b"UID:978-1523093400-1523100600@bloorneighbours.ca",
+                b"END:VEVENT",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Tango Thursdays",
+                b"DTSTART:20180329T193000",
+                b"DTEND:20180329T220000",
+                b"RRULE:FREQ=WEEKLY;BYDAY=TH",
+                b"DTSTAMP:20180408T094745Z",
+                b"LAST-MODIFIED:20180131T010000Z",
+                b"UID:645-1524080440-854495893@bloorneighbours.ca",
+                b"END:VEVENT",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Lost Tango",
+                b"DTSTART:20180412T193000",
+                b"DTEND:20180412T220000",
+                b"RECURRENCE-ID:20180412T193000",
+                b"DTSTAMP:20180408T094745Z",
+                b"UID:nothing-to-override@bloorneighbours.ca",
+                b"END:VEVENT",
+                b"END:VCALENDAR",])
+        vcal = VCalendar(self.calendar)
+        results = vcal.load(self._getRequest(), data)
+        self.assertEqual(results.success, 2)
+        self.assertEqual(results.fail, 1)
+        self.assertEqual(results.error, 0)
+        event = RecurringEventPage.events.child_of(self.calendar).get()
+        self.assertEqual(event.title, "Tango Thursdays")
+        info = ExtraInfoPage.events.child_of(event).get()
+        self.assertEqual(info.extra_title, "Fierce Tango")
+        self.assertEqual(info.except_date, dt.date(2018,4,5))
+
+    def testLoadStream(self):
+        stream = BytesIO(b"\r\n".join([
+                b"BEGIN:VCALENDAR",
+                b"VERSION:2.0",
+                b"PRODID:-//Bloor &amp; Spadina - ECPv4.6.13//NONSGML v1.0//EN",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Mini-Fair & Garage Sale",
+                b"DTSTART:20180407T093000",
+                b"DTEND:20180407T113000",
+                b"DTSTAMP:20180402T054745",
+                b"UID:978-1523093400-1523100600@bloorneighbours.ca",
+                b"END:VEVENT",
+                b"END:VCALENDAR",]))
+        vcal = VCalendar(self.calendar)
+        results = vcal.loadStream(self._getRequest(), stream)
+        self.assertEqual(results.success, 1)
+        event = SimpleEventPage.events.child_of(self.calendar).get()
+        self.assertEqual(event.title, "Mini-Fair & Garage Sale")
+        self.assertEqual(event.time_from, dt.time(9,30))
+        self.assertEqual(len(vcal.subcomponents), 0)
+
+    def testLoadTruncated(self):
+        data  = b"\r\n".join([
+                b"BEGIN:VCALENDAR",
+                b"VERSION:2.0",
+                b"PRODID:-//Bloor &amp; Spadina - ECPv4.6.13//NONSGML v1.0//EN",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Mini-Fair & Garage Sale",
+                b"DTSTART:20180407T093000",
+                b"DTEND:20180407T113000",
+                b"DTSTAMP:20180402T054745",
+                b"UID:978-1523093400-1523100600@bloorneighbours.ca",
+                b"END:VEVENT",
+                b"BEGIN:VEVENT",
+                b"SUMMARY:Cut Short",
+                b"DTSTART:20180408T093000",])
+        vcal = VCalendar(self.calendar)
+        results = vcal.load(self._getRequest(), data)
+        self.assertEqual(results.success, 1)
+        self.assertEqual(results.error, 1)
+        self.assertEqual(SimpleEventPage.events.child_of(self.calendar).count(), 1)
+
 # ------------------------------------------------------------------------------
 class TestUpdate(TestCase):
     @freeze_timetz("2018-02-01 13:00")
@@ -0,0 +1,174 @@
+# ------------------------------------------------------------------------------
+# Test reading iCalendar streams
+# ------------------------------------------------------------------------------
+import sys
+import datetime as dt
+from io import BytesIO
+from django.test import TestCase
+from ls.joyous.formats.vstream import readCalendars
+from ls.joyous.formats.errors import CalendarParseError
+
+# ------------------------------------------------------------------------------
+class CountingStream(BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.numReads = 0
+
+    def read(self, size=-1):
+        self.numReads += 1
+        return super().read(size)
+
+# ------------------------------------------------------------------------------
+class Test(TestCase):
+    def _makeCalendar(self, name, uids):
+        lines = [b"BEGIN:VCALENDAR",
+                 b"VERSION:2.0",
+                 b"PRODID:-//linuxsoftware.nz//NONSGML Test//EN",
+                 b"X-WR-CALNAME:" + name]
+        for uid in uids:
+            lines += [b"BEGIN:VEVENT",
+                      b"UID:" + uid,
+                      b"DTSTART:20190301T100000",
+                      b"SUMMARY:Event " + uid,
+                      b"END:VEVENT"]
+        lines += [b"END:VCALENDAR"]
+        return b"\r\n".join(lines) + b"\r\n"
+
+    def testMultipleCalendars(self):
+        data = self._makeCalendar(b"One", [b"a", b"b"]) +                 \
+               self._makeCalendar(b"Two", [b"c"])
+        calendars = [(cal, list(vevents))
+                     for cal, vevents in readCalendars(BytesIO(data))]
+        self.assertEqual(len(calendars), 2)
+        self.assertEqual(calendars[0][0]['X-WR-CALNAME'], "One")
+        self.assertEqual([str(vevent['UID']) for vevent in calendars[0][1]],
+                         ["a", "b"])
+        self.assertEqual(calendars[1][0]['X-WR-CALNAME'], "Two")
+        self.assertEqual([str(vevent['UID']) for vevent in calendars[1][1]],
+                         ["c"])
+
+    def testSkipUnreadEvents(self):
+        data = self._makeCalendar(b"One", [b"a", b"b"]) +                 \
+               self._makeCalendar(b"Two", [b"c"])
+        names = [str(cal['X-WR-CALNAME'])
+                 for cal, vevents in readCalendars(BytesIO(data))]
+        self.assertEqual(names, ["One", "Two"])
+
+    def testFoldedLines(self):
+        data = b"\n".join([b"BEGIN:VCALENDAR",
+                           b"VERSION:2.0",
+                           b"BEGIN:VEVENT",
+                           b"UID:folded",
+                           b"DTSTART;VALUE=DATE:20190301",
+                           b"SUMMARY:A very long summary which goes",
+                           b"  over two lines",
+                           b"DESCRIPTION:Split",
+                           b"\ton a tab",
+                           b"END:VEVENT",
+                           b"END:VCALENDAR"])
+        cal, vevents = next(readCalendars(BytesIO(data), readSize=7))
+        [vevent] = list(vevents)
+        self.assertEqual(vevent['SUMMARY'],
+                         "A very long summary which goes over two lines")
+        self.assertEqual(vevent['DESCRIPTION'], "Spliton a tab")
+        self.assertEqual(vevent.decoded('DTSTART'), dt.date(2019,3,1))
+
+    def testReadsAsItGoes(self):
+        uids = [str(num).encode() for num in range(100)]
+        stream = CountingStream(self._makeCalendar(b"Many", uids))
+        cal, vevents = next(readCalendars(stream, readSize=256))
+        vevent = next(vevents)
+        self.assertEqual(vevent['UID'], "0")
+        self.assertLess(stream.numReads, 5)
+        self.assertEqual(len(list(vevents)), 99)
+        self.assertGreater(stream.numReads, 20)
+
+    def testTimeZone(self):
+        data = b"\r\n".join([b"BEGIN:VCALENDAR",
+                             b"VERSION:2.0",
+                             b"BEGIN:VTIMEZONE",
+                             b"TZID:Pacific/Auckland",
+                             b"BEGIN:STANDARD",
+                             b"DTSTART:20180401T030000",
+                             b"TZOFFSETFROM:+1300",
+                             b"TZOFFSETTO:+1200",
+                             b"END:STANDARD",
+                             b"END:VTIMEZONE",
+                             b"BEGIN:VEVENT",
+                             b"UID:tz",
+                             b"DTSTART;TZID=Pacific/Auckland:20190601T100000",
+                             b"END:VEVENT",
+                             b"END:VCALENDAR"])
+        cal, vevents = next(readCalendars(BytesIO(data)))
+        [vevent] = list(vevents)
+        dtstart = vevent.decoded('DTSTART')
+        self.assertEqual(dtstart.tzinfo.zone, "Pacific/Auckland")
+        self.assertEqual(dtstart.utcoffset(), dt.timedelta(hours=12))
+
+    def testIncludeTimeZones(self):
+        data = b"\r\n".join([b"BEGIN:VCALENDAR",
+                             b"VERSION:2.0",
+                             b"BEGIN:VTIMEZONE",
+                             b"TZID:Pacific/Auckland",
+                             b"BEGIN:STANDARD",
+                             b"DTSTART:20180401T030000",
+                             b"TZOFFSETFROM:+1300",
+                             b"TZOFFSETTO:+1200",
+                             b"END:STANDARD",
+                             b"END:VTIMEZONE",
+                             b"BEGIN:VEVENT",
+                             b"UID:tz",
+                             b"DTSTART;TZID=Pacific/Auckland:20190601T100000",
+                             b"END:VEVENT",
+                             b"END:VCALENDAR"])
+        cal, vevents = next(readCalendars(BytesIO(data), timezones=True))
+        self.assertEqual([component.name for component in vevents],
+                         ["VTIMEZONE", "VEVENT"])
+
+    def testStrStream(self):
+        data = self._makeCalendar(b"Text", [b"t"]).decode()
+        cal, vevents = next(readCalendars(_StrStream(data)))
+        self.assertEqual([vevent['UID'] for vevent in vevents], ["t"])
+
+    def testBareEvent(self):
+        data = b"\r\n".join([b"BEGIN:VEVENT",
+                             b"UID:bare",
+                             b"DTSTART;VALUE=DATE:20190301",
+                             b"END:VEVENT"])
+        component, vevents = next(readCalendars(BytesIO(data)))
+        self.assertEqual([vevent['UID'] for vevent in vevents], ["bare"])
+
+    def testEmpty(self):
+        self.assertEqual(list(readCalendars(BytesIO(b""))), [])
+
+    def testInvalid(self):
+        with self.assertRaises(CalendarParseError):
+            list(readCalendars(BytesIO(b"FOO:BAR:SNAFU")))
+
+    def testUnterminated(self):
+        data = self._makeCalendar(b"Cut", [b"a", b"b"])[:-40]
+        cal, vevents = next(readCalendars(BytesIO(data)))
+        self.assertEqual(next(vevents)['UID'], "a")
+        with self.assertRaises(CalendarParseError):
+            next(vevents)
+
+    def testJunkAfterCalendar(self):
+        data = self._makeCalendar(b"One", [b"a"]) + b"FOO:BAR:SNAFU\r\n"
+        calendars = readCalendars(BytesIO(data))
+        cal, vevents = next(calendars)
+        self.assertEqual([vevent['UID'] for vevent in vevents], ["a"])
+        with self.assertRaises(CalendarParseError):
+            next(calendars)
+
+# ------------------------------------------------------------------------------
+class _StrStream:
+    def __init__(self, text):
+        self.text = text
+
+    def read(self, size=-1):
+        chunk, self.text = self.text[:size], self.text[size:]
+        return chunk
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
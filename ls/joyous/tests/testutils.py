@@ -3,7 +3,9 @@
 #---------------------------------------------------------------------------
 import unittest
 import datetime as dt
+from contextlib import contextmanager
 from functools import wraps
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.utils import timezone
 from dateutil import parser
 from wagtail.core.models import Site, Page
@@ -23,6 +25,24 @@ def skipUnlessSetup(attrs):
         return test
     return decorator
 
+# ------------------------------------------------------------------------------
+@contextmanager
+def captureOnCommitCallbacks(*, using=DEFAULT_DB_ALIAS, execute=False):
+    """
+    Capture the callbacks given to transaction.on_commit, and run them if
+    execute is True, like TestCase.captureOnCommitCallbacks of Django 3.2.
+    """
+    callbacks = []
+    start = len(connections[using].run_on_commit)
+    try:
+        yield callbacks
+    finally:
+        runOnCommit = connections[using].run_on_commit[start:]
+        callbacks[:] = [func for sids, func in runOnCommit]
+        if execute:
+            for callback in callbacks:
+                callback()
+
 # ------------------------------------------------------------------------------
 def datetimetz(*args):
     if len(args) < 2:
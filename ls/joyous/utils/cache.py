@@ -0,0 +1,65 @@
+# ------------------------------------------------------------------------------
+# Cache utilities
+# ------------------------------------------------------------------------------
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+# ------------------------------------------------------------------------------
+class LRUCache:
+    """
+    A thread-safe, least recently used, in-process cache.  A maxsize of 0
+    means nothing is kept.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        The value cached for key, or default.
+        """
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self._entries[key]
+
+    def set(self, key, value):
+        """
+        Cache value for key, evicting the least recently used entries if
+        there are more than maxsize.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(self.maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Forget everything.
+        """
+        with self._lock:
+            self._entries.clear()
+
+# ------------------------------------------------------------------------------
+def makeCacheKey(prefix, *parts):
+    """
+    A key which is safe to use with any Django cache backend.
+    """
+    digest = hashlib.md5("|".join(str(part) for part in parts)
+                                 .encode("utf-8")).hexdigest()
+    return "joyous.{}.{}".format(prefix, digest)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
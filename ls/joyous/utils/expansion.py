@@ -0,0 +1,301 @@
+# ------------------------------------------------------------------------------
+# Recurrence window expansion
+# ------------------------------------------------------------------------------
+# Calculates the occurrences of a date-based rrule within a window of dates
+# directly from the day ordinals, instead of walking the rule forward from
+# dtstart.  Reproduces the semantics of dateutil.rrule._iter for the rule
+# shapes Joyous uses: YEARLY, MONTHLY, WEEKLY and DAILY with BYDAY,
+# BYMONTHDAY, BYMONTH and BYSETPOS.  Anything else returns None from
+# WindowExpander.create and is left to dateutil.
+
+import calendar
+import datetime as dt
+from dateutil.rrule import DAILY, WEEKLY, MONTHLY, YEARLY
+
+_MAX_ORDINAL = dt.date.max.toordinal()
+
+# ------------------------------------------------------------------------------
+class WindowExpander:
+    """
+    Expands a dateutil rrule over a window of dates as a batch of day
+    ordinals.  Use :meth:`create` to get one, it returns None for rules that
+    are not supported.
+    """
+    # How many periods to expand at a time when searching forwards or
+    # backwards for the next occurrence
+    SEARCH_PERIODS = {YEARLY:  4,
+                      MONTHLY: 12,
+                      WEEKLY:  16,
+                      DAILY:   64}
+
+    @classmethod
+    def create(cls, rule):
+        """
+        Returns a WindowExpander for rule, or None if the rule is not one
+        that can be expanded by window.
+        """
+        if cls.supports(rule):
+            return cls(rule)
+        return None
+
+    @staticmethod
+    def supports(rule):
+        """
+        Is this a date-based rule without COUNT, BYWEEKNO, BYYEARDAY or
+        BYEASTER?
+        """
+        dtstart = rule._dtstart
+        until = rule._until
+        return (rule._freq in (YEARLY, MONTHLY, WEEKLY, DAILY) and
+                rule._count is None and
+                not rule._byweekno and
+                not rule._byyearday and
+                not rule._byeaster and
+                dtstart.tzinfo is None and
+                dtstart.time() == dt.time.min and
+                (until is None or until.tzinfo is None) and
+                list(rule._timeset) == [dt.time.min])
+
+    def __init__(self, rule):
+        self.freq        = rule._freq
+        self.interval    = rule._interval
+        self.wkst        = rule._wkst
+        self.dtstart     = rule._dtstart.date()
+        self.firstOrd    = self.dtstart.toordinal()
+        self.lastOrd     = _MAX_ORDINAL
+        if rule._until is not None:
+            self.lastOrd = rule._until.date().toordinal()
+        self.bymonth     = frozenset(rule._bymonth or ())
+        self.byweekday   = frozenset(rule._byweekday or ())
+        self.bynweekday  = tuple(rule._bynweekday or ())
+        self.bymonthday  = frozenset(rule._bymonthday or ())
+        self.bynmonthday = frozenset(rule._bynmonthday or ())
+        self.bysetpos    = tuple(rule._bysetpos or ())
+        self.periodSize  = {YEARLY:  366,
+                            MONTHLY: 31,
+                            WEEKLY:  7,
+                            DAILY:   1}[self.freq] * self.interval
+
+    def between(self, fromDate, toDate):
+        """
+        The dates of the occurrences from fromDate to toDate inclusive.
+        """
+        return [dt.date.fromordinal(ordinal) for ordinal in
+                self.ordinals(fromDate.toordinal(), toDate.toordinal())]
+
+    def after(self, date, inc=False):
+        """
+        The first occurrence after (or on if inc) date, or None.
+        """
+        return next(self.xafter(date, count=1, inc=inc), None)
+
+    def before(self, date, inc=False):
+        """
+        The last occurrence before (or on if inc) date, or None.
+        """
+        return next(self.xbefore(date, count=1, inc=inc), None)
+
+    def xafter(self, date, count=None, inc=False):
+        """
+        Generates the occurrences after (or on if inc) date, up to count of
+        them.
+        """
+        loOrd = max(date.toordinal() + (0 if inc else 1), self.firstOrd)
+        span = self.SEARCH_PERIODS[self.freq] * self.periodSize
+        while loOrd <= self.lastOrd:
+            hiOrd = min(loOrd + span - 1, self.lastOrd)
+            for ordinal in self.ordinals(loOrd, hiOrd):
+                yield dt.date.fromordinal(ordinal)
+                if count is not None:
+                    count -= 1
+                    if count <= 0:
+                        return
+            loOrd = hiOrd + 1
+            span *= 2
+
+    def xbefore(self, date, count=None, inc=False):
+        """
+        Generates the occurrences before (or on if inc) date, going
+        backwards, up to count of them.
+        """
+        hiOrd = min(date.toordinal() - (0 if inc else 1), self.lastOrd)
+        span = self.SEARCH_PERIODS[self.freq] * self.periodSize
+        while hiOrd >= self.firstOrd:
+            loOrd = max(hiOrd - span + 1, self.firstOrd)
+            for ordinal in reversed(self.ordinals(loOrd, hiOrd)):
+                yield dt.date.fromordinal(ordinal)
+                if count is not None:
+                    count -= 1
+                    if count <= 0:
+                        return
+            hiOrd = loOrd - 1
+            span *= 2
+
+    def contains(self, date):
+        """
+        Does the rule occur on date?  Only the period of the rule that date
+        falls in is considered.
+        """
+        ordinal = date.toordinal()
+        if not self.firstOrd <= ordinal <= self.lastOrd:
+            return False
+        for first, last, nthRanges in self._getPeriods(ordinal, ordinal):
+            if self.bysetpos:
+                return ordinal in self._expandPeriod(first, last, nthRanges)
+            return self._matches(ordinal, self._getNthDays(nthRanges))
+        return False
+
+    def ordinals(self, loOrd, hiOrd):
+        """
+        The day ordinals of the occurrences from loOrd to hiOrd inclusive.
+        """
+        loOrd = max(loOrd, self.firstOrd)
+        hiOrd = min(hiOrd, self.lastOrd)
+        retval = []
+        if loOrd > hiOrd:
+            return retval
+        for first, last, nthRanges in self._getPeriods(loOrd, hiOrd):
+            for ordinal in self._expandPeriod(first, last, nthRanges):
+                if loOrd <= ordinal <= hiOrd:
+                    retval.append(ordinal)
+        return retval
+
+    def _getPeriods(self, loOrd, hiOrd):
+        # Yields (first, last, nthRanges) for each period of the rule which
+        # overlaps loOrd..hiOrd.  Like dateutil, the first weekly period is
+        # truncated at dtstart, but yearly and monthly periods are whole.
+        loDate = dt.date.fromordinal(loOrd)
+        hiDate = dt.date.fromordinal(hiOrd)
+        interval = self.interval
+        if self.freq == YEARLY:
+            year0 = self.dtstart.year
+            k0 = max(0, -((year0 - loDate.year) // interval))
+            k1 = (hiDate.year - year0) // interval
+            for k in range(k0, k1 + 1):
+                year = year0 + k * interval
+                first = dt.date(year, 1, 1).toordinal()
+                last = dt.date(year, 12, 31).toordinal()
+                if self.bymonth:
+                    nthRanges = [self._monthRange(year, month)
+                                 for month in sorted(self.bymonth)]
+                else:
+                    nthRanges = [(first, last)]
+                yield first, last, nthRanges
+
+        elif self.freq == MONTHLY:
+            month0 = self.dtstart.year * 12 + self.dtstart.month - 1
+            loMonth = loDate.year * 12 + loDate.month - 1
+            hiMonth = hiDate.year * 12 + hiDate.month - 1
+            k0 = max(0, -((month0 - loMonth) // interval))
+            k1 = (hiMonth - month0) // interval
+            for k in range(k0, k1 + 1):
+                year, month = divmod(month0 + k * interval, 12)
+                first, last = self._monthRange(year, month + 1)
+                yield first, last, [(first, last)]
+
+        elif self.freq == WEEKLY:
+            week0 = self.firstOrd - (self.dtstart.weekday() - self.wkst) % 7
+            step = 7 * interval
+            k0 = max(0, -((week0 + 6 - loOrd) // step))
+            k1 = (hiOrd - week0) // step
+            for k in range(k0, k1 + 1):
+                first = week0 + k * step
+                yield max(first, self.firstOrd), first + 6, None
+
+        else:
+            k0 = max(0, -((self.firstOrd - loOrd) // interval))
+            k1 = (hiOrd - self.firstOrd) // interval
+            for k in range(k0, k1 + 1):
+                day = self.firstOrd + k * interval
+                yield day, day, None
+
+    @staticmethod
+    def _monthRange(year, month):
+        first = dt.date(year, month, 1).toordinal()
+        return first, first + calendar.monthrange(year, month)[1] - 1
+
+    def _expandPeriod(self, first, last, nthRanges):
+        # The occurrences in one period, with BYSETPOS applied
+        last = min(last, _MAX_ORDINAL)
+        nthDays = self._getNthDays(nthRanges)
+        if nthDays is not None:
+            candidates = sorted(day for day in nthDays if first <= day <= last)
+        elif self.byweekday and last - first >= 7:
+            firstWeekday = dt.date.fromordinal(first).weekday()
+            candidates = sorted(day for weekday in self.byweekday
+                                for day in range(first +
+                                                 (weekday - firstWeekday) % 7,
+                                                 last + 1, 7))
+        elif self.bymonthday and not self.bynmonthday and last - first >= 7:
+            candidates = self._getMonthdays(first, last)
+        else:
+            candidates = range(first, last + 1)
+
+        occurrences = [day for day in candidates
+                       if self._matches(day, nthDays)]
+        if self.bysetpos:
+            positioned = set()
+            for pos in self.bysetpos:
+                index = pos - 1 if pos > 0 else pos
+                if -len(occurrences) <= index < len(occurrences):
+                    positioned.add(occurrences[index])
+            occurrences = sorted(positioned)
+        return occurrences
+
+    def _getNthDays(self, nthRanges):
+        # The days matched by the nth weekdays of BYDAY, e.g. 2nd Tuesday,
+        # or None if there are none to match
+        if not self.bynweekday or nthRanges is None:
+            return None
+        nthDays = set()
+        for rangeFirst, rangeLast in nthRanges:
+            firstWeekday = dt.date.fromordinal(rangeFirst).weekday()
+            lastWeekday = dt.date.fromordinal(rangeLast).weekday()
+            for weekday, n in self.bynweekday:
+                if n > 0:
+                    day = (rangeFirst + (weekday - firstWeekday) % 7 +
+                           (n - 1) * 7)
+                else:
+                    day = (rangeLast - (lastWeekday - weekday) % 7 +
+                           (n + 1) * 7)
+                if rangeFirst <= day <= rangeLast:
+                    nthDays.add(day)
+        return nthDays
+
+    def _getMonthdays(self, first, last):
+        # The days matched by the positive BYMONTHDAYs from first to last
+        candidates = []
+        date = dt.date.fromordinal(first)
+        year, month = date.year, date.month
+        while True:
+            monthFirst, monthLast = self._monthRange(year, month)
+            if monthFirst > last:
+                break
+            for monthday in sorted(self.bymonthday):
+                day = monthFirst + monthday - 1
+                if day <= monthLast and first <= day <= last:
+                    candidates.append(day)
+            year, month = divmod(year * 12 + month, 12)
+            month += 1
+            if year > dt.MAXYEAR:
+                break
+        return candidates
+
+    def _matches(self, day, nthDays):
+        date = dt.date.fromordinal(day)
+        if self.bymonth and date.month not in self.bymonth:
+            return False
+        if self.byweekday and date.weekday() not in self.byweekday:
+            return False
+        if nthDays is not None and day not in nthDays:
+            return False
+        if self.bymonthday or self.bynmonthday:
+            if date.day not in self.bymonthday:
+                daysInMonth = calendar.monthrange(date.year, date.month)[1]
+                if date.day - daysInMonth - 1 not in self.bynmonthday:
+                    return False
+        return True
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
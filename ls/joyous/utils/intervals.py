@@ -0,0 +1,116 @@
+# ------------------------------------------------------------------------------
+# Interval utilities
+# ------------------------------------------------------------------------------
+import datetime as dt
+from bisect import bisect_left, bisect_right
+
+# ------------------------------------------------------------------------------
+class DateIntervalIndex:
+    """
+    An index of closed date ranges, each holding an item.  An interval with
+    a toDate of None is open-ended and goes on forever.
+
+    Built once, then queried for the items covering a date in
+    O(log n + number of overlapping intervals).
+    """
+    def __init__(self, intervals=()):
+        """
+        :param intervals: iterable of (fromDate, toDate, item) tuples
+        """
+        entries = []
+        for order, (fromDate, toDate, item) in enumerate(intervals):
+            if toDate is None:
+                toDate = dt.date.max
+            entries.append((fromDate, toDate, order, item))
+        entries.sort(key=lambda entry: (entry[0], entry[2]))
+        self._starts = [entry[0] for entry in entries]
+        self._ends   = [entry[1] for entry in entries]
+        self._orders = [entry[2] for entry in entries]
+        self._items  = [entry[3] for entry in entries]
+        # the running maximum of the ends is non-decreasing so can be
+        # bisected to find the first interval which might reach a date
+        self._maxEnds = []
+        maxEnd = dt.date.min
+        for end in self._ends:
+            maxEnd = max(maxEnd, end)
+            self._maxEnds.append(maxEnd)
+
+    @classmethod
+    def fromShutdowns(cls, shutdowns):
+        """
+        Index ExtCancellationPages by their cancelled from and to dates.
+        """
+        return cls((shutdown.cancelled_from_date,
+                    shutdown.cancelled_to_date,
+                    shutdown) for shutdown in shutdowns)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def covering(self, date):
+        """
+        The items of the intervals which include date, in the order they were
+        given.
+        """
+        hi = bisect_right(self._starts, date)
+        lo = bisect_left(self._maxEnds, date, 0, hi)
+        found = [(self._orders[i], self._items[i])
+                 for i in range(lo, hi) if self._ends[i] >= date]
+        found.sort(key=lambda entry: entry[0])
+        return [item for order, item in found]
+
+    def first(self, date):
+        """
+        The first item (in the order they were given) covering date, or None.
+        """
+        return next(iter(self.covering(date)), None)
+
+    def last(self, date):
+        """
+        The last item (in the order they were given) covering date, or None.
+        """
+        covering = self.covering(date)
+        return covering[-1] if covering else None
+
+    def skip(self, date):
+        """
+        The last date of the unbroken run of intervals which covers date,
+        dt.date.max if that run never ends, or None if date is not covered.
+        """
+        hi = bisect_right(self._starts, date)
+        if hi == 0 or self._maxEnds[hi - 1] < date:
+            return None
+        end = self._maxEnds[hi - 1]
+        # follow on through any intervals which start before we finish
+        while end < dt.date.max:
+            nextHi = bisect_right(self._starts, end + dt.timedelta(days=1))
+            if nextHi == hi:
+                break
+            hi = nextHi
+            end = self._maxEnds[hi - 1]
+        return end
+
+    def spans(self, fromDate=dt.date.min, toDate=dt.date.max):
+        """
+        The merged, non-overlapping (fromDate, toDate) ranges covered by the
+        intervals, clipped to fromDate and toDate.
+        """
+        spans = []
+        for start, end in zip(self._starts, self._ends):
+            if spans and start <= spans[-1][1] + dt.timedelta(days=1):
+                if end > spans[-1][1]:
+                    spans[-1][1] = end
+            else:
+                spans.append([start, end])
+            if spans[-1][1] == dt.date.max:
+                break
+        return [(max(start, fromDate), min(end, toDate))
+                for start, end in spans
+                if start <= toDate and end >= fromDate]
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
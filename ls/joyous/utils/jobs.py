@@ -0,0 +1,69 @@
+# ------------------------------------------------------------------------------
+# Running jobs out of band
+# ------------------------------------------------------------------------------
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+# ------------------------------------------------------------------------------
+DEFAULT_JOB_RUNNER = "ls.joyous.utils.jobs.ThreadPoolRunner"
+
+# The job runners, by the setting they were made from
+_runners = {}
+_runnersLock = Lock()
+
+# ------------------------------------------------------------------------------
+def getJobRunner():
+    """
+    The job runner named by :setting:`JOYOUS_JOB_RUNNER`.  A job runner is
+    anything with a ``submit(func, *args)`` method which arranges for
+    ``func(*args)`` to be called later, outside of the current request.
+    func is always a module level function, and args are simple values
+    such as ids, so a runner for a task queue like Celery or RQ can pass
+    them on by name.
+    """
+    path = getattr(settings, "JOYOUS_JOB_RUNNER", DEFAULT_JOB_RUNNER)
+    with _runnersLock:
+        runner = _runners.get(path)
+        if runner is None:
+            runner = _runners[path] = import_string(path)()
+    return runner
+
+# ------------------------------------------------------------------------------
+class ThreadPoolRunner:
+    """
+    Runs jobs in a pool of threads in this process.  Jobs which have not
+    finished when the process stops are lost.
+    """
+    maxWorkers = 2
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.maxWorkers,
+                                            thread_name_prefix="joyous-job")
+
+    def submit(self, func, *args):
+        return self._executor.submit(_runJob, func, args)
+
+class DatabaseRunner:
+    """
+    Runs nothing itself.  Jobs which are recorded in the database, such as
+    :class:`ImportJob <ls.joyous.models.ImportJob>`, are left queued there
+    for a separate worker process to run, e.g. with the ``run_import_jobs``
+    management command.  A stand-in for a real task queue.
+    """
+    def submit(self, func, *args):
+        pass
+
+# ------------------------------------------------------------------------------
+def _runJob(func, args):
+    try:
+        return func(*args)
+    finally:
+        # this thread's database connections would otherwise be left open
+        connections.close_all()
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
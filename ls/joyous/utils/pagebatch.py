@@ -0,0 +1,310 @@
+# ------------------------------------------------------------------------------
+# Creating many pages at once
+# ------------------------------------------------------------------------------
+import json
+from collections import defaultdict
+from itertools import groupby
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.text import slugify
+from django.utils.translation import gettext as _
+from modelcluster.models import get_all_child_relations
+from treebeard.exceptions import PathOverflow
+from wagtail import VERSION as _wt_version
+from wagtail.core.models import Page, PageRevision, PageLogEntry
+from wagtail.search.backends import get_search_backends
+from wagtail.search.index import class_is_indexed
+
+# Pages have a locale from Wagtail 2.11, and log entries are grouped by the
+# context they were made in from Wagtail 2.15
+_HAS_LOCALE      = _wt_version[:2] >= (2, 11)
+_HAS_LOG_CONTEXT = _wt_version[:2] >= (2, 15)
+if _HAS_LOG_CONTEXT:
+    from wagtail.core.log_actions import get_active_log_context
+
+# ------------------------------------------------------------------------------
+# How many values to look up with each query
+_LOOKUP_BATCH_SIZE = 500
+
+# How many parents to look up the children of with each query
+_PARENT_BATCH_SIZE = 100
+
+# ------------------------------------------------------------------------------
+class PageBatch:
+    """
+    New pages which are collected in memory, and then created all together,
+    along with their first revisions, in one transaction.
+
+    The tree paths of the pages are worked out in advance and the rows of
+    each table are inserted with a few bulk queries, rather than a few dozen
+    queries for each page as add_child and save_revision would use.  Like
+    bulk_create, this does not call save() or send the post_save or
+    page_published signals for the new pages, nor save any of their child
+    objects or many-to-many relations.  Pages are not full_clean'd,
+    but a page may have a _setTitleAndSlug() method for the fixups its
+    full_clean would have made.
+    """
+    def __init__(self, user=None, submit=False, publish=False):
+        """
+        :param user: the owner of the pages, and the user of their revisions
+        :param submit: submit the revisions for moderation
+        :param publish: publish the pages
+        """
+        self.user = user
+        self.submit = submit
+        self.publish = publish
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, parent, page):
+        """
+        Add page as the last child of parent, which is either in the tree
+        already or was added to this batch before page.
+        """
+        self._entries.append((parent, page))
+
+    def save(self):
+        """
+        Create all the pages of the batch, and return them.
+        """
+        if not self._entries:
+            return []
+        with transaction.atomic(using=self._db):
+            # the parents which are in the tree already
+            parents = {parent.path: parent for parent, page in self._entries
+                       if parent.pk is not None}
+            self._placePages(parents)
+            pages = [page for parent, page in self._entries]
+            for depth, level in groupby(pages, key=lambda page: page.depth):
+                self._insertPages(list(level))
+            self._insertRevisions(pages)
+            self._countChildren(parents)
+            self._indexPages(pages)
+        self._entries = []
+        return pages
+
+    @property
+    def _db(self):
+        return router.db_for_write(Page)
+
+    def _placePages(self, parents):
+        # Give each page its path in the tree, its slug, and the fields that
+        # adding it and saving its revision would have set
+        lastSteps, slugs = _getChildrenOf(parents.values())
+        now = timezone.now()
+        for parent, page in self._entries:
+            step = lastSteps.get(parent.path, 0) + 1
+            if step >= len(Page.alphabet) ** Page.steplen:
+                raise PathOverflow("Path Overflow from: '{}'"
+                                   .format(parent.path))
+            lastSteps[parent.path] = step
+            parent.numchild += 1
+            page.depth    = parent.depth + 1
+            page.path     = Page._get_path(parent.path, page.depth, step)
+            page.numchild = 0
+            if page.owner_id is None:
+                page.owner = self.user
+            if _HAS_LOCALE and page.locale_id is None:
+                page.locale_id = parent.locale_id
+            _setSlug(page, slugs[parent.path])
+            page.set_url_path(parent)
+            page.draft_title = page.title
+            page.latest_revision_created_at = now
+            page.live = self.publish
+            page.has_unpublished_changes = not self.publish
+            if self.publish:
+                page.first_published_at = now
+                page.last_published_at  = now
+            page.clean_fields(exclude=[field.name for field in
+                                       page._meta.concrete_fields
+                                       if field.is_relation])
+        # parents come before their children, but depth by depth is needed
+        self._entries.sort(key=lambda entry: entry[1].depth)
+
+    def _insertPages(self, pages):
+        # Insert the pages of one depth, so they can refer to their parents
+        for page in pages:
+            _setRelatedIds(page)
+        Page.objects.bulk_create(pages)
+        newIds = _getIdsBy(Page, 'path',
+                           [page.path for page in pages if page.id is None])
+        tables = defaultdict(list)
+        for page in pages:
+            if page.id is None:
+                page.id = newIds[page.path]
+            model = page._meta.concrete_model
+            for table in [model] + model._meta.get_parent_list():
+                for field in table._meta.parents.values():
+                    setattr(page, field.attname, page.id)
+                if table is not Page:
+                    tables[table].append(page)
+        # the rows of the tables nearest to Page must go in first
+        for table in sorted(tables, key=lambda table:
+                            len(table._meta.get_parent_list())):
+            _bulkInsert(table, tables[table], self._db)
+        for page in pages:
+            page._state.adding = False
+            page._state.db = self._db
+            # a new page has no child objects (e.g. comments) to look up
+            for relation in get_all_child_relations(page):
+                setattr(page, relation.get_accessor_name(), [])
+
+    def _insertRevisions(self, pages):
+        revisions = [PageRevision(page=page,
+                                  content_json=page.to_json(),
+                                  user=self.user,
+                                  submitted_for_moderation=self.submit and
+                                                           not self.publish,
+                                  created_at=page.latest_revision_created_at)
+                     for page in pages]
+        PageRevision.objects.bulk_create(revisions)
+        if not self.publish:
+            return
+        if any(revision.id is None for revision in revisions):
+            revisionIds = _getIdsBy(PageRevision, 'page_id',
+                                    [page.id for page in pages])
+            for revision in revisions:
+                revision.id = revisionIds[revision.page_id]
+        for page, revision in zip(pages, revisions):
+            page.live_revision = revision
+        Page.objects.bulk_update(pages, ['live_revision'])
+        context = {}
+        if _HAS_LOG_CONTEXT:
+            context['uuid'] = get_active_log_context().uuid
+        PageLogEntry.objects.bulk_create(
+            [PageLogEntry(content_type=ContentType.objects.get_for_model(page,
+                                                    for_concrete_model=False),
+                          label=page.get_admin_display_title(),
+                          action="wagtail.publish",
+                          timestamp=revision.created_at,
+                          data_json=json.dumps(""),
+                          user=self.user,
+                          page=page,
+                          revision=revision,
+                          content_changed=True,
+                          **context)
+             for page, revision in zip(pages, revisions)])
+
+    def _countChildren(self, parents):
+        # Add the new children to the numchild of the parents that were in
+        # the tree already, with one update for each number added
+        numAdded = defaultdict(int)
+        for parent, page in self._entries:
+            if parent.path in parents:
+                numAdded[parent.path] += 1
+        byNumber = defaultdict(list)
+        for path, number in numAdded.items():
+            byNumber[number].append(parents[path].pk)
+        for number, parentIds in byNumber.items():
+            for batch in _inBatches(parentIds):
+                Page.objects.filter(id__in=batch)                            \
+                            .update(numchild=F('numchild') + number)
+
+    def _indexPages(self, pages):
+        # What the post_save signal would have done for the search index
+        models = defaultdict(list)
+        for page in pages:
+            if class_is_indexed(type(page)):
+                models[type(page)].append(page)
+        for backend in get_search_backends(with_auto_update=True):
+            for model, objs in models.items():
+                backend.add_bulk(model, objs)
+
+# ------------------------------------------------------------------------------
+def _getChildrenOf(parents):
+    """
+    The last step of the paths of the children of each parent, and the slugs
+    of those children, by the path of the parent.  The parents are locked
+    first, so that no one else can add children to them until the batch is
+    saved.
+    """
+    lastSteps = {}
+    slugs = defaultdict(set)
+    for batch in _inBatches(parents, _PARENT_BATCH_SIZE):
+        list(Page.objects.select_for_update()
+                         .filter(id__in=[parent.pk for parent in batch])
+                         .order_by('id').values_list('id'))
+        children = Q()
+        for parent in batch:
+            children |= Q(path__startswith=parent.path,
+                          depth=parent.depth + 1)
+        for path, slug in Page.objects.filter(children)                      \
+                                      .values_list('path', 'slug'):
+            parentPath = path[:-Page.steplen]
+            step = Page._str2int(path[-Page.steplen:])
+            lastSteps[parentPath] = max(lastSteps.get(parentPath, 0), step)
+            slugs[parentPath].add(slug)
+    return lastSteps, slugs
+
+def _setSlug(page, siblingSlugs):
+    """
+    Set the slug of page, as its full_clean would, checking it is not
+    already in use by its siblings.
+    """
+    setTitleAndSlug = getattr(page, "_setTitleAndSlug", None)
+    if setTitleAndSlug is not None:
+        setTitleAndSlug()
+    if not page.slug:
+        allowUnicode = getattr(settings, 'WAGTAIL_ALLOW_UNICODE_SLUGS', True)
+        baseSlug = slugify(page.title, allow_unicode=allowUnicode)
+        slug = baseSlug
+        suffix = 1
+        while slug in siblingSlugs:
+            suffix += 1
+            slug = "{}-{}".format(baseSlug, suffix)
+        page.slug = slug
+    elif page.slug in siblingSlugs:
+        raise ValidationError({'slug': _("This slug is already in use")})
+    siblingSlugs.add(page.slug)
+
+def _setRelatedIds(page):
+    """
+    Set the foreign keys of page to objects which had no id yet when they
+    were assigned, e.g. a new exception's event that is in the same batch,
+    as save() would.
+    """
+    for field in page._meta.concrete_fields:
+        if field.is_relation and field.is_cached(page):
+            obj = field.get_cached_value(page)
+            if obj is not None and getattr(page, field.attname) is None:
+                setattr(page, field.attname, obj.pk)
+
+def _getIdsBy(model, fieldName, values):
+    """
+    The ids of the rows of model by the value of their field, for databases
+    which do not return the ids of bulk created rows.
+    """
+    ids = {}
+    for batch in _inBatches(values):
+        ids.update(model.objects.filter(**{fieldName+"__in": batch})
+                                .values_list(fieldName, 'id'))
+    return ids
+
+def _bulkInsert(table, objs, using):
+    """
+    Insert the rows of one table of multi-table inherited models, which
+    bulk_create can't do.
+    """
+    fields = table._meta.local_concrete_fields
+    batchSize = connections[using].ops.bulk_batch_size(fields, objs) or len(objs)
+    for start in range(0, len(objs), batchSize):
+        table._base_manager._insert(objs[start:start + batchSize],
+                                    fields=fields, using=using)
+
+def _inBatches(values, size=_LOOKUP_BATCH_SIZE):
+    """
+    Split values into lists that are short enough to look up in one query.
+    """
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
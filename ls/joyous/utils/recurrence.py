@@ -11,13 +11,18 @@
 
 import sys
 from operator import attrgetter
+from itertools import islice
 import calendar
 import datetime as dt
 from dateutil.rrule import rrule, rrulestr, rrulebase
 from dateutil.rrule import DAILY, WEEKLY, MONTHLY, YEARLY
 from dateutil.rrule import weekday as rrweekday
+from django.conf import settings
+from django.core.cache import caches
 from django.utils.translation import gettext as _
 from .telltime import dateShortFormat
+from .expansion import WindowExpander
+from .cache import LRUCache, makeCacheKey
 from .manythings import toOrdinal, toTheOrdinal, toDaysOffsetStr, hrJoin
 from .names import (WEEKDAY_NAMES, WEEKDAY_NAMES_PLURAL,
                     MONTH_NAMES, WRAPPED_MONTH_NAMES)
@@ -87,6 +92,8 @@ class Recurrence(rrulebase):
             self.rule = arg0
         else:
             self.rule = rrule(*args, **kwargs)
+        self._expander = WindowExpander.create(self.rule)
+        self._ruleStr = None
 
     # expose all rrule properties
     #: How often the recurrence repeats. (0,1,2,3)
@@ -186,6 +193,101 @@ class Recurrence(rrulebase):
         for occurence in self.rule._iter():
             yield occurence.date()
 
+    def _canExpand(self, *dates):
+        # The window expander works on dates, leave datetimes to dateutil
+        return (self._expander is not None and
+                not any(isinstance(date, dt.datetime) for date in dates))
+
+    def between(self, after, before, inc=False, count=1):
+        """
+        Returns a tuple of all the occurrences between after and before
+        (inclusive if inc is True).  These are cached, see
+        :setting:`JOYOUS_RECURRENCE_CACHE_SIZE`.
+        """
+        if not self._canExpand(after, before):
+            return tuple(super().between(after, before, inc, count))
+        if not inc:
+            after += dt.timedelta(days=1)
+            before -= dt.timedelta(days=1)
+        return self._getExpansion(after, before)
+
+    def _getExpansion(self, fromDate, toDate):
+        cacheSize = _getCacheSize()
+        if cacheSize <= 0:
+            return tuple(self._expander.between(fromDate, toDate))
+        if self._ruleStr is None:
+            self._ruleStr = repr(self)
+        key = (self._ruleStr, fromDate, toDate)
+        occurences = _expansionCache.get(key)
+        if occurences is None:
+            sharedCache = _getSharedCache()
+            if sharedCache is not None:
+                sharedKey = makeCacheKey("recurrence", *key)
+                occurences = sharedCache.get(sharedKey)
+            if occurences is None:
+                occurences = tuple(self._expander.between(fromDate, toDate))
+                if sharedCache is not None:
+                    sharedCache.set(sharedKey, occurences)
+            _expansionCache.maxsize = cacheSize
+            _expansionCache.set(key, occurences)
+        return occurences
+
+    def after(self, date, inc=False):
+        """
+        Returns the first occurrence after date (or on it if inc is True).
+        """
+        if not self._canExpand(date):
+            return super().after(date, inc)
+        return self._expander.after(date, inc)
+
+    def before(self, date, inc=False):
+        """
+        Returns the last occurrence before date (or on it if inc is True).
+        """
+        if not self._canExpand(date):
+            return super().before(date, inc)
+        return self._expander.before(date, inc)
+
+    def xafter(self, date, count=None, inc=False):
+        """
+        Generates the occurrences after date (or on it if inc is True), up
+        to count of them.
+        """
+        if not self._canExpand(date):
+            return super().xafter(date, count, inc)
+        return self._expander.xafter(date, count, inc)
+
+    def xbefore(self, date, count=None, inc=False):
+        """
+        Generates the occurrences before date (or on it if inc is True),
+        latest first, up to count of them.
+        """
+        if not self._canExpand(date):
+            occurences = reversed(super().between(dt.date.min, date, inc))
+            return islice(occurences, count)
+        return self._expander.xbefore(date, count, inc)
+
+    def nearest(self, date, direction=0):
+        """
+        The occurrence closest to date.  Only looks on or after date if
+        direction is positive, or on or before it if direction is negative.
+        Ties go to the earlier occurrence.  Returns None if there is no such
+        occurrence.  The cost depends upon the distance to the nearest
+        occurrence, not upon how long ago the recurrence started.
+        """
+        if date in self:
+            return date
+        after = self.after(date) if direction >= 0 else None
+        before = self.before(date) if direction <= 0 else None
+        if after is None or before is None:
+            return after or before
+        return before if date - before <= after - date else after
+
+    def __contains__(self, item):
+        if not self._canExpand(item):
+            return super().__contains__(item)
+        return self._expander.contains(item)
+
     # __len__() introduces a large performance penality.
     def getCount(self):
         """
@@ -383,6 +485,40 @@ class Recurrence(rrulebase):
         retval += of
         return retval
 
+# ------------------------------------------------------------------------------
+# Process-wide caches of parsed and expanded recurrences
+# ------------------------------------------------------------------------------
+_internCache = LRUCache()
+_expansionCache = LRUCache()
+
+def _getCacheSize():
+    return getattr(settings, "JOYOUS_RECURRENCE_CACHE_SIZE", 1000)
+
+def _getSharedCache():
+    alias = getattr(settings, "JOYOUS_RECURRENCE_CACHE", "")
+    if alias:
+        return caches[alias]
+    return None
+
+def internRecurrence(ruleStr):
+    """
+    Returns the Recurrence parsed from ruleStr.  Recurrences with the same
+    rule string are shared, so must not be modified.
+    """
+    recurrence = _internCache.get(ruleStr)
+    if recurrence is None:
+        recurrence = Recurrence(ruleStr)
+        _internCache.maxsize = _getCacheSize()
+        _internCache.set(ruleStr, recurrence)
+    return recurrence
+
+def clearRecurrenceCaches():
+    """
+    Forget all the parsed and expanded recurrences.
+    """
+    _internCache.clear()
+    _expansionCache.clear()
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
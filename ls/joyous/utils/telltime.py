@@ -3,6 +3,7 @@
 # ------------------------------------------------------------------------------
 import datetime as dt
 import re
+from bisect import bisect_right
 from functools import wraps
 from inspect import signature
 from django.conf import settings
@@ -10,6 +11,7 @@ from django.utils import dateformat
 from django.utils import formats
 from django.utils import timezone
 from django.utils.translation import gettext as _
+from .cache import LRUCache
 
 # ------------------------------------------------------------------------------
 def getLocalDate(*args, **kwargs):
@@ -71,17 +73,34 @@ def getLocalDatetime(date, time, tz=None, timeDefault=dt.time.max):
     """
     Get a datetime in the local timezone from date and optionally time
     """
+    return getLocalDatetimes([(date, time)], tz, timeDefault)[0]
+
+def getLocalDatetimes(dateTimes, tz=None, timeDefault=dt.time.max):
+    """
+    Get datetimes in the local timezone from many (date, optional time) pairs
+    which are all in the same timezone.  The same as calling getLocalDatetime
+    for each of them, but most of the conversions are just arithmetic on
+    cached UTC offsets.
+    """
     localTZ = timezone.get_current_timezone()
-    if tz is None or tz == localTZ:
-        localDt = getAwareDatetime(date, time, tz, timeDefault)
-    else:
-        # create in event's time zone
-        eventDt = getAwareDatetime(date, time, tz, timeDefault)
-        # convert to local time zone
-        localDt = eventDt.astimezone(localTZ)
-        if time is None:
-            localDt = getAwareDatetime(localDt.date(), None, localTZ, timeDefault)
-    return localDt
+    if tz is None:
+        tz = localTZ
+    retval = []
+    for date, time in dateTimes:
+        localDt = _toLocal(date, time, tz, localTZ, timeDefault)
+        if time is None and tz != localTZ:
+            localDt = _toLocal(localDt.date(), None, localTZ, localTZ,
+                               timeDefault)
+        retval.append(localDt)
+    return retval
+
+def getLocalDates(dateTimes, tz=None, timeDefault=dt.time.max):
+    """
+    Get the dates in the local timezone from many (date, optional time) pairs
+    which are all in the same timezone
+    """
+    return [localDt.date()
+            for localDt in getLocalDatetimes(dateTimes, tz, timeDefault)]
 
 def getAwareDatetime(date, time, tz, timeDefault=dt.time.max):
     """
@@ -97,6 +116,75 @@ def getAwareDatetime(date, time, tz, timeDefault=dt.time.max):
     datetime = timezone.make_aware(datetime, tz, is_dst=False)
     return datetime
 
+def _toLocal(date, time, tz, localTZ, timeDefault):
+    if time is None:
+        time = timeDefault
+    naiveDt = dt.datetime.combine(date, time)
+    offset = _getUtcOffset(tz, naiveDt)
+    if offset is None:
+        awareDt = getAwareDatetime(date, time, tz, timeDefault)
+        if tz != localTZ:
+            awareDt = awareDt.astimezone(localTZ)
+        return awareDt
+    utcDt = (naiveDt - offset).replace(tzinfo=dt.timezone.utc)
+    return utcDt.astimezone(localTZ)
+
+def _getUtcOffset(tz, naiveDt):
+    # The UTC offset of naiveDt in tz, or None if that is not certain
+    offsets = _getYearsOffsets(tz, naiveDt.year)
+    if offsets is None:
+        return None
+    starts, utcOffsets, unsure = offsets
+    for unsureFrom, unsureTo in unsure:
+        if unsureFrom <= naiveDt < unsureTo:
+            # a DST gap or overlap
+            return None
+    return utcOffsets[bisect_right(starts, naiveDt) - 1]
+
+_offsetsCache = LRUCache(maxsize=1000)
+
+def _getYearsOffsets(tz, year):
+    key = (tz, year)
+    offsets = _offsetsCache.get(key)
+    if offsets is None and key not in _offsetsCache:
+        offsets = _calcYearsOffsets(tz, year)
+        _offsetsCache.set(key, offsets)
+    return offsets
+
+def _calcYearsOffsets(tz, year):
+    # The local times from which each UTC offset applies during the year,
+    # and the local times around transitions which are uncertain.  Uses the
+    # transitions that pytz timezones have, or else a fixed offset.
+    if not 1 < year < 9999:
+        return None
+    transitions = getattr(tz, "_utc_transition_times", None)
+    infos = getattr(tz, "_transition_info", None)
+    if transitions is None or infos is None:
+        try:
+            offset = tz.utcoffset(None)
+        except Exception:
+            offset = None
+        if offset is None:
+            return None
+        return ([dt.datetime.min], [offset], [])
+    yearStart = dt.datetime(year, 1, 1) - dt.timedelta(days=2)
+    yearEnd   = dt.datetime(year + 1, 1, 1) + dt.timedelta(days=2)
+    idx = max(bisect_right(transitions, yearStart) - 1, 0)
+    starts = [dt.datetime.min]
+    utcOffsets = [infos[idx][0]]
+    unsure = []
+    for idx in range(idx + 1, len(transitions)):
+        if transitions[idx] > yearEnd:
+            break
+        oldOffset = infos[idx - 1][0]
+        newOffset = infos[idx][0]
+        unsureFrom = transitions[idx] + min(oldOffset, newOffset)
+        unsureTo   = transitions[idx] + max(oldOffset, newOffset)
+        unsure.append((unsureFrom, unsureTo))
+        starts.append(unsureTo)
+        utcOffsets.append(newOffset)
+    return (starts, utcOffsets, unsure)
+
 def todayUtc():
     """
     The current date in the UTC timezone
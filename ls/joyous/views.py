@@ -0,0 +1,28 @@
+# ------------------------------------------------------------------------------
+# Joyous admin views
+# ------------------------------------------------------------------------------
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.translation import gettext as _
+from .models import ImportJob
+
+# ------------------------------------------------------------------------------
+def importJobProgress(request, jobId):
+    """
+    The progress of a background import, for the calendar edit page to poll.
+    """
+    job = get_object_or_404(ImportJob.objects.select_related('calendar'),
+                            id=jobId)
+    perms = job.calendar.permissions_for_user(request.user)
+    if not perms.can_edit():
+        raise PermissionDenied
+    progress = job.getProgress()
+    progress['statusDisplay'] = str(job.get_status_display())
+    progress['summary'] = _("{success} loaded, {fail} failed")               \
+                          .format(**progress['totals'])
+    return JsonResponse(progress)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -3,6 +3,7 @@
 # ------------------------------------------------------------------------------
 
 from django.templatetags.static import static
+from django.urls import path
 from django.http import HttpResponse
 from django.utils.html import format_html
 from wagtail.core import hooks
@@ -10,6 +11,7 @@ from wagtail.contrib.modeladmin.options import ModelAdmin
 from wagtail.contrib.modeladmin.options import modeladmin_register
 from .models import EventCategory, CalendarPage, CalendarPageForm
 from .formats import NullHandler, ICalHandler, GoogleCalendarHandler, RssHandler
+from .views import importJobProgress
 
 # ------------------------------------------------------------------------------
 @hooks.register('before_serve_page')
@@ -34,6 +36,11 @@ def stashRequest(request, page):
 CalendarPageForm.registerImportHandler(ICalHandler())
 CalendarPageForm.registerExportHandler(ICalHandler())
 
+@hooks.register('register_admin_urls')
+def registerImportJobUrls():
+    return [path('joyous/import-jobs/<int:jobId>/', importJobProgress,
+                 name='joyous_import_job')]
+
 # ------------------------------------------------------------------------------
 class EventCategoryAdmin(ModelAdmin):
     model = EventCategory